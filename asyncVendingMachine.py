@@ -0,0 +1,155 @@
+import asyncio
+import functools
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import storageProfile
+from vendingMachine import VendingMachine
+
+
+class AsyncVendingMachine:
+    """
+    An asyncio variant of the VendingMachine, backed by aiosqlite.
+
+    The machine logic is shared with VendingMachine: a VendingMachine is built
+    around the sync side of an AsyncSession, and each of its methods is run
+    through AsyncSession.run_sync so database I/O is awaited on the event loop
+    instead of blocking a worker thread. Methods of the wrapped machine are
+    exposed as coroutines, e.g. ``await machine.select_product("A1")``, while
+    plain attributes such as ``transactions`` are passed straight through.
+    Buffered sales are flushed by a task on the event loop rather than by the
+    wrapped machine's background thread.
+
+    Attributes:
+        vending_machine_name (str): The name of the vending machine.
+        vending_db_file_path (str): The file path for the SQLite database.
+        engine (AsyncEngine): The async SQLAlchemy engine.
+        session (AsyncSession): The async database session.
+    """
+
+    def __init__(
+        self,
+        vending_machine_name,
+        vending_db_file_path,
+        storage_profile="durable",
+        **options,
+    ):
+        """
+        Initializes the AsyncVendingMachine instance.
+
+        The database is not touched until start() is awaited.
+
+        Args:
+            vending_machine_name (str): The name of the vending machine.
+            vending_db_file_path (str): The file path for the SQLite database.
+            storage_profile (str): The SQLite storage profile, see
+                storageProfile.PROFILES.
+            **options: Further keyword arguments for VendingMachine.
+        """
+        self.vending_machine_name = vending_machine_name
+        self.vending_db_file_path = vending_db_file_path
+        in_memory = vending_db_file_path == ":memory:"
+        engine_options = storageProfile.pool_options(storage_profile, in_memory)
+        if not in_memory:
+            # aiosqlite defaults to opening a connection per checkout
+            engine_options["poolclass"] = AsyncAdaptedQueuePool
+        self.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{self.vending_db_file_path}", **engine_options)
+        storageProfile.apply_profile(
+            self.engine.sync_engine, storage_profile, in_memory)
+        self.session = AsyncSession(self.engine)
+        self._options = dict(
+            options, storage_profile=storage_profile, background_flush=False)
+        self._machine = None
+        self._flusher = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        """
+        Creates the tables if needed and loads the machine state.
+        """
+        self._machine = await self.session.run_sync(
+            lambda session: VendingMachine(
+                self.vending_machine_name,
+                self.vending_db_file_path,
+                session=session,
+                **self._options,
+            )
+        )
+        self._flusher = asyncio.create_task(self._flush_in_background())
+
+    async def close(self):
+        """
+        Stops the flush task, closes the wrapped machine and disposes of the
+        engine.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        if self._machine is not None:
+            await self._run(self._machine.close)
+        await self.engine.dispose()
+
+    async def _flush_in_background(self):
+        interval = self._machine.ledger.max_latency
+        while True:
+            await asyncio.sleep(interval)
+            await self._run(self._machine.flush_due)
+
+    async def iter_stock_pages(self, batch_size=500):
+        """
+        Yields the whole product listing a page at a time.
+
+        Args:
+            batch_size (int): The number of products per page.
+
+        Yields:
+            list: The next page of products, see VendingMachine.stock_page.
+        """
+        async for rows in self._iter_pages(self._machine.stock_page, batch_size):
+            yield rows
+
+    async def iter_change_pages(self, batch_size=500):
+        """
+        Yields the whole coin listing a page at a time.
+
+        Args:
+            batch_size (int): The number of coins per page.
+
+        Yields:
+            list: The next page of coins, see VendingMachine.change_page.
+        """
+        async for rows in self._iter_pages(self._machine.change_page, batch_size):
+            yield rows
+
+    async def _iter_pages(self, page, batch_size):
+        # The session is released between pages so other requests interleave
+        after = None
+        while True:
+            rows, after = await self._run(page, after, batch_size)
+            if rows:
+                yield rows
+            if after is None:
+                return
+
+    async def _run(self, method, *args, **kwargs):
+        # One AsyncSession cannot be shared by concurrent tasks
+        async with self._lock:
+            return await self.session.run_sync(
+                lambda _session: method(*args, **kwargs))
+
+    def __getattr__(self, name):
+        if name.startswith("_") or self._machine is None:
+            raise AttributeError(name)
+        attribute = getattr(self._machine, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        async def method(*args, **kwargs):
+            return await self._run(attribute, *args, **kwargs)
+        return method
@@ -0,0 +1,382 @@
+"""
+Performance benchmarks for the change engine, purchase flow, HTTP API,
+startup, listing serialisation and simulated traffic.
+
+Runs fully offline against in-memory and file-backed SQLite databases and
+writes ops/sec and p50/p99 latency per case to a JSON baseline. Run from the
+project directory:
+
+    python -m benchmarks.run_benchmarks --out baseline.json
+    python -m benchmarks.run_benchmarks --compare baseline.json
+
+In compare mode the process exits with status 1 if any case is slower than
+the baseline by more than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from changeEngine import make_change
+from vendingMachine import VendingMachine
+
+UK_COINS = (200, 100, 50, 20, 10, 5, 2, 1)
+
+
+def summarize(latencies, wall_time=None):
+    """
+    Summarises a list of per-operation latencies.
+
+    Args:
+        latencies (list): Seconds taken by each operation.
+        wall_time (float): Total elapsed seconds when operations overlapped.
+            Defaults to the sum of the latencies.
+
+    Returns:
+        dict: ops/sec, p50 and p99 latency in milliseconds and the op count.
+    """
+    ordered = sorted(latencies)
+    wall_time = wall_time if wall_time is not None else sum(ordered)
+    p99_index = min(len(ordered) - 1, int(len(ordered) * 0.99))
+    return {
+        "ops_per_sec": round(len(ordered) / wall_time, 1) if wall_time else 0.0,
+        "p50_ms": round(statistics.median(ordered) * 1000, 4),
+        "p99_ms": round(ordered[p99_index] * 1000, 4),
+        "n": len(ordered),
+    }
+
+
+def measure(operation, iterations):
+    """
+    Times an operation called repeatedly with the iteration number.
+
+    Args:
+        operation (callable): Called once per iteration with its index.
+        iterations (int): The number of times to call it.
+
+    Returns:
+        dict: Summary statistics for the run.
+    """
+    latencies = []
+    clock = time.perf_counter
+    for i in range(iterations):
+        start = clock()
+        operation(i)
+        latencies.append(clock() - start)
+    return summarize(latencies)
+
+
+def make_machine(backend, directory, catalog_size, coins_per_denomination):
+    """
+    Builds a vending machine loaded with a synthetic catalog and coin float.
+
+    Args:
+        backend (str): "memory" or "file".
+        directory (str): Directory for file-backed databases.
+        catalog_size (int): The number of product slots to stock.
+        coins_per_denomination (int): Coins loaded of each UK denomination.
+
+    Returns:
+        VendingMachine: The stocked machine.
+    """
+    if backend == "memory":
+        path = ":memory:"
+    else:
+        path = os.path.join(
+            directory, f"bench_{catalog_size}_{coins_per_denomination}.db")
+        if os.path.exists(path):
+            os.remove(path)
+    machine = VendingMachine("bench", path)
+    machine.stock_rows([
+        (f"S{i:05d}", f"Product {i}", 5 * (1 + i % 40), 10**6)
+        for i in range(catalog_size)
+    ])
+    machine.restock_change_rows(
+        [(coin, coins_per_denomination) for coin in UK_COINS])
+    return machine
+
+
+def bench_change_engine(results, scale):
+    # Plenty of every coin, so the greedy pass settles almost every amount
+    rng = random.Random(1)
+    for coins in (5, 50, 500):
+        inventory = {coin: coins for coin in UK_COINS}
+        amounts = [rng.randint(1, 499) for _ in range(1000)]
+        results[f"change_engine/make_change[coins={coins}]"] = measure(
+            lambda i: make_change(amounts[i % 1000], inventory), 20000 * scale)
+
+    # No 10p, 5p or 1p coins and few 50p coins, forcing the memoized search
+    inventory = {200: 2, 100: 3, 50: 1, 20: 20, 2: 50}
+    amounts = [rng.randrange(2, 400, 2) for _ in range(1000)]
+    results["change_engine/make_change[non_greedy]"] = measure(
+        lambda i: make_change(amounts[i % 1000], inventory), 2000 * scale)
+
+
+def bench_machine(results, scale, directory):
+    for backend in ("memory", "file"):
+        for catalog_size in (10, 1000):
+            machine = make_machine(backend, directory, catalog_size, 10**6)
+            codes = [f"S{i:05d}" for i in range(catalog_size)]
+            case = f"[{backend},catalog={catalog_size}]"
+            iterations = 200 * scale
+
+            results["machine/calculate_change_possibility" + case] = measure(
+                lambda i: machine.calculate_change_possibility(1 + i % 499),
+                2000 * scale)
+
+            results["machine/stock_row" + case] = measure(
+                lambda i: machine.stock_row(
+                    codes[i % catalog_size], "Restocked", 100, 10**6),
+                iterations)
+
+            def purchase_exact(i):
+                code = codes[i % catalog_size]
+                cost = machine.select_product(code)
+                machine.insert_money(cost)
+            results["machine/purchase_exact" + case] = measure(
+                purchase_exact, iterations)
+
+            def purchase_with_change(i):
+                machine.select_product(codes[i % catalog_size])
+                machine.insert_money(200)
+            results["machine/purchase_with_change" + case] = measure(
+                purchase_with_change, iterations)
+            machine.close()
+
+
+async def drive_http(app, operation, count, concurrency):
+    """
+    Sends requests to an ASGI app from concurrent workers.
+
+    Args:
+        app (FastAPI): The application to drive.
+        operation (callable): Coroutine taking an httpx.AsyncClient and the
+            operation number, performing one logical operation.
+        count (int): The number of operations to perform.
+        concurrency (int): The number of concurrent workers.
+
+    Returns:
+        tuple: Per-operation latencies and the total elapsed seconds.
+    """
+    import httpx
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench") as client:
+        queue = asyncio.Queue()
+        for i in range(count):
+            queue.put_nowait(i)
+
+        async def worker():
+            clock = time.perf_counter
+            while not queue.empty():
+                i = queue.get_nowait()
+                start = clock()
+                await operation(client, i)
+                latencies.append(clock() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall_time = time.perf_counter() - start
+    return latencies, wall_time
+
+
+def bench_http(results, scale, directory):
+    import main
+
+    for backend in ("memory", "file"):
+        machine = make_machine(backend, directory, 100, 10**6)
+        app = main.create_app(machine=machine)
+        codes = [f"S{i:05d}" for i in range(100)]
+
+        async def show_stock(client, i):
+            response = await client.get("/stock/show_stock")
+            response.raise_for_status()
+
+        async def purchase(client, i):
+            response = await client.put(
+                "/select_product", params={"selection_code": codes[i % 100]})
+            token = response.json()["token"]
+            response = await client.post(
+                "/user_balance/update/", params={"coin": 200, "token": token})
+            response.raise_for_status()
+
+        for concurrency in (1, 16):
+            case = f"[{backend},concurrency={concurrency}]"
+            for name, operation, count in (
+                ("http/show_stock", show_stock, 500 * scale),
+                ("http/purchase", purchase, 200 * scale),
+            ):
+                latencies, wall_time = asyncio.run(
+                    drive_http(app, operation, count, concurrency))
+                results[name + case] = summarize(latencies, wall_time)
+        machine.close()
+
+
+def bench_startup(results, scale, directory):
+    # Importing main in a fresh interpreter, as a worker process or test
+    # run does. Run from the scratch directory so nothing lands in the project
+    project = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=project)
+    results["startup/import_main"] = measure(
+        lambda i: subprocess.run(
+            [sys.executable, "-c", "import main"],
+            cwd=directory, env=env, check=True),
+        3 * scale)
+
+    # Opening a machine on a new database, which creates the schema, and on
+    # one already at the current schema version, which skips create_all
+    def open_new(i):
+        VendingMachine(
+            "bench", os.path.join(directory, f"startup_{i}.db"),
+            background_flush=False).close()
+    results["startup/open_machine[new]"] = measure(open_new, 20 * scale)
+
+    path = os.path.join(directory, "startup_current.db")
+    VendingMachine("bench", path, background_flush=False).close()
+    results["startup/open_machine[current]"] = measure(
+        lambda i: VendingMachine(
+            "bench", path, background_flush=False).close(),
+        20 * scale)
+
+
+def bench_serialize(results, scale, directory):
+    from fastapi.encoders import jsonable_encoder
+
+    from listingSchemas import encode_listing
+
+    # Cost of reading and encoding 1,000 products: ORM objects through
+    # FastAPI's jsonable_encoder, as the listings were once served, against
+    # column tuples built into slotted rows and encoded directly
+    machine = make_machine("memory", directory, 1000, 10)
+
+    def orm_objects(i):
+        machine.session.expunge_all()
+        json.dumps(jsonable_encoder(machine.print_vending_data())).encode()
+    results["serialize/orm_jsonable_encoder[rows=1000]"] = measure(
+        orm_objects, 20 * scale)
+
+    def slotted_rows(i):
+        rows, _after = machine.stock_page(None, 1000)
+        encode_listing(rows)
+    results["serialize/slotted_rows[rows=1000]"] = measure(
+        slotted_rows, 20 * scale)
+    machine.close()
+
+
+def bench_simulation(results, scale, directory):
+    from trafficSimulator import simulate
+
+    logging.getLogger("vending").setLevel(logging.ERROR)
+    # Half a day of synthetic traffic per run, a macro-benchmark of the
+    # select, coin and change path on an in-memory machine
+    results["simulation/simulate[days=0.5]"] = measure(
+        lambda i: simulate(seed=i, days=0.5), 3 * scale)
+
+
+def bench_coin_float(results, scale, directory):
+    from coinFloat import change_from_prices, recommend_float
+    from trafficSimulator import default_catalog
+
+    # Planning one machine's float: 8,000 candidates replayed against 16
+    # scenarios of 200 purchases sampled from the default catalog
+    prices = [slot[2] for slot in default_catalog()]
+    owed = change_from_prices(prices, size=5000)
+    results["float/recommend_float[cap=5000]"] = measure(
+        lambda i: recommend_float(owed, 5000, seed=i), 3 * scale)
+
+
+def compare(baseline, current, threshold):
+    """
+    Compares benchmark results against a baseline.
+
+    Args:
+        baseline (dict): Baseline results keyed by case name.
+        current (dict): Current results keyed by case name.
+        threshold (float): Allowed fractional slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        list: Human readable descriptions of each regression found.
+    """
+    regressions = []
+    for case, before in baseline.items():
+        after = current.get(case)
+        if after is None:
+            continue
+        if after["ops_per_sec"] < before["ops_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{case}: ops/sec {before['ops_per_sec']} -> {after['ops_per_sec']}")
+        if after["p99_ms"] > before["p99_ms"] * (1 + threshold):
+            regressions.append(
+                f"{case}: p99 {before['p99_ms']}ms -> {after['p99_ms']}ms")
+    return regressions
+
+
+SUITES = {
+    "change": lambda results, scale, directory: bench_change_engine(results, scale),
+    "machine": bench_machine,
+    "http": bench_http,
+    "startup": bench_startup,
+    "serialize": bench_serialize,
+    "simulation": bench_simulation,
+    "float": bench_coin_float,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare against this JSON baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2,
+        help="Allowed fractional slowdown before flagging a regression")
+    parser.add_argument(
+        "--suite", action="append", choices=sorted(SUITES),
+        help="Only run the given suite (repeatable)")
+    parser.add_argument(
+        "--quick", action="store_true", help="Run fewer iterations")
+    args = parser.parse_args(argv)
+
+    scale = 1 if args.quick else 5
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.suite or SUITES:
+            SUITES[name](results, scale, directory)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    for case, stats in results.items():
+        print(f"{case:70} {stats['ops_per_sec']:>12} ops/s "
+              f"p50 {stats['p50_ms']:>9}ms p99 {stats['p99_ms']:>9}ms")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(baseline, results, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+from money import format_pence
+
+
+class CartLine:
+    """
+    One product in a cart, priced when it was added.
+
+    Attributes:
+        selection_code (str): Unique code for product selection.
+        product_name (str): Name of the product.
+        cost (int): Cost of one unit, in pence.
+        units (int): The number of units to buy.
+    """
+    __slots__ = ("selection_code", "product_name", "cost", "units")
+
+    def __init__(self, selection_code, product_name, cost, units):
+        self.selection_code = selection_code
+        self.product_name = product_name
+        self.cost = cost
+        self.units = units
+
+
+class Cart:
+    """
+    Several products bought together with one payment.
+
+    A cart stands in for a selected product in a transaction: it has a
+    total cost and answers try_purchase the same way, so paying for it goes
+    through the same coin and change handling as a single product.
+
+    Attributes:
+        lines (dict): Mapping of selection code to CartLine.
+    """
+
+    def __init__(self, lines):
+        """
+        Initializes the Cart.
+
+        Args:
+            lines (iterable): The CartLines in the cart.
+        """
+        self.lines = {line.selection_code: line for line in lines}
+
+    @property
+    def cost(self):
+        return sum(line.cost * line.units for line in self.lines.values())
+
+    def units(self):
+        """
+        Returns the units of each product in the cart.
+
+        Returns:
+            dict: Mapping of selection code to units.
+        """
+        return {code: line.units for code, line in self.lines.items()}
+
+    def try_purchase(self, money_inserted):
+        """
+        Checks the money inserted against the cart's total cost.
+
+        Args:
+            money_inserted (int): The money inserted, in pence.
+
+        Returns:
+            tuple: "UNSOLD", "SOLD" or "EVALUATE" and a message, as for
+                Vending_machine_entry.try_purchase.
+        """
+        cost = self.cost
+        items = sum(line.units for line in self.lines.values())
+        if money_inserted < cost:
+            outstanding = format_pence(cost - money_inserted)
+            return "UNSOLD", f'Insufficient funds, please insert at least {outstanding}'
+        elif money_inserted == cost:
+            return "SOLD", f'Exact funds inserted, dispensing {items} items'
+        return "EVALUATE", f'Excess funds inserted, dispensing {items} items and returning {format_pence(money_inserted - cost)}'
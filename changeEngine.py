@@ -0,0 +1,106 @@
+from functools import lru_cache
+from math import gcd
+
+
+def make_change(amount, inventory):
+    """
+    Solves the bounded change-making problem for an amount in pence.
+
+    A greedy pass using divmod per denomination is tried first, as it settles
+    almost every request for a standard coin set. When the bounded coin counts
+    make greedy fail (e.g. 60p from 3x20p while a 50p is loaded), a memoized
+    search finds the breakdown with the fewest coins. Amounts above the
+    coins' total, or not a multiple of their gcd, are refused without it.
+
+    Args:
+        amount (int): The change required, in pence.
+        inventory (dict): Mapping of coin denomination (pence) to the number
+            of those coins available.
+
+    Returns:
+        dict | None: Mapping of denomination to the number of coins to pay
+            out, or None if the amount cannot be paid from the inventory.
+    """
+    if amount < 0:
+        return None
+    if amount == 0:
+        return {}
+
+    denominations = tuple(
+        sorted((d for d, n in inventory.items() if d > 0 and n > 0), reverse=True)
+    )
+
+    # Greedy pass, taking as many of each coin as the count allows
+    breakdown = {}
+    remaining = amount
+    for denomination in denominations:
+        count, _ = divmod(remaining, denomination)
+        count = min(count, inventory[denomination])
+        if count:
+            breakdown[denomination] = count
+            remaining -= count * denomination
+    if remaining == 0:
+        return breakdown
+
+    counts = tuple(inventory[d] for d in denominations)
+
+    # Refuse amounts no combination can reach before searching: more than
+    # the coins add up to, or not a multiple of every denomination's gcd
+    total = sum(d * n for d, n in zip(denominations, counts))
+    if amount > total or amount % gcd(*denominations):
+        return None
+
+    # Memoized search over (coin index, remaining amount). Each state returns
+    # the fewest-coins breakdown as a tuple of counts, or None if unpayable.
+    @lru_cache(maxsize=None)
+    def solve(index, remaining):
+        if remaining == 0:
+            return ()
+        if index == len(denominations):
+            return None
+        denomination = denominations[index]
+        best = None
+        best_coins = None
+        for count in range(min(counts[index], remaining // denomination), -1, -1):
+            rest = solve(index + 1, remaining - count * denomination)
+            if rest is None:
+                continue
+            coins = count + sum(rest)
+            if best_coins is None or coins < best_coins:
+                best, best_coins = (count,) + rest, coins
+        return best
+
+    solution = solve(0, amount)
+    if solution is None:
+        return None
+    return {d: n for d, n in zip(denominations, solution) if n}
+
+
+def payable_amounts(inventory, limit):
+    """
+    Works out every amount below a limit that the inventory can pay exactly.
+
+    The result is a bitset held in an int, where bit n is set if n pence can
+    be paid. Each denomination's coins are added in power-of-two bundles
+    (1, 2, 4, ... coins), so the bounded counts cost a shift-and-or per
+    bundle rather than one per coin.
+
+    Args:
+        inventory (dict): Mapping of coin denomination (pence) to the number
+            of those coins available.
+        limit (int): One more than the largest amount of interest, in pence.
+
+    Returns:
+        int: The bitset of payable amounts from 0 to limit - 1.
+    """
+    mask = (1 << limit) - 1
+    reachable = 1   # Zero is always payable
+    for denomination, count in inventory.items():
+        count = min(count, (limit - 1) // denomination) if denomination > 0 else 0
+        bundle = 1
+        while count > 0:
+            take = min(bundle, count)
+            reachable = (reachable | (reachable << (denomination * take))) & mask
+            count -= take
+            bundle *= 2
+    return reachable
@@ -0,0 +1,102 @@
+from changeEngine import payable_amounts
+from money import ACCEPTED_COINS
+
+
+def overpayments(price):
+    """
+    Returns the change due when a price is paid in any one accepted coin.
+
+    Paying 1.30 in pound coins leaves 70p change, in 50p coins 20p, and so
+    on. These are the amounts a customer can plausibly expect back.
+
+    Args:
+        price (int): The price in pence.
+
+    Returns:
+        set: The change amounts, in pence.
+    """
+    return {-price % coin for coin in ACCEPTED_COINS}
+
+
+class ChangeFeasibility:
+    """
+    Precomputed answers to "can this change be paid?" for the coins held.
+
+    A bitset of every amount below the largest accepted coin that the
+    current coins can pay exactly is rebuilt whenever a coin quantity
+    changes, and so is an "exact change only" flag for each distinct price.
+    A price change only computes that price's flag. Lookups on the purchase
+    path are then a bit test or a dict lookup.
+
+    Attributes:
+        limit (int): Amounts below this many pence are covered by the bitset.
+    """
+
+    def __init__(self, limit=max(ACCEPTED_COINS)):
+        """
+        Initializes ChangeFeasibility for an empty coin inventory.
+
+        Args:
+            limit (int): Amounts below this many pence are precomputed.
+        """
+        self.limit = limit
+        self._payable = 1
+        self._prices = {}           # selection_code: price in pence
+        self._exact_change_only = {}  # price in pence: flag
+
+    def update_coins(self, coins):
+        """
+        Rebuilds the payable amounts and every price's flag.
+
+        Args:
+            coins (dict): Mapping of denomination (pence) to quantity held.
+        """
+        self._payable = payable_amounts(coins, self.limit)
+        self._exact_change_only = {
+            price: self._needs_exact_change(price)
+            for price in set(self._prices.values())
+        }
+
+    def set_price(self, selection_code, price):
+        """
+        Records a product's price, computing its flag if the price is new.
+
+        Args:
+            selection_code (str): The product.
+            price (int): The price in pence.
+        """
+        self._prices[selection_code] = price
+        if price not in self._exact_change_only:
+            self._exact_change_only[price] = self._needs_exact_change(price)
+
+    def payable(self, amount):
+        """
+        Checks whether an amount of change can be paid from the coins held.
+
+        Args:
+            amount (int): The change in pence.
+
+        Returns:
+            bool | None: Whether the amount can be paid, or None if it is
+                too large to have been precomputed.
+        """
+        if 0 <= amount < self.limit:
+            return bool(self._payable >> amount & 1)
+        return None
+
+    def exact_change_only(self, selection_code):
+        """
+        Checks whether a product should be bought with exact money.
+
+        Args:
+            selection_code (str): The product.
+
+        Returns:
+            bool: True if change could not be paid for some plausible
+                overpayment of the product's price.
+        """
+        price = self._prices.get(selection_code)
+        return price is not None and self._exact_change_only[price]
+
+    def _needs_exact_change(self, price):
+        return not all(self.payable(change) for change in overpayments(price))
@@ -0,0 +1,380 @@
+"""
+Recommends how many of each coin to load into a machine with restock_change.
+
+The change customers will be owed is sampled from a machine's sales ledger,
+or from the prices it has in stock when it has too few sales. Thousands of
+candidate floats within a cash cap are then replayed against the sampled
+transactions at once with NumPy, and the float refusing the fewest sales,
+then holding the least cash, is recommended:
+
+    python coinFloat.py --db test.db --cash-cap 5000
+    python coinFloat.py --fleet-dir fleet --cash-cap 5000 --out floats.json
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from money import ACCEPTED_COINS
+from trafficSimulator import DEFAULT_COIN_MIX
+from vendingMachine import VendingMachine
+
+# Purchases in the ledger needed before it is sampled rather than the prices
+MIN_HISTORY = 100
+
+
+def change_from_prices(prices, coin_mix=None, size=5000, rng=None):
+    """
+    Samples the change owed by customers paying coin by coin.
+
+    Each sample takes a price at random and adds coins drawn from the coin
+    mix until at least the price is paid, as the customers of
+    trafficSimulator do. All samples are paid for together, one coin per
+    step, so this takes as many steps as the longest payment has coins.
+
+    Args:
+        prices (sequence): Prices of the products on sale, in pence.
+        coin_mix (dict): Relative frequency of each coin customers pay with.
+        size (int): The number of samples.
+        rng (Generator): The NumPy random generator to draw from.
+
+    Returns:
+        ndarray: The change owed on each sample, in pence.
+
+    Raises:
+        ValueError: If there are no prices to sample.
+    """
+    if not len(prices):
+        raise ValueError("No prices to sample payments from")
+    rng = rng if rng is not None else np.random.default_rng()
+    coin_mix = coin_mix if coin_mix is not None else DEFAULT_COIN_MIX
+    coins = np.array(list(coin_mix), dtype=np.int64)
+    weights = np.array(list(coin_mix.values()), dtype=float)
+    weights /= weights.sum()
+
+    price = rng.choice(np.asarray(prices, dtype=np.int64), size=size)
+    paid = np.zeros(size, dtype=np.int64)
+    short = paid < price
+    while short.any():
+        paid[short] += rng.choice(coins, size=int(short.sum()), p=weights)
+        short = paid < price
+    return paid - price
+
+
+def refusal_rates(floats, scenarios, coins):
+    """
+    Replays candidate floats against sequences of transactions.
+
+    Every candidate is run against every scenario at once. Change is paid
+    greedily from the largest coin down and the coins paid out are taken
+    from the float, so the float drains over a scenario as it would between
+    restocks. A transaction is refused when greedy change cannot be made.
+    The machine falls back to an exhaustive search when greedy change fails,
+    so this slightly overstates refusals for floats short of some coins.
+
+    Args:
+        floats (ndarray): Coin counts, one row per candidate and one column
+            per coin.
+        scenarios (ndarray): The change owed, one row per scenario and one
+            column per transaction, in pence.
+        coins (sequence): The coin value of each column of floats.
+
+    Returns:
+        tuple: The share of transactions refused per candidate, and the
+            fewest of each coin left at the end of any scenario.
+    """
+    order = np.argsort(coins)[::-1]
+    values = np.asarray(coins, dtype=np.int32)[order]
+    # (coins, candidates, scenarios): a copy of each float per scenario,
+    # with each coin's counts contiguous
+    held = np.repeat(
+        np.asarray(floats, dtype=np.int32)[:, order].T[:, :, None],
+        scenarios.shape[0], axis=2)
+    paid = np.empty_like(held)
+    remaining = np.empty(held.shape[1:], dtype=np.int32)
+    refused = np.zeros(held.shape[1:], dtype=np.int32)
+    for owed in np.asarray(scenarios, dtype=np.int32).T:
+        remaining[:] = owed
+        for column, value in enumerate(values):
+            np.floor_divide(remaining, value, out=paid[column])
+            np.minimum(paid[column], held[column], out=paid[column])
+            remaining -= paid[column] * value
+        made = remaining == 0
+        paid *= made
+        held -= paid
+        refused += ~made
+
+    rates = refused.mean(axis=1) / scenarios.shape[1]
+    left = np.empty((held.shape[1], held.shape[0]), dtype=np.int64)
+    left[:, order] = held.min(axis=2).T
+    return rates, left
+
+
+def _coin_demand(scenarios, values):
+    # The share of the change owed each coin pays when change is made
+    # greedily from an unlimited float
+    remaining = scenarios.ravel().copy()
+    paid = np.empty(len(values))
+    for column in np.argsort(values)[::-1]:
+        count = remaining // values[column]
+        paid[column] = (count * values[column]).sum()
+        remaining -= count * values[column]
+    total = paid.sum()
+    return paid / total if total else paid
+
+
+def _perturb(floats, values, cash_cap, count, rng):
+    # Scale each coin of randomly chosen good floats up or down by about a
+    # third, then scale any float over the cash cap back down to it
+    parents = floats[rng.integers(len(floats), size=count)]
+    factors = np.exp(rng.normal(0.0, 0.3, size=parents.shape))
+    children = parents * factors + rng.integers(0, 3, size=parents.shape)
+    cash = children @ values
+    children *= np.minimum(1.0, cash_cap / np.maximum(cash, 1))[:, None]
+    return np.floor(children).astype(np.int64)
+
+
+def recommend_float(
+    change_owed,
+    cash_cap,
+    transactions=200,
+    scenarios=16,
+    candidates=2000,
+    rounds=3,
+    current=None,
+    seed=0,
+):
+    """
+    Finds the coin float with the fewest expected change refusals.
+
+    Scenarios of transactions between restocks are drawn from the change
+    owed. Random floats spending the cash cap in different proportions are
+    scored against them, then the best are refined over a number of rounds
+    by scaling their coins up and down. Among the floats refusing fewest
+    sales the one holding least cash is chosen, and coins it never paid out
+    in any scenario are trimmed if that refuses no more sales.
+
+    Args:
+        change_owed (sequence): Change owed on past or sampled purchases,
+            in pence.
+        cash_cap (int): The most cash the float may hold, in pence.
+        transactions (int): Purchases between restocks.
+        scenarios (int): Sequences of purchases each float is scored on.
+        candidates (int): Floats scored per round.
+        rounds (int): Rounds refining the best floats.
+        current (dict): The coins now loaded (pence to count), to compare
+            the recommendation against.
+        seed (int): Seed for the random number generator.
+
+    Returns:
+        dict: The recommended coins (pence to count), their cash, refusal
+            rate and expected refusals between restocks, the number of
+            floats evaluated, and the same measures for the current float.
+
+    Raises:
+        ValueError: If there is no change owed to sample, or the cash cap
+            or transactions are not positive.
+    """
+    if not len(change_owed):
+        raise ValueError("No sales or prices to plan a float from")
+    if cash_cap <= 0:
+        raise ValueError("Cash cap must be a positive number of pence")
+    if transactions <= 0:
+        raise ValueError("Transactions must be positive")
+    rng = np.random.default_rng(seed)
+    owed = np.asarray(change_owed, dtype=np.int64)
+    sampled = rng.choice(owed, size=(scenarios, transactions))
+    # Only coins that pay out some change from an unlimited float are
+    # loaded: none larger than any change owed, and no 1p or 2p coins when
+    # every amount owed is a multiple of 5p
+    demand = _coin_demand(sampled, np.array(ACCEPTED_COINS, dtype=np.int64))
+    coins = [coin for coin, share in zip(ACCEPTED_COINS, demand) if share]
+    if coins:
+        chosen, rate, evaluated = _search(
+            sampled, np.array(coins, dtype=np.int64), demand[demand > 0],
+            cash_cap, candidates, rounds, rng)
+    else:
+        # Every purchase was exact, so no float is needed
+        chosen, rate, evaluated = np.zeros(0, dtype=np.int64), 0.0, 0
+
+    result = dict(_measures(coins, chosen, rate, transactions),
+                  transactions=transactions, evaluated=evaluated, current=None)
+    if current is not None:
+        loaded = sorted(current)
+        counts = np.array([current[coin] for coin in loaded], dtype=np.int64)
+        rates, _left = refusal_rates(counts[None, :], sampled, loaded)
+        result["current"] = _measures(loaded, counts, rates[0], transactions)
+    return result
+
+
+def _search(sampled, values, demand, cash_cap, candidates, rounds, rng):
+    # Spend the cap in random proportions across the coins, half of the
+    # floats spread evenly and half around the share of the change each
+    # coin pays from an unlimited float
+    shares = np.concatenate([
+        rng.dirichlet(np.ones(len(values)), size=candidates - candidates // 2),
+        rng.dirichlet(demand * 50 + 0.1, size=candidates // 2),
+    ])
+    floats = np.floor(shares * cash_cap / values).astype(np.int64)
+    pool = floats[:0]
+    scores = np.zeros(0)
+    evaluated = 0
+    for round_ in range(rounds + 1):
+        if round_:
+            floats = _perturb(pool, values, cash_cap, candidates, rng)
+        rates, _left = refusal_rates(floats, sampled, values)
+        evaluated += len(floats)
+        pool = np.concatenate([pool, floats])
+        scores = np.concatenate([scores, rates])
+        # Keep the best floats: fewest refusals, then least cash
+        best = np.lexsort((pool @ values, scores))[:max(1, candidates // 20)]
+        pool, scores = pool[best], scores[best]
+
+    # Trim coins the best float never paid out in any scenario
+    chosen, rate = pool[0], scores[0]
+    _rates, left = refusal_rates(chosen[None, :], sampled, values)
+    trimmed = chosen - left[0]
+    trimmed_rates, _left = refusal_rates(trimmed[None, :], sampled, values)
+    if trimmed_rates[0] <= rate:
+        chosen, rate = trimmed, trimmed_rates[0]
+    return chosen, rate, evaluated + 1
+
+
+def _measures(coins, counts, rate, transactions):
+    return {
+        "coins": {coin: int(count) for coin, count in zip(coins, counts)},
+        "cash": int(sum(coin * int(count) for coin, count in zip(coins, counts))),
+        "refusal_rate": round(float(rate), 4),
+        "expected_refusals": round(float(rate) * transactions, 2),
+    }
+
+
+def recommend_from_demand(demand, cash_cap, min_history=MIN_HISTORY,
+                          coin_mix=None, **options):
+    """
+    Recommends a float from a machine's change demand.
+
+    Args:
+        demand (dict): As returned by VendingMachine.change_demand.
+        cash_cap (int): The most cash the float may hold, in pence.
+        min_history (int): Purchases in the ledger needed to sample them
+            rather than payments simulated from the prices.
+        coin_mix (dict): Relative frequency of each coin customers pay with,
+            used when sampling from the prices.
+        **options: Further keyword arguments for recommend_float.
+
+    Returns:
+        dict: As for recommend_float, with the source sampled ("ledger" or
+            "prices").
+
+    Raises:
+        ValueError: If the machine has neither sales nor stock, or the
+            options are not valid.
+    """
+    if len(demand["change_owed"]) >= min_history:
+        source, change_owed = "ledger", demand["change_owed"]
+    else:
+        source = "prices"
+        change_owed = change_from_prices(
+            demand["prices"], coin_mix,
+            rng=np.random.default_rng(options.get("seed", 0)))
+    result = recommend_float(
+        change_owed, cash_cap, current=demand["coins"], **options)
+    result["source"] = source
+    return result
+
+
+def recommend_for_database(path, cash_cap, **options):
+    """
+    Recommends a float for the machine whose database is at path.
+
+    Args:
+        path (str): The machine's SQLite database.
+        cash_cap (int): The most cash the float may hold, in pence.
+        **options: Further keyword arguments for recommend_from_demand.
+
+    Returns:
+        dict: As for recommend_from_demand, with the machine's id.
+    """
+    machine_id = os.path.splitext(os.path.basename(path))[0]
+    machine = VendingMachine(machine_id, path, background_flush=False)
+    try:
+        demand = machine.change_demand()
+    finally:
+        machine.close()
+    return dict(recommend_from_demand(demand, cash_cap, **options),
+                machine=machine_id)
+
+
+def _recommend(job):
+    path, cash_cap, options = job
+    try:
+        return recommend_for_database(path, cash_cap, **options)
+    except ValueError as e:
+        return {"machine": os.path.splitext(os.path.basename(path))[0],
+                "error": str(e)}
+
+
+def recommend_fleet(paths, cash_cap, workers=None, **options):
+    """
+    Recommends a float for each machine of a fleet across a process pool.
+
+    Args:
+        paths (list): The machines' database files.
+        cash_cap (int): The most cash each float may hold, in pence.
+        workers (int): Worker processes, defaulting to one per CPU. With 1
+            the machines are planned in this process.
+        **options: Further keyword arguments for recommend_from_demand.
+
+    Returns:
+        list: The recommendation for each machine, in the order of paths,
+            or its error if it could not be planned.
+    """
+    jobs = [(path, cash_cap, options) for path in paths]
+    if workers == 1:
+        return [_recommend(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_recommend, jobs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--db", help="The machine's SQLite database")
+    target.add_argument("--fleet-dir",
+                        help="Plan every machine database in this directory")
+    parser.add_argument("--cash-cap", type=int, required=True,
+                        help="Most cash each float may hold, in pence")
+    parser.add_argument("--transactions", type=int, default=200,
+                        help="Purchases between restocks")
+    parser.add_argument("--candidates", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes, default one per CPU")
+    parser.add_argument("--out", help="Write the recommendations to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("vending").setLevel(logging.ERROR)
+    options = {"transactions": args.transactions,
+               "candidates": args.candidates, "seed": args.seed}
+    if args.db is not None:
+        if not os.path.exists(args.db):
+            parser.error(f"No database at {args.db}")
+        results = recommend_fleet([args.db], args.cash_cap, workers=1, **options)
+    else:
+        paths = sorted(glob.glob(os.path.join(args.fleet_dir, "*.db")))
+        results = recommend_fleet(paths, args.cash_cap, args.workers, **options)
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any("error" in result for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import threading
+
+from changeEngine import make_change
+from changeFeasibility import ChangeFeasibility
+from lowStockIndex import LowStockIndex
+from model.model import Change
+
+
+class CoinInventory:
+    """
+    An in-memory cache of the coins held in the vending machine.
+
+    The inventory is loaded from the change_data table once and then kept up
+    to date with the quantities written by restocks and payouts, so change
+    availability can be decided without touching the database. The table
+    stays the source of truth: payouts are written to it atomically with the
+    sale, and the inventory only mirrors what was written.
+
+    Attributes:
+        coins (dict): Mapping of coin denomination (pence) to quantity held.
+        total (int): Total value of all coins held, in pence.
+        index (LowStockIndex): The coins ordered by quantity held.
+        feasibility (ChangeFeasibility): Which change amounts the coins can
+            pay, and which prices need exact money.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty CoinInventory.
+        """
+        self.coins = {}
+        self.total = 0
+        self.index = LowStockIndex()
+        self.feasibility = ChangeFeasibility()
+        self._lock = threading.Lock()
+
+    def load(self, session):
+        """
+        Loads the coin quantities from the change_data table.
+
+        Args:
+            session (Session): The database session to read from.
+        """
+        with self._lock:
+            self.coins = {
+                coin.value: coin.quantity for coin in session.query(Change).all()
+            }
+            self.total = sum(value * count for value, count in self.coins.items())
+            self.index.load(self.coins.items())
+            self.feasibility.update_coins(self.coins)
+
+    def set_coin(self, value, quantity):
+        """
+        Sets the quantity held of one coin, e.g. after a restock or payout.
+
+        Args:
+            value (int): The coin denomination in pence.
+            quantity (int): The new number of coins held.
+        """
+        with self._lock:
+            self.total += (quantity - self.coins.get(value, 0)) * value
+            self.coins[value] = quantity
+            self.index.set(value, quantity)
+            self.feasibility.update_coins(self.coins)
+
+    def make_change(self, amount):
+        """
+        Works out which coins to pay out for an amount of change.
+
+        Args:
+            amount (int): The change required, in pence.
+
+        Returns:
+            dict | None: Mapping of denomination to the number of coins to pay
+                out, or None if the change cannot be given.
+        """
+        if amount > self.total or self.feasibility.payable(amount) is False:
+            return None
+        return make_change(amount, self.coins)
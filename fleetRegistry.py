@@ -0,0 +1,284 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from structuredLogging import log_event
+from vendingMachine import VendingMachine
+
+logger = logging.getLogger("vending.fleet")
+
+# Machine ids become database file names, so keep them to a safe alphabet
+_MACHINE_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class UnknownMachineError(Exception):
+    """Exception raised when a machine id is not valid for the fleet."""
+    pass
+
+
+class _Loaded:
+    """A loaded machine, when it was last used and how many callers hold it."""
+
+    __slots__ = ("machine", "last_used", "users")
+
+    def __init__(self, machine, last_used):
+        self.machine = machine
+        self.last_used = last_used
+        self.users = 0
+
+
+class MachineRegistry:
+    """
+    The vending machines of a fleet served from one process.
+
+    Machines are built on first use and kept in least recently used order.
+    Once more than max_machines are loaded, or a machine has not been used
+    for idle_timeout seconds, the least recently used machines are closed,
+    writing out their buffered sales, so memory stays bounded however many
+    machines the fleet has. A machine that a caller has acquired and not yet
+    released, or with customers part way through a purchase, is never
+    evicted; the registry grows past its bound instead until they finish.
+
+    Machines are built and closed outside the registry lock, so a machine
+    migrating its database or writing out its ledger only holds up callers
+    of that machine. Callers of a machine being built or closed wait for it
+    to finish, so there is never more than one machine per database file.
+
+    Each machine keeps its stock and coins in its own database file, named
+    after its id, with its own engine, disposed of when it is evicted.
+
+    Attributes:
+        directory (str): The directory holding the machines' databases.
+        max_machines (int): The number of machines kept loaded.
+        idle_timeout (float): Seconds after its last use that a machine is
+            evicted, or None to evict only on capacity.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_machines=64,
+        idle_timeout=600.0,
+        storage_profile="balanced",
+        clock=time.monotonic,
+        **options,
+    ):
+        """
+        Initializes an empty MachineRegistry.
+
+        Args:
+            directory (str): The directory holding the machines' databases.
+                It is created if it does not exist.
+            max_machines (int): The number of machines kept loaded.
+            idle_timeout (float): Seconds after its last use that a machine
+                is evicted, or None to evict only on capacity.
+            storage_profile (str): The SQLite storage profile of every
+                machine, see storageProfile.PROFILES.
+            clock (callable): Returns the current monotonic time.
+            **options: Further keyword arguments for VendingMachine.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_machines = max_machines
+        self.idle_timeout = idle_timeout
+        self.storage_profile = storage_profile
+        self._clock = clock
+        self._options = options
+        self._machines = OrderedDict()  # machine_id: _Loaded
+        self._pending = {}              # machine_id: Future of a build or close
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._machines)
+
+    def loaded(self):
+        """
+        Returns the ids of the loaded machines.
+
+        Returns:
+            list: Machine ids, least recently used first.
+        """
+        with self._lock:
+            return list(self._machines)
+
+    def machines(self):
+        """
+        Returns the loaded machines without marking them as used.
+
+        Returns:
+            list: VendingMachines, least recently used first.
+        """
+        with self._lock:
+            return [entry.machine for entry in self._machines.values()]
+
+    def database_path(self, machine_id):
+        """
+        Returns the database file of a machine.
+
+        Args:
+            machine_id (str): The machine's id.
+
+        Returns:
+            str: The path of its SQLite database.
+        """
+        return os.path.join(self.directory, f"{machine_id}.db")
+
+    def acquire(self, machine_id):
+        """
+        Returns a machine, loading it if needed, and marks it as used.
+
+        The machine is not evicted until it is handed back with release.
+
+        Args:
+            machine_id (str): The machine's id.
+
+        Returns:
+            VendingMachine: The machine.
+
+        Raises:
+            UnknownMachineError: If the id is not a valid machine id.
+        """
+        if not _MACHINE_ID.fullmatch(machine_id):
+            raise UnknownMachineError(f"Invalid machine id {machine_id!r}")
+        while True:
+            with self._lock:
+                pending = self._pending.get(machine_id)
+                entry = self._machines.get(machine_id)
+                if pending is None and entry is not None:
+                    victims = self._use(machine_id, entry)
+                    break
+                if pending is None:
+                    pending = self._pending[machine_id] = Future()
+                    building = True
+                else:
+                    building = False
+            if not building:
+                # Wait for the machine to be built, or for its previous
+                # instance to be closed, then look again
+                pending.result()
+                continue
+            try:
+                machine = self._load(machine_id)
+            except BaseException as e:
+                with self._lock:
+                    del self._pending[machine_id]
+                pending.set_exception(e)
+                raise
+            with self._lock:
+                del self._pending[machine_id]
+                entry = self._machines[machine_id] = _Loaded(machine, None)
+                victims = self._use(machine_id, entry)
+                loaded = len(self._machines)
+            pending.set_result(None)
+            log_event(logger, logging.INFO, "fleet.machine_loaded",
+                      machine=machine_id, loaded=loaded)
+            break
+        self._unload(victims)
+        return entry.machine
+
+    def release(self, machine):
+        """
+        Hands back a machine from acquire, letting it be evicted again.
+
+        Args:
+            machine (VendingMachine): The machine acquire returned.
+        """
+        with self._lock:
+            entry = self._machines.get(machine.vending_machine_name)
+            if entry is not None and entry.machine is machine:
+                entry.users -= 1
+            victims = self._take_victims(self._clock())
+        self._unload(victims)
+
+    @contextmanager
+    def using(self, machine_id):
+        """
+        Acquires a machine for the duration of a with block.
+
+        Args:
+            machine_id (str): The machine's id.
+
+        Yields:
+            VendingMachine: The machine.
+        """
+        machine = self.acquire(machine_id)
+        try:
+            yield machine
+        finally:
+            self.release(machine)
+
+    def close(self):
+        """
+        Closes every loaded machine and disposes of their engines.
+        """
+        with self._lock:
+            victims = [
+                self._take(machine_id) for machine_id in list(self._machines)]
+        self._unload(victims)
+
+    def _load(self, machine_id):
+        return VendingMachine(
+            machine_id, self.database_path(machine_id),
+            storage_profile=self.storage_profile,
+            **self._options,
+        )
+
+    def _use(self, machine_id, entry):
+        # Pin and touch a machine, evicting others that fall out of bounds
+        now = self._clock()
+        entry.users += 1
+        entry.last_used = now
+        self._machines.move_to_end(machine_id)
+        return self._take_victims(now)
+
+    def _take(self, machine_id):
+        # Remove a machine, leaving a future for callers to wait on until it
+        # has been closed
+        entry = self._machines.pop(machine_id)
+        self._pending[machine_id] = Future()
+        return machine_id, entry.machine
+
+    def _take_victims(self, now):
+        # Walk from the least recently used end, skipping machines that are
+        # held by a caller or mid-purchase, until the registry is within
+        # bounds
+        victims = []
+        for machine_id, entry in list(self._machines.items()):
+            over_capacity = len(self._machines) > self.max_machines
+            idle = (
+                self.idle_timeout is not None
+                and now - entry.last_used > self.idle_timeout
+            )
+            if not (over_capacity or idle):
+                break
+            if entry.users:
+                continue
+            machine = entry.machine
+            machine.transactions.purge_expired()
+            if len(machine.transactions) or len(machine.holds):
+                continue
+            victims.append(self._take(machine_id))
+        return victims
+
+    def _unload(self, victims):
+        # Close machines taken out of the registry, outside its lock
+        for machine_id, machine in victims:
+            try:
+                machine.close()
+                machine.engine.dispose()
+            except Exception:
+                # The caller that triggered the eviction still gets its own
+                # machine; the failure is only logged
+                logger.exception("Closing machine %s failed", machine_id)
+            with self._lock:
+                pending = self._pending.pop(machine_id)
+                loaded = len(self._machines)
+            pending.set_result(None)
+            log_event(logger, logging.INFO, "fleet.machine_evicted",
+                      machine=machine_id, loaded=loaded)
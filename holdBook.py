@@ -0,0 +1,119 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class HoldBook:
+    """
+    Time-limited holds on product units between selection and payment.
+
+    Each open transaction may hold units of one or more products, e.g. one
+    unit of a selected product or every line of a cart. Holds are counted
+    per selection code, so the units available to a new customer are the
+    quantity in stock less the active holds. Expiry times are kept in a heap:
+    expired holds are popped off the top when the book is next used, and a
+    hold that was released or replaced early leaves a stale heap entry that
+    is skipped when it reaches the top, so no operation scans every hold.
+
+    Attributes:
+        ttl (float): Seconds a hold lasts unless it is renewed.
+    """
+
+    def __init__(self, ttl=60.0, clock=time.monotonic):
+        """
+        Initializes an empty HoldBook.
+
+        Args:
+            ttl (float): Seconds a hold lasts unless it is renewed.
+            clock (callable): Returns the current monotonic time.
+        """
+        self.ttl = ttl
+        self._clock = clock
+        self._holds = {}    # holder: ({selection_code: units}, sequence number)
+        self._counts = {}   # selection_code: active holds
+        self._expiries = [] # (expires_at, sequence number, holder)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._purge(self._clock())
+            return len(self._holds)
+
+    def held(self, selection_code, excluding=None):
+        """
+        Counts the active holds on a product.
+
+        Args:
+            selection_code (str): The product to count holds for.
+            excluding: A holder whose own hold should not be counted.
+
+        Returns:
+            int: The number of units held.
+        """
+        with self._lock:
+            self._purge(self._clock())
+            count = self._counts.get(selection_code, 0)
+            hold = self._holds.get(excluding)
+            if hold is not None:
+                count -= hold[0].get(selection_code, 0)
+            return count
+
+    def place(self, holder, selection_code):
+        """
+        Holds one unit for a holder, replacing any hold it already has and
+        restarting the expiry clock.
+
+        Args:
+            holder: The transaction the unit is held for.
+            selection_code (str): The product to hold.
+        """
+        self.place_items(holder, {selection_code: 1})
+
+    def place_items(self, holder, items):
+        """
+        Holds units of several products for a holder, replacing any hold it
+        already has and restarting the expiry clock.
+
+        Args:
+            holder: The transaction the units are held for.
+            items (dict): Mapping of selection code to the units to hold.
+        """
+        with self._lock:
+            now = self._clock()
+            self._purge(now)
+            self._drop(holder)
+            sequence = next(self._sequence)
+            self._holds[holder] = (dict(items), sequence)
+            for selection_code, units in items.items():
+                self._counts[selection_code] = (
+                    self._counts.get(selection_code, 0) + units)
+            heapq.heappush(self._expiries, (now + self.ttl, sequence, holder))
+
+    def release(self, holder):
+        """
+        Releases a holder's hold, if it has one.
+
+        Args:
+            holder: The transaction whose hold to release.
+        """
+        with self._lock:
+            self._drop(holder)
+
+    def _drop(self, holder):
+        hold = self._holds.pop(holder, None)
+        if hold is not None:
+            for selection_code, units in hold[0].items():
+                self._counts[selection_code] -= units
+                if not self._counts[selection_code]:
+                    del self._counts[selection_code]
+
+    def _purge(self, now):
+        # Expired holds surface at the top of the heap; entries for holds
+        # already released or renewed no longer match and are skipped
+        while self._expiries and self._expiries[0][0] <= now:
+            _expires_at, sequence, holder = heapq.heappop(self._expiries)
+            hold = self._holds.get(holder)
+            if hold is not None and hold[1] == sequence:
+                self._drop(holder)
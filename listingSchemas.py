@@ -0,0 +1,110 @@
+import json
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # Pinned in requirements.txt; fall back to the standard library
+    orjson = None
+
+
+# Response schemas, used to document the listing endpoints. The endpoints
+# send pre-encoded rows, so FastAPI never validates or re-encodes them
+class StockItem(BaseModel):
+    selection_code: str
+    product_name: str
+    cost: int
+    quantity: int
+    exact_change_only: bool
+
+
+class CoinItem(BaseModel):
+    value: int
+    quantity: int
+
+
+class StockPage(BaseModel):
+    items: List[StockItem]
+    next_after: Optional[str]
+
+
+class CoinPage(BaseModel):
+    items: List[CoinItem]
+    next_after: Optional[int]
+
+
+class StockRow:
+    """
+    One product in a listing, built straight from a row of column values.
+
+    Attributes:
+        selection_code (str): Unique code for product selection.
+        product_name (str): Name of the product.
+        cost (int): Cost of the product, in pence.
+        quantity (int): Available quantity of the product in stock.
+        exact_change_only (bool): Whether the machine could be unable to
+            give change for an overpayment.
+    """
+    __slots__ = (
+        "selection_code", "product_name", "cost", "quantity",
+        "exact_change_only")
+
+    def __init__(
+            self, selection_code, product_name, cost, quantity,
+            exact_change_only=False):
+        self.selection_code = selection_code
+        self.product_name = product_name
+        self.cost = cost
+        self.quantity = quantity
+        self.exact_change_only = exact_change_only
+
+    def as_dict(self):
+        return {
+            "selection_code": self.selection_code,
+            "product_name": self.product_name,
+            "cost": self.cost,
+            "quantity": self.quantity,
+            "exact_change_only": self.exact_change_only,
+        }
+
+
+class CoinRow:
+    """
+    One coin denomination in a listing.
+
+    Attributes:
+        value (int): The value of the coin in pence.
+        quantity (int): The number of coins held.
+    """
+    __slots__ = ("value", "quantity")
+
+    def __init__(self, value, quantity):
+        self.value = value
+        self.quantity = quantity
+
+    def as_dict(self):
+        return {"value": self.value, "quantity": self.quantity}
+
+
+def _as_dict(row):
+    if isinstance(row, (StockRow, CoinRow)):
+        return row.as_dict()
+    raise TypeError(f"Cannot encode {type(row).__name__}")
+
+
+def encode_listing(content):
+    """
+    Encodes listing rows, or a structure containing them, as JSON.
+
+    Uses orjson when it is installed and the standard library otherwise.
+
+    Args:
+        content: Rows, lists and dicts of rows, or plain JSON values.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_as_dict)
+    return json.dumps(content, default=_as_dict).encode()
@@ -0,0 +1,84 @@
+import bisect
+import threading
+
+
+class LowStockIndex:
+    """
+    Slots kept in order of remaining quantity.
+
+    The index holds a sorted list of (quantity, key) pairs alongside a
+    mapping of key to quantity, so the emptiest slots are read off the front
+    of the list and a quantity change moves one entry with two binary
+    searches instead of re-sorting the catalog.
+
+    Attributes:
+        quantities (dict): Mapping of slot key to quantity.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty LowStockIndex.
+        """
+        self.quantities = {}
+        self._ordered = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def load(self, items):
+        """
+        Replaces the index contents.
+
+        Args:
+            items (iterable): Pairs of (key, quantity).
+        """
+        with self._lock:
+            self.quantities = dict(items)
+            self._ordered = sorted(
+                (quantity, key) for key, quantity in self.quantities.items())
+
+    def set(self, key, quantity):
+        """
+        Records the quantity now held in a slot.
+
+        Args:
+            key: The slot, e.g. a selection code or coin value.
+            quantity (int): The quantity now held.
+        """
+        with self._lock:
+            old = self.quantities.get(key)
+            if old == quantity:
+                return
+            if old is not None:
+                del self._ordered[bisect.bisect_left(self._ordered, (old, key))]
+            self.quantities[key] = quantity
+            bisect.insort(self._ordered, (quantity, key))
+
+    def lowest(self, k):
+        """
+        Returns the k slots with the least remaining.
+
+        Args:
+            k (int): The number of slots to return.
+
+        Returns:
+            list: Up to k pairs of (key, quantity), lowest first.
+        """
+        with self._lock:
+            return [(key, quantity) for quantity, key in self._ordered[:max(k, 0)]]
+
+    def below(self, level):
+        """
+        Returns every slot holding less than a level.
+
+        Args:
+            level (int): The quantity to compare against.
+
+        Returns:
+            list: Pairs of (key, quantity), lowest first.
+        """
+        with self._lock:
+            # Every (quantity, key) with quantity < level sorts before (level,)
+            end = bisect.bisect_left(self._ordered, (level,))
+            return [(key, quantity) for quantity, key in self._ordered[:end]]
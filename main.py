@@ -1,143 +1,555 @@
+import asyncio
+import inspect
+import os
+
 import uvicorn
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from functools import partial
+
+from fastapi import (
+    APIRouter, Depends, FastAPI, HTTPException, Path, Query, Request,
+    Response)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.exc import SQLAlchemyError
 
-from typing import List, Union, Tuple
+from typing import Dict, List, Optional, Union, Tuple
 
 
+import metrics
+import structuredLogging
+from listingSchemas import (
+    CoinItem, CoinPage, StockItem, StockPage, encode_listing)
+from money import format_pence, is_accepted_coin
+from asyncVendingMachine import AsyncVendingMachine
+from fleetRegistry import MachineRegistry, UnknownMachineError
+from transactionStore import UnknownTransactionError
 from vendingMachine import (
     VendingMachine,
     SelectedCodeInvalidError,
     OutOfStockError,
+    PurchaseRaceLostError,
+    InvalidCoinError,
 )
 
-# Initialize the Vending Machine instance with a name and the database path
-vending_machine = VendingMachine("dev_vending_machine", "test.db")
-app = FastAPI()
+# Largest page the paginated listings will return
+MAX_PAGE_SIZE = 1000
+
+
+class LazyMachine:
+    """
+    Builds the vending machine the first time it is needed.
+
+    Creating the app does no database work, so importing this module, spawning
+    a worker or collecting tests stays cheap. The machine is built on the first
+    request, or at startup when preloading is enabled.
+    """
+
+    def __init__(self, factory, machine=None):
+        """
+        Initializes the LazyMachine.
+
+        Args:
+            factory (callable): Builds a VendingMachine or AsyncVendingMachine.
+            machine: An already built machine to serve instead.
+        """
+        self._factory = factory
+        self._machine = machine
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self):
+        return self._machine is not None
+
+    async def get(self):
+        """
+        Returns the machine, building and starting it on first use.
+
+        Returns:
+            VendingMachine | AsyncVendingMachine: The machine.
+        """
+        if self._machine is None:
+            async with self._lock:
+                # Requests racing the first build wait for it rather than
+                # building a machine each
+                if self._machine is None:
+                    machine = await run_in_threadpool(self._factory)
+                    if isinstance(machine, AsyncVendingMachine):
+                        await machine.start()
+                    self._machine = machine
+        return self._machine
+
+    async def close(self):
+        """
+        Closes the machine if it was ever built.
+        """
+        if self._machine is not None:
+            await call(self._machine.close)
+
+
+# Await a machine method, running sync ones in the threadpool so they never
+# block the event loop
+async def call(method, *args, **kwargs):
+    if inspect.iscoroutinefunction(method):
+        return await method(*args, **kwargs)
+    return await run_in_threadpool(method, *args, **kwargs)
+
+
+# Dependency giving each endpoint its machine: the app's own machine, or in
+# fleet mode the machine named by the machine_id in the path, held so it is
+# not evicted until the endpoint returns
+async def get_machine(request: Request):
+    machine_id = request.path_params.get("machine_id")
+    if machine_id is None:
+        yield await request.app.state.machine.get()
+        return
+    fleet = request.app.state.fleet
+    try:
+        machine = await run_in_threadpool(fleet.acquire, machine_id)
+    except UnknownMachineError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        yield machine
+    finally:
+        await run_in_threadpool(fleet.release, machine)
+
+
+# Hold a fleet machine for a streamed response, which is read after the
+# get_machine dependency has released it. Returns the function releasing it
+async def hold_machine(request, machine):
+    fleet = request.app.state.fleet
+    if fleet is None:
+        return None
+    await run_in_threadpool(fleet.acquire, machine.vending_machine_name)
+    return partial(fleet.release, machine)
+
+
+# Declares the machine_id path parameter of fleet routes
+async def fleet_machine_id(machine_id: str = Path()):
+    return machine_id
+
+
+# Start structured logging on startup, building the machine now if preloading
+# is enabled, and flush any buffered sales and queued log lines when the server
+# shuts down
+@asynccontextmanager
+async def lifespan(app):
+    structuredLogging.configure_logging(
+        os.environ.get("VENDING_LOG_LEVEL", "INFO"),
+        structuredLogging.parse_sample_rates(
+            os.environ.get("VENDING_LOG_SAMPLE_RATES", "")))
+    structuredLogging.set_sql_echo(
+        os.environ.get("VENDING_SQL_ECHO", "0") == "1")
+    if app.state.preload and app.state.machine is not None:
+        await app.state.machine.get()
+    yield
+    if app.state.machine is not None:
+        await app.state.machine.close()
+    if app.state.fleet is not None:
+        await run_in_threadpool(app.state.fleet.close)
+    structuredLogging.shutdown_logging()
+
+
+# Endpoints served for each machine, and endpoints served once per process
+router = APIRouter()
+admin_router = APIRouter()
+fleet_router = APIRouter()
+
+
+def create_app(
+    db_path=None,
+    use_async=None,
+    storage_profile=None,
+    preload=None,
+    machine=None,
+    fleet_dir=None,
+    max_machines=None,
+):
+    """
+    Creates the API application.
+
+    Settings not given are read from the environment: VENDING_DB_PATH
+    (default test.db), VENDING_MACHINE_ASYNC=1 to serve from the
+    aiosqlite-backed machine, VENDING_STORAGE_PROFILE (default balanced) and
+    VENDING_PRELOAD=1 to build the machine at startup rather than on the
+    first request.
+
+    Setting VENDING_FLEET_DIR serves a fleet instead of one machine: every
+    machine endpoint is served under /machines/{machine_id}, each machine
+    keeps its database in the fleet directory, and at most
+    VENDING_FLEET_MAX_MACHINES (default 64) machines are kept loaded.
+
+    Args:
+        db_path (str): The SQLite database path.
+        use_async (bool): Serve from the AsyncVendingMachine.
+        storage_profile (str): durable, balanced or fast.
+        preload (bool): Build the machine at startup.
+        machine: An already built machine to serve, e.g. for benchmarks.
+        fleet_dir (str): Serve a fleet with its databases in this directory.
+        max_machines (int): The number of fleet machines kept loaded.
+
+    Returns:
+        FastAPI: The application.
+    """
+    if db_path is None:
+        db_path = os.environ.get("VENDING_DB_PATH", "test.db")
+    if use_async is None:
+        use_async = os.environ.get("VENDING_MACHINE_ASYNC", "0") == "1"
+    if storage_profile is None:
+        storage_profile = os.environ.get("VENDING_STORAGE_PROFILE", "balanced")
+    if preload is None:
+        preload = os.environ.get("VENDING_PRELOAD", "0") == "1"
+    if fleet_dir is None:
+        fleet_dir = os.environ.get("VENDING_FLEET_DIR")
+    if max_machines is None:
+        max_machines = int(os.environ.get("VENDING_FLEET_MAX_MACHINES", "64"))
+    machine_class = AsyncVendingMachine if use_async else VendingMachine
+
+    def build_machine():
+        return machine_class(
+            "dev_vending_machine", db_path, storage_profile=storage_profile)
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.preload = preload
+    # Record latency and SQL statement counts for every request
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(admin_router)
+    if fleet_dir is None:
+        app.state.machine = LazyMachine(build_machine, machine)
+        app.state.fleet = None
+        app.include_router(router)
+    else:
+        app.state.machine = None
+        app.state.fleet = MachineRegistry(
+            fleet_dir, max_machines, storage_profile=storage_profile)
+        app.include_router(
+            router, prefix="/machines/{machine_id}",
+            dependencies=[Depends(fleet_machine_id)])
+        app.include_router(fleet_router)
+    return app
+
+
+# Endpoint exposing request, purchase, stock and coin metrics in the
+# Prometheus text format. Served once per process, with a machine label on
+# the purchase, stock and coin series, so in fleet mode one scrape covers
+# every loaded machine and counts each counter once
+@admin_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(request: Request):
+    if request.app.state.fleet is not None:
+        machines = request.app.state.fleet.machines()
+    else:
+        machines = [await request.app.state.machine.get()]
+    # Read from the in-memory indexes, copied as they may change meanwhile
+    metrics.update_machine_gauges(
+        (machine.vending_machine_name,
+         dict(machine.stock_index.quantities),
+         dict(machine.coin_inventory.coins))
+        for machine in machines)
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Serve a cached listing with its ETag, or 304 if the client already has it
+def snapshot_response(request, etag, payload):
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in client_etags or "*" in client_etags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(
+        content=payload, media_type="application/json", headers={"ETag": etag})
 
 # Endpoint to list the products in the vending machine
-@app.get("/stock/show_stock")
-def list_vending_contents():
-    data = vending_machine.print_vending_data()
-    return data
+@router.get("/stock/show_stock", response_model=List[StockItem])
+async def list_vending_contents(
+        request: Request, vending_machine=Depends(get_machine)):
+    etag, payload = await call(vending_machine.stock_snapshot)
+    return snapshot_response(request, etag, payload)
 
 # Endpoint to list the change in the vending machine
-@app.get("/machine_balance/show_change")
-def list_change_contents():
-    data = vending_machine.print_change_data()
-    return data
+@router.get("/machine_balance/show_change", response_model=List[CoinItem])
+async def list_change_contents(
+        request: Request, vending_machine=Depends(get_machine)):
+    etag, payload = await call(vending_machine.change_snapshot)
+    return snapshot_response(request, etag, payload)
 
-# Endpoint to update the vending machine stock, either one entry at a time
-# or multiple
-@app.put("/stock/restock")
-def update_vending_data(
-    data: Union[List[Tuple[str, str, float, int]], Tuple[str, str, float, int]]
-):
-    # If multiple entries are set to update at once
-    if all(isinstance(i, tuple) for i in data):
-        for row in data:
+# Send listing rows already encoded. The response_model of a listing endpoint
+# documents its schema, and returning a Response skips FastAPI's validation
+# and jsonable_encoder pass over every row
+def listing_response(content):
+    return Response(
+        content=encode_listing(content), media_type="application/json")
+
+# Serialise each page of a listing as newline-delimited JSON as it is read,
+# so only one page is ever held in memory. release, if given, is called once
+# the stream is finished
+def ndjson_response(pages, release=None):
+    def chunk(rows):
+        return b"".join(encode_listing(row) + b"\n" for row in rows)
+
+    if hasattr(pages, "__aiter__"):
+        async def body():
             try:
-                # Unpack the row into respective variables
-                selection_code = row[0]
-                product_name = row[1]
-                cost = row[2]
-                quantity = row[3]
-
-                # Stock the vending machine row with provided data
-                msg = vending_machine.stock_row(
-                    selection_code, product_name, cost, quantity
-                )
-            except Exception as e:
-                return {"error": f"Error occurred: {e}"}    # Return any errors
-
-    # If just one entry is set to update
+                async for rows in pages:
+                    yield chunk(rows)
+            finally:
+                if release is not None:
+                    await run_in_threadpool(release)
     else:
-        try:
-            selection_code = data[0]
-            product_name = data[1]
-            cost = data[2]
-            quantity = data[3]
-            vending_machine.stock_row(
-                selection_code, product_name, cost, quantity)
-        except Exception as e:
-            return {"error": f"Error occurred: {e}"}    # Return any errors
+        # Starlette pulls each page of a sync iterator in the threadpool
+        def body():
+            try:
+                for rows in pages:
+                    yield chunk(rows)
+            finally:
+                if release is not None:
+                    release()
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+# Endpoint for one page of the products, ordered by selection code. Pass the
+# returned next_after to get the following page
+@router.get("/stock/show_stock/page", response_model=StockPage)
+async def page_vending_contents(
+        after: Optional[str] = None,
+        limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+        vending_machine=Depends(get_machine)):
+    items, next_after = await call(vending_machine.stock_page, after, limit)
+    return listing_response({"items": items, "next_after": next_after})
+
+# Endpoint streaming every product as NDJSON, one object per line
+@router.get("/stock/show_stock/stream")
+async def stream_vending_contents(
+        request: Request, vending_machine=Depends(get_machine)):
+    return ndjson_response(
+        vending_machine.iter_stock_pages(),
+        await hold_machine(request, vending_machine))
+
+# Endpoint for one page of the coins, ordered by value
+@router.get("/machine_balance/show_change/page", response_model=CoinPage)
+async def page_change_contents(
+        after: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+        vending_machine=Depends(get_machine)):
+    items, next_after = await call(vending_machine.change_page, after, limit)
+    return listing_response({"items": items, "next_after": next_after})
+
+# Endpoint streaming every coin as NDJSON, one object per line
+@router.get("/machine_balance/show_change/stream")
+async def stream_change_contents(
+        request: Request, vending_machine=Depends(get_machine)):
+    return ndjson_response(
+        vending_machine.iter_change_pages(),
+        await hold_machine(request, vending_machine))
+
+# Endpoint listing the k emptiest product slots and coins
+@router.get("/stock/low")
+async def list_low_stock(k: int = 10, vending_machine=Depends(get_machine)):
+    return await call(vending_machine.low_stock, k)
+
+# Endpoint with the products and coins to load to bring the machine up to
+# target levels
+@router.get("/stock/restock_plan")
+async def get_restock_plan(
+        target: int = 10, coin_target: int = 20,
+        vending_machine=Depends(get_machine)):
+    return await call(vending_machine.restock_plan, target, coin_target)
+
+# Endpoint recommending how many of each coin to load for change, within a
+# cash cap in pence
+@router.get("/machine_balance/recommend_float")
+async def get_recommended_float(
+        cash_cap: int = Query(..., gt=0),
+        transactions: int = Query(200, ge=1, le=10000),
+        vending_machine=Depends(get_machine)):
+    # Imported here so NumPy is only loaded once a float is planned, not
+    # every time the app starts
+    import coinFloat
+    demand = await call(vending_machine.change_demand)
+    try:
+        return await run_in_threadpool(
+            coinFloat.recommend_from_demand, demand, cash_cap,
+            transactions=transactions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Endpoint to update the vending machine stock, either one entry at a time
+# or multiple. All rows are written in one transaction, or none if any row
+# fails validation
+@router.put("/stock/restock")
+async def update_vending_data(
+    data: Union[List[Tuple[str, str, int, int]], Tuple[str, str, int, int]],
+    vending_machine=Depends(get_machine),
+):
+    # If just one entry is set to update, treat it as a batch of one
+    rows = data if all(isinstance(i, tuple) for i in data) else [data]
+    try:
+        stocked, results = await call(vending_machine.stock_rows, list(rows))
+    except Exception as e:
+        return {"error": f"Error occurred: {e}"}    # Return any errors
+    if not stocked:
+        return {"error": "No rows stocked", "results": results}
     return {
-        'details': 'Desired machine rows stocked to set quantities, items and prices'}
+        'details': 'Desired machine rows stocked to set quantities, items and prices',
+        'results': results}
 
 
-# Endpoint to update the machine's change balance
-@app.put("/machine_balance/update/")
-def update_machine_balance(
-        data: Union[List[Tuple[float, int]], Tuple[float, int]]):
-    # If multiple entries are set to update at once
-    if all(isinstance(i, tuple) for i in data):
-        for row in data:
-            try:
-                value = row[0]
-                quantity = row[1]
-                vending_machine.restock_change(
-                    value, quantity)  # Update the change balance
-            except Exception as e:
-                return {"error": f"Error occurred: {e}"}  # Return any error
-    # If only one entry to update
-    else:
-        try:
-            value = data[0]
-            quantity = data[1]
-            vending_machine.restock_change(
-                value, quantity)  # Update the change balance
-        except Exception as e:
-            return {"error": f"Error occurred: {e}"}
-    return {'details': 'Desired coins stocked to inputted quantities'}
+# Endpoint to update the machine's change balance, either one coin at a time
+# or multiple, in one transaction
+@router.put("/machine_balance/update/")
+async def update_machine_balance(
+        data: Union[List[Tuple[int, int]], Tuple[int, int]],
+        vending_machine=Depends(get_machine)):
+    # If only one entry to update, treat it as a batch of one
+    rows = data if all(isinstance(i, tuple) for i in data) else [data]
+    try:
+        stocked, results = await call(
+            vending_machine.restock_change_rows, list(rows))
+    except Exception as e:
+        return {"error": f"Error occurred: {e}"}
+    if not stocked:
+        return {"error": "No coins stocked", "results": results}
+    return {'details': 'Desired coins stocked to inputted quantities',
+            'results': results}
 
 
-# Endpoint to check if a product is in stock and if so select it
-@app.put("/select_product")
-def check_stock(selection_code):
+# Look up a customer's transaction from its token
+async def get_transaction(vending_machine, token):
+    try:
+        return await call(vending_machine.get_transaction, token)
+    except UnknownTransactionError as e:
+        # Raise 404 for unknown or expired transactions
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+# Endpoint to check if a product is in stock and if so select it. Opens a new
+# transaction unless the token of an open one is given, and returns the token
+# to use for the rest of the purchase
+@router.put("/select_product")
+async def check_stock(
+        selection_code, token: Optional[str] = None,
+        vending_machine=Depends(get_machine)):
+    if token is None:
+        transaction = await call(vending_machine.open_transaction)
+    else:
+        transaction = await get_transaction(vending_machine, token)
     try:
-        cost = vending_machine.select_product(selection_code)
+        cost = await call(
+            vending_machine.select_product, selection_code, transaction)
         return {
             "details": (
-                f"Item is in stock and costs {cost}, "
+                f"Item is in stock and costs {format_pence(cost)}, "
                 "please insert cash to continue"
-            )
+            ),
+            "cost": cost,
+            "token": transaction.token,
         }
     except SelectedCodeInvalidError as e:
         # Raise 404 for invalid selection code
+        if token is None:
+            vending_machine.transactions.close(transaction.token)
         raise HTTPException(status_code=404, detail=str(e))
     except OutOfStockError as e:
         # Raise 404 for item out of stock
+        if token is None:
+            vending_machine.transactions.close(transaction.token)
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
+        if token is None:
+            vending_machine.transactions.close(transaction.token)
         raise HTTPException(
             status_code=500,
             detail=f"An unexpected error occurred with your request: {e}"
         )   # Raise 500 for any other errors
 
+# Endpoint to fill a cart with several products bought with one payment,
+# given as a mapping of selection code to units. Opens a new transaction
+# unless the token of an open one is given. Pay for the cart with the
+# coin endpoints; the whole cart is then sold in one commit, or none of it
+@router.put("/cart")
+async def fill_cart(
+        items: Dict[str, int], token: Optional[str] = None,
+        vending_machine=Depends(get_machine)):
+    if token is None:
+        transaction = await call(vending_machine.open_transaction)
+    else:
+        transaction = await get_transaction(vending_machine, token)
+    try:
+        cost = await call(vending_machine.set_cart, items, transaction)
+    except (SelectedCodeInvalidError, OutOfStockError, ValueError) as e:
+        if token is None:
+            vending_machine.transactions.close(transaction.token)
+        # Raise 404 for invalid codes or short stock, 400 for bad units
+        status_code = 400 if isinstance(e, ValueError) else 404
+        raise HTTPException(status_code=status_code, detail=str(e))
+    except Exception:
+        # Don't leave a transaction opened for this request behind
+        if token is None:
+            vending_machine.transactions.close(transaction.token)
+        raise
+    return {
+        "details": (
+            f"Items are in stock and cost {format_pence(cost)} in total, "
+            "please insert cash to continue"
+        ),
+        "cost": cost,
+        "token": transaction.token,
+    }
+
+# Endpoint showing a transaction's cart and the money inserted so far
+@router.get("/cart")
+async def get_cart(token: str, vending_machine=Depends(get_machine)):
+    transaction = await get_transaction(vending_machine, token)
+    cart = transaction.cart
+    lines = [] if cart is None else list(cart.lines.values())
+    return {
+        "items": [
+            {"selection_code": line.selection_code,
+             "product_name": line.product_name,
+             "cost": line.cost,
+             "units": line.units}
+            for line in lines
+        ],
+        "cost": 0 if cart is None else cart.cost,
+        "balance": transaction.money_cache,
+    }
+
 # Endpoint to cancel a transaction
-@app.put("/cancel_transaction")
-def cancel_transaction():
+@router.put("/cancel_transaction")
+async def cancel_transaction(token: str, vending_machine=Depends(get_machine)):
+    transaction = await get_transaction(vending_machine, token)
     # Reset the current selection and return change
-    msg = vending_machine.reset_selection()
+    msg = await call(vending_machine.reset_selection, transaction)
+    vending_machine.transactions.close(token)
     return {'details': f'{msg}'}
 
 # Endpoint to get the user's balance
-@app.get("/user_balance/")
-def get_user_balance():
-    balance = vending_machine.return_balance()
-    return {"balance": f'{balance}'}
+@router.get("/user_balance/")
+async def get_user_balance(token: str, vending_machine=Depends(get_machine)):
+    transaction = await get_transaction(vending_machine, token)
+    balance = await call(vending_machine.return_balance, transaction)
+    return {"balance": balance}
 
 # Endpoint to update the user's balance with inserted coins
-@app.post("/user_balance/update/")
-def update_user_balance(coin: float):
-    if coin not in [0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
-                    1, 2]:    # Check it is a valid denomination
+@router.post("/user_balance/update/")
+async def update_user_balance(
+        coin: int, token: str, vending_machine=Depends(get_machine)):
+    transaction = await get_transaction(vending_machine, token)
+    if not is_accepted_coin(coin):    # Check it is a valid denomination
         return {'details': "Not a valid coin, item has been returned"}
     # If a product has been selected, allow the user to proceed
-    if vending_machine.selected_product is not None:
+    if transaction.purchase is not None:
         try:
-            output = vending_machine.insert_money(coin)   # Insert the coin
+            output = await call(
+                vending_machine.insert_money,
+                coin, transaction)   # Insert the coin
             return {'details': f'{output}'}
+        except PurchaseRaceLostError as e:
+            # Raise 409 when a concurrent sale took the stock or the change
+            raise HTTPException(status_code=409, detail=str(e))
+        except SQLAlchemyError as e:
+            # Raise 500 when the sale could not be written at all
+            raise HTTPException(
+                status_code=500,
+                detail=f"An unexpected error occurred with your request: {e}")
         except Exception as e:
             return {"error": f"Error occurred: {e}"}
     else:
@@ -145,6 +557,96 @@ def update_user_balance(coin: float):
         return {'details': "Please select a product first. Change returned"}
 
 
-# Main entry point to run the FastAPI application
+# Endpoint to insert several coins in one request. All coins are validated
+# before any is taken, and the purchase is evaluated once for their total
+@router.post("/user_balance/insert_coins/")
+async def insert_user_coins(
+        coins: List[int], token: str, vending_machine=Depends(get_machine)):
+    transaction = await get_transaction(vending_machine, token)
+    if transaction.purchase is None:
+        # Prompt user to select a product first and return their coins
+        return {'details': "Please select a product first. Change returned"}
+    try:
+        output = await call(vending_machine.insert_coins, coins, transaction)
+        return {'details': f'{output}'}
+    except InvalidCoinError as e:
+        # Raise 400 if any coin is not an accepted denomination
+        raise HTTPException(status_code=400, detail=str(e))
+    except PurchaseRaceLostError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred with your request: {e}")
+    except Exception as e:
+        return {"error": f"Error occurred: {e}"}
+
+# Endpoint for units sold and revenue per product over the last hour, day or
+# week, read from rolling aggregates rather than the sales history
+@router.get("/analytics/sales")
+async def get_sales_summary(
+        window: str = "hour", vending_machine=Depends(get_machine)):
+    try:
+        return await call(vending_machine.sales_summary, window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Endpoint for the best selling products over the last hour, day or week
+@router.get("/analytics/top_sellers")
+async def get_top_sellers(
+        window: str = "day", n: int = 5, by: str = "units",
+        vending_machine=Depends(get_machine)):
+    try:
+        return await call(vending_machine.top_sellers, window, n, by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Admin endpoint to switch logging of every SQL statement on or off
+@admin_router.put("/admin/sql_echo")
+async def set_sql_echo(enabled: bool):
+    structuredLogging.set_sql_echo(enabled)
+    return {"sql_echo": structuredLogging.sql_echo_enabled()}
+
+
+# Admin endpoint to change the level of the vending machine's logs
+@admin_router.put("/admin/log_level")
+async def set_log_level(level: str):
+    try:
+        structuredLogging.set_log_level(level.upper())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"log_level": level.upper()}
+
+
+# Admin endpoint replacing the fraction of each event's log lines kept
+@admin_router.put("/admin/log_sampling")
+async def set_log_sampling(rates: Dict[str, float]):
+    try:
+        structuredLogging.set_sample_rates(rates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sample_rates": structuredLogging.sample_rates()}
+
+
+# Admin endpoint reporting the storage profile and active SQLite settings
+@router.get("/admin/diagnostics/storage")
+async def get_storage_diagnostics(vending_machine=Depends(get_machine)):
+    return await call(vending_machine.storage_diagnostics)
+
+
+# Fleet endpoint listing the machines currently loaded
+@fleet_router.get("/machines")
+async def list_loaded_machines(request: Request):
+    fleet = request.app.state.fleet
+    return {"loaded": fleet.loaded(), "max_machines": fleet.max_machines}
+
+
+app = create_app()
+
+
+# Main entry point to run the FastAPI application. Transactions, holds and
+# cached listings live in this process, so it runs as a single worker
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)   # Start the server
@@ -0,0 +1,317 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+
+# Statement count for the request being handled, shared with threadpool
+# workers through the copied context
+_sql_statements = contextvars.ContextVar("sql_statements", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """
+    A monotonically increasing count, optionally split by labels.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): A description of the metric.
+        labelnames (tuple): The names of the labels.
+    """
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        """
+        Increments the count for a set of label values.
+
+        Args:
+            *labels: The label values, in labelnames order.
+            amount (int): The amount to add.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    A distribution of observed values in cumulative buckets.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): A description of the metric.
+        labelnames (tuple): The names of the labels.
+        buckets (tuple): The upper bounds of the buckets.
+    """
+
+    def __init__(self, name, help, labelnames=(), buckets=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """
+        Records one observation for a set of label values.
+
+        Args:
+            value (float): The observed value.
+            *labels: The label values, in labelnames order.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[-1] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, [("le", bound)])
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{label_text} {series[-1]}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {series[-2]}")
+            lines.append(f"{self.name}_count{label_text} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """
+    A value that can go up and down, optionally split by labels.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): A description of the metric.
+        labelnames (tuple): The names of the labels.
+    """
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def set_all(self, values):
+        """
+        Replaces every series of the gauge at once.
+
+        Args:
+            values (dict): Mapping of label value tuples to gauge values.
+        """
+        self._values = dict(values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Registry:
+    """
+    A collection of metrics rendered together in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics text.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REGISTRY = Registry()
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "vending_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ("method", "route"),
+    LATENCY_BUCKETS,
+))
+REQUEST_SQL_STATEMENTS = REGISTRY.register(Histogram(
+    "vending_http_request_sql_statements",
+    "SQL statements executed per HTTP request by route.",
+    ("method", "route"),
+    (0, 1, 2, 3, 5, 8, 13, 21, 50),
+))
+SQL_STATEMENTS = REGISTRY.register(Counter(
+    "vending_sql_statements_total",
+    "SQL statements executed by the vending machine engine.",
+))
+PURCHASE_OUTCOMES = REGISTRY.register(Counter(
+    "vending_purchase_outcomes_total",
+    "Coin insertions by machine and purchase outcome.",
+    ("machine", "outcome"),
+))
+PURCHASE_STEP_LATENCY = REGISTRY.register(Histogram(
+    "vending_purchase_step_duration_seconds",
+    "Time spent in each step of insert_money by machine.",
+    ("machine", "step"),
+    LATENCY_BUCKETS,
+))
+STOCK_QUANTITY = REGISTRY.register(Gauge(
+    "vending_stock_quantity",
+    "Units in stock per machine and selection code.",
+    ("machine", "selection_code"),
+))
+COIN_QUANTITY = REGISTRY.register(Gauge(
+    "vending_coin_quantity",
+    "Coins held per machine and denomination in pence.",
+    ("machine", "denomination"),
+))
+
+
+def track_sql(engine):
+    """
+    Counts the statements executed on an engine, in total and per request.
+
+    Args:
+        engine (Engine): The sync SQLAlchemy engine to listen on.
+    """
+    # Machines sharing an engine each ask for it to be tracked; listen once
+    if not event.contains(engine, "before_cursor_execute", _count_statement):
+        event.listen(engine, "before_cursor_execute", _count_statement)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    SQL_STATEMENTS.inc()
+    counter = _sql_statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def update_machine_gauges(machines):
+    """
+    Refreshes the stock and coin gauges, typically just before a scrape.
+
+    Machines not given lose their series, so a fleet machine that has been
+    unloaded drops out of the gauges.
+
+    Args:
+        machines (iterable): (machine name, stock levels, coins) tuples, where
+            stock levels map selection code to quantity and coins map coin
+            denomination (pence) to quantity held.
+    """
+    stock, coins = {}, {}
+    for name, stock_levels, coin_counts in machines:
+        stock.update(
+            ((name, code), quantity) for code, quantity in stock_levels.items())
+        coins.update(
+            ((name, value), count) for value, count in coin_counts.items())
+    STOCK_QUANTITY.set_all(stock)
+    COIN_QUANTITY.set_all(coins)
+
+
+class _StepTimer:
+    __slots__ = ("machine", "step", "start")
+
+    def __init__(self, machine, step):
+        self.machine = machine
+        self.step = step
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        PURCHASE_STEP_LATENCY.observe(
+            time.perf_counter() - self.start, self.machine, self.step)
+
+
+def timed_step(machine, step):
+    """
+    Returns a context manager recording the time spent in a purchase step.
+
+    Args:
+        machine (str): The name of the machine making the purchase.
+        step (str): The name of the step.
+
+    Returns:
+        _StepTimer: The context manager.
+    """
+    return _StepTimer(machine, step)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and SQL statement counts per route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        counter = [0]
+        token = _sql_statements.set(counter)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            _sql_statements.reset(token)
+            # The router records the matched route in the shared scope
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.observe(elapsed, scope["method"], path)
+            REQUEST_SQL_STATEMENTS.observe(counter[0], scope["method"], path)
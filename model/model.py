@@ -1,6 +1,8 @@
-from sqlalchemy import Float, func, String
+from sqlalchemy import Float, func, Integer, String
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from money import format_pence
+
 # sqlalchemy declarative base class import to enable ORM
 class Base(DeclarativeBase):
     pass
@@ -14,14 +16,14 @@ class Vending_machine_entry(Base):
     Attributes:
         selection_code (str): Unique code for product selection (primary key).
         product_name (str): Name of the product.
-        cost (float): Cost of the product.
+        cost (int): Cost of the product, in pence.
         quantity (int): Available quantity of the product in stock.
 
     Methods:
         is_in_stock() -> bool:
             Checks if the product is currently in stock.
 
-        try_purchase(money_inserted: float) -> Tuple[str, str]:
+        try_purchase(money_inserted: int) -> Tuple[str, str]:
             Attempts to process a purchase based on the amount of money inserted.
             Returns a status indicating the outcome of the purchase attempt
             and a message providing further information.
@@ -32,7 +34,7 @@ class Vending_machine_entry(Base):
     __tablename__ = "vending_data"
     selection_code: Mapped[str] = mapped_column(primary_key=True)
     product_name: Mapped[str] = mapped_column(String(30))
-    cost: Mapped[float]
+    cost: Mapped[int]
     # have a max quantity that it can be?
     quantity: Mapped[int] = mapped_column()
 
@@ -44,13 +46,13 @@ class Vending_machine_entry(Base):
 
     def try_purchase(self, money_inserted):
         if money_inserted < self.cost:
-            rounded_outstanding = round(self.cost - money_inserted, 2)
-            return "UNSOLD", f'Insufficient funds, please insert at least {rounded_outstanding}'
+            outstanding = format_pence(self.cost - money_inserted)
+            return "UNSOLD", f'Insufficient funds, please insert at least {outstanding}'
         elif money_inserted == self.cost:
             return "SOLD", f'Exact funds inserted, dispensing {self.product_name}'
         else:
             # excess funds inserted, need to handle this on
-            return "EVALUATE", f'Excess funds inserted, dispensing {self.product_name} and returning £{money_inserted - self.cost}'
+            return "EVALUATE", f'Excess funds inserted, dispensing {self.product_name} and returning {format_pence(money_inserted - self.cost)}'
 
     def purchase(self):
         self.quantity -= 1
@@ -62,16 +64,16 @@ class Change(Base):
         Represents a data entry for the change available in a vending machine.
 
         Attributes:
-            value (float): The monetary value of the change (primary key).
+            value (int): The value of the coin in pence (primary key).
             quantity (int): The quantity of coins/bills of this value available.
 
         Methods:
-            sum_costs(session: Session) -> float:
+            sum_costs(session: Session) -> int:
                 Calculates the total value of all change entries in the database.
-                Returns the sum of the product of each change value and its quantity.
+                Returns the sum of the product of each change value and its quantity, in pence.
     """
     __tablename__ = "change_data"
-    value: Mapped[float] = mapped_column(Float, primary_key=True, index=True)
+    value: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     # have a max quantity that it can be?
     quantity: Mapped[int] = mapped_column()
 
@@ -80,3 +82,30 @@ class Change(Base):
         total_change = session.query(
             func.sum(cls.value * cls.quantity)).scalar()
         return total_change
+
+
+# Sales ledger entries object, inherits from Base to define a SQLAlchemy
+# model. Rows are only ever appended
+class Sale_ledger_entry(Base):
+    """
+        Represents one completed sale in the append-only sales ledger.
+
+        Attributes:
+            id (int): Sequence number of the sale (primary key).
+            sold_at (float): Unix time of the sale.
+            selection_code (str): Code of the product sold.
+            product_name (str): Name of the product sold.
+            price (int): Price of the product at the time of sale, in pence.
+            amount_paid (int): Money inserted by the customer, in pence.
+            change_given (int): Change paid out, in pence.
+            change_breakdown (str): JSON mapping of coin (pence) to count paid out.
+    """
+    __tablename__ = "sales_ledger"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    sold_at: Mapped[float] = mapped_column(Float, index=True)
+    selection_code: Mapped[str] = mapped_column(String)
+    product_name: Mapped[str] = mapped_column(String(30))
+    price: Mapped[int]
+    amount_paid: Mapped[int]
+    change_given: Mapped[int]
+    change_breakdown: Mapped[str] = mapped_column(String, default="{}")
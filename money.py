@@ -0,0 +1,65 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Money is held as whole pence (int) everywhere: in the database columns, in
+# the machine's arithmetic and in the API. Pounds only appear in messages.
+
+# Coins a customer can insert, in pence
+ACCEPTED_COINS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def to_pence(amount):
+    """
+    Converts a monetary amount in pounds to integer pence.
+
+    The amount is routed through Decimal so that float inputs such as 0.1 or
+    1.99 land on the intended whole number of pence rather than drifting.
+    Used by schemaMigration to convert old Float pounds columns to pence.
+
+    Args:
+        amount (float | int | str | Decimal): The amount in pounds.
+
+    Returns:
+        int: The amount in pence.
+    """
+    pence = Decimal(str(amount)) * 100
+    return int(pence.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def format_pence(pence):
+    """
+    Formats an amount in pence as pounds for a message, e.g. "£1.30".
+
+    Args:
+        pence (int): The amount in pence.
+
+    Returns:
+        str: The amount in pounds and pence.
+    """
+    pounds, pence = divmod(pence, 100)
+    return f"£{pounds}.{pence:02d}"
+
+
+def is_pence(value):
+    """
+    Checks that a value is a non-negative whole number of pence.
+
+    Args:
+        value: The value to check.
+
+    Returns:
+        bool: True for a non-negative int (bools excluded).
+    """
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def is_accepted_coin(value):
+    """
+    Checks that a value is a coin the machine accepts from customers.
+
+    Args:
+        value (int): The coin in pence.
+
+    Returns:
+        bool: True if the coin is accepted.
+    """
+    return is_pence(value) and value in ACCEPTED_COINS
@@ -0,0 +1,205 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+# Rolling windows as (bucket width in seconds, number of buckets)
+WINDOWS = {
+    "hour": (60, 60),
+    "day": (15 * 60, 96),
+    "week": (60 * 60, 168),
+}
+
+
+class RollingWindow:
+    """
+    Units and revenue per selection code over a rolling period of time.
+
+    Sales are added to fixed-width time buckets and to running totals. When
+    a bucket falls out of the window its counts are subtracted from the
+    totals, so the totals are always current and reading them never touches
+    individual sales. The window is accurate to one bucket width.
+
+    Attributes:
+        bucket_seconds (int): The width of each bucket in seconds.
+        bucket_count (int): The number of buckets the window spans.
+        totals (dict): Mapping of selection code to [units, revenue_pence].
+    """
+
+    def __init__(self, bucket_seconds, bucket_count):
+        """
+        Initializes an empty RollingWindow.
+
+        Args:
+            bucket_seconds (int): The width of each bucket in seconds.
+            bucket_count (int): The number of buckets the window spans.
+        """
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = bucket_count
+        self.totals = {}
+        # (bucket index, {selection_code: [units, revenue_pence]}), oldest first
+        self._buckets = deque()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def add(self, sold_at, selection_code, revenue_pence, units=1):
+        """
+        Counts a sale in the bucket covering its time.
+
+        Args:
+            sold_at (float): Unix time of the sale.
+            selection_code (str): The product sold.
+            revenue_pence (int): The price paid, in pence.
+            units (int): The number of units sold.
+        """
+        index = int(sold_at // self.bucket_seconds)
+        if self._buckets and index < self._buckets[-1][0]:
+            # Sales arrive in time order, so a search here is rare
+            position = next(
+                p for p, (i, _) in enumerate(self._buckets) if i >= index)
+            if self._buckets[position][0] != index:
+                self._buckets.insert(position, (index, {}))
+            bucket = self._buckets[position][1]
+        else:
+            if not self._buckets or self._buckets[-1][0] != index:
+                self._buckets.append((index, {}))
+            bucket = self._buckets[-1][1]
+        for counts in (bucket, self.totals):
+            entry = counts.setdefault(selection_code, [0, 0])
+            entry[0] += units
+            entry[1] += revenue_pence
+
+    def advance(self, now):
+        """
+        Drops buckets that have fallen out of the window.
+
+        Args:
+            now (float): The current Unix time.
+        """
+        oldest = int(now // self.bucket_seconds) - self.bucket_count + 1
+        while self._buckets and self._buckets[0][0] < oldest:
+            _, expired = self._buckets.popleft()
+            for selection_code, (units, revenue) in expired.items():
+                entry = self.totals[selection_code]
+                entry[0] -= units
+                entry[1] -= revenue
+                if entry[0] == 0 and entry[1] == 0:
+                    del self.totals[selection_code]
+
+
+class SalesAnalytics:
+    """
+    Incrementally maintained sales aggregates for the last hour, day and week.
+
+    Each sale updates every window once, and queries read the windows'
+    running totals, so answering a query costs the same however many sales
+    have been made.
+    """
+
+    def __init__(self, clock=time.time):
+        """
+        Initializes SalesAnalytics with empty windows.
+
+        Args:
+            clock (callable): Returns the current Unix time.
+        """
+        self._clock = clock
+        self._windows = {
+            name: RollingWindow(*shape) for name, shape in WINDOWS.items()}
+        self._lock = threading.Lock()
+
+    def load(self, sales):
+        """
+        Warm-starts the windows from past sales, e.g. the sales ledger.
+
+        Args:
+            sales (iterable): (sold_at, selection_code, revenue_pence) tuples
+                in time order.
+        """
+        for sold_at, selection_code, revenue_pence in sales:
+            self.record(sold_at, selection_code, revenue_pence)
+
+    def record(self, sold_at, selection_code, revenue_pence, units=1):
+        """
+        Adds a sale to every window.
+
+        Each window is then moved on to the current time, so buckets are
+        dropped as sales arrive and a window never holds more than its span
+        of buckets, whether or not it is ever queried. A sale already older
+        than a window, e.g. a week old sale loaded into the hour window, is
+        dropped from it straight away.
+
+        Args:
+            sold_at (float): Unix time of the sale.
+            selection_code (str): The product sold.
+            revenue_pence (int): The price paid, in pence.
+            units (int): The number of units sold.
+        """
+        now = max(sold_at, self._clock())
+        with self._lock:
+            for window in self._windows.values():
+                window.add(sold_at, selection_code, revenue_pence, units)
+                window.advance(now)
+
+    def summary(self, window):
+        """
+        Returns units sold and revenue per selection code over a window.
+
+        Args:
+            window (str): "hour", "day" or "week".
+
+        Returns:
+            dict: The window, its per-code sales sorted by selection code, and
+                the overall units and revenue. Revenue is in pence.
+
+        Raises:
+            ValueError: If the window is unknown.
+        """
+        totals = self._totals(window)
+        sales = [
+            {"selection_code": code, "units": units, "revenue": revenue}
+            for code, (units, revenue) in sorted(totals.items())
+        ]
+        return {
+            "window": window,
+            "sales": sales,
+            "units": sum(units for units, _ in totals.values()),
+            "revenue": sum(revenue for _, revenue in totals.values()),
+        }
+
+    def top_sellers(self, window, n=5, by="units"):
+        """
+        Returns the best selling products over a window.
+
+        Args:
+            window (str): "hour", "day" or "week".
+            n (int): The number of products to return.
+            by (str): Rank by "units" or "revenue".
+
+        Returns:
+            list: Up to n dicts of selection_code, units and revenue, best
+                first.
+
+        Raises:
+            ValueError: If the window or ranking is unknown.
+        """
+        if by not in ("units", "revenue"):
+            raise ValueError(f"Unknown ranking {by!r}, expected units or revenue")
+        rank = 0 if by == "units" else 1
+        totals = self._totals(window)
+        best = heapq.nlargest(
+            n, totals.items(), key=lambda item: (item[1][rank], item[1][1 - rank]))
+        return [
+            {"selection_code": code, "units": units, "revenue": revenue}
+            for code, (units, revenue) in best
+        ]
+
+    def _totals(self, window):
+        if window not in self._windows:
+            raise ValueError(
+                f"Unknown window {window!r}, expected one of {list(WINDOWS)}")
+        with self._lock:
+            rolling = self._windows[window]
+            rolling.advance(self._clock())
+            return {code: tuple(entry) for code, entry in rolling.totals.items()}
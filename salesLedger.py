@@ -0,0 +1,120 @@
+import threading
+import time
+
+from sqlalchemy import insert
+
+from model.model import Sale_ledger_entry
+
+
+class SalesLedger:
+    """
+    An in-process buffer of sales waiting to be appended to the ledger table.
+
+    Sales are recorded in memory on the purchase path and written in groups,
+    one insert and one commit per batch, so a purchase never waits on a commit
+    of its own. A batch is due once it holds max_batch sales or its oldest
+    sale has waited max_latency seconds, which bounds how much a crash can
+    lose to the last max_latency seconds of sales.
+
+    Attributes:
+        max_batch (int): Sales per group commit before a flush is due.
+        max_latency (float): Longest time in seconds a sale may wait.
+    """
+
+    def __init__(self, max_batch=100, max_latency=0.5):
+        """
+        Initializes an empty SalesLedger.
+
+        Args:
+            max_batch (int): Sales per group commit before a flush is due.
+            max_latency (float): Longest time in seconds a sale may wait.
+        """
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._buffer = []
+        self._oldest = None
+        self._ready = threading.Condition()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def record(self, **sale):
+        """
+        Buffers one sale for the next group commit.
+
+        Args:
+            **sale: Column values for a Sale_ledger_entry row.
+        """
+        with self._ready:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(sale)
+            # The first sale starts the latency clock, a full batch ends it
+            if len(self._buffer) == 1 or len(self._buffer) >= self.max_batch:
+                self._ready.notify()
+
+    def flush_due(self):
+        """
+        Checks whether the buffered sales should be written now.
+
+        Returns:
+            bool: True if the batch is full or has waited long enough.
+        """
+        if not self._buffer:
+            return False
+        return (
+            len(self._buffer) >= self.max_batch
+            or time.monotonic() - self._oldest >= self.max_latency
+        )
+
+    def wait_until_due(self, timeout):
+        """
+        Blocks until a flush is due, wake() is called or the timeout passes.
+
+        Args:
+            timeout (float): The longest time to wait, in seconds.
+        """
+        with self._ready:
+            if self.flush_due():
+                return
+            if self._buffer:
+                timeout = min(
+                    timeout, self._oldest + self.max_latency - time.monotonic())
+            if timeout > 0:
+                self._ready.wait(timeout)
+
+    def wake(self):
+        """
+        Wakes any thread blocked in wait_until_due, e.g. on shutdown.
+        """
+        with self._ready:
+            self._ready.notify_all()
+
+    def flush(self, session):
+        """
+        Appends all buffered sales to the ledger table in one transaction.
+
+        If the write fails the sales are put back at the front of the buffer
+        to be retried on the next flush.
+
+        Args:
+            session (Session): The database session to write with.
+
+        Returns:
+            int: The number of sales written.
+        """
+        with self._ready:
+            batch, self._buffer = self._buffer, []
+            oldest, self._oldest = self._oldest, None
+        if not batch:
+            return 0
+        try:
+            session.execute(insert(Sale_ledger_entry.__table__), batch)
+            session.commit()
+        except Exception:
+            session.rollback()
+            with self._ready:
+                self._buffer = batch + self._buffer
+                self._oldest = oldest
+            raise
+        return len(batch)
@@ -0,0 +1,114 @@
+import logging
+
+from model.model import Base
+from money import to_pence
+from structuredLogging import log_event
+
+logger = logging.getLogger("vending.migration")
+
+# Stored in the database's PRAGMA user_version. A database stamped with the
+# current version already has every table, so bump this whenever the models
+# change and add the upgrade to migrate().
+#   0: money held as Float pounds (databases created before versioning)
+#   1: money held as Integer pence
+SCHEMA_VERSION = 1
+
+# Money columns held as pounds in version 0 databases
+_MONEY_COLUMNS = {
+    "vending_data": ("cost",),
+    "change_data": ("value",),
+    "sales_ledger": ("price", "amount_paid", "change_given"),
+}
+
+
+def schema_version(connection):
+    """
+    Reads the schema version recorded in a database.
+
+    Args:
+        connection (Connection): A SQLAlchemy connection.
+
+    Returns:
+        int: The PRAGMA user_version of the database.
+    """
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine):
+    """
+    Brings a database up to the current schema version.
+
+    Databases already at the current version are left alone: reading the
+    version is a single PRAGMA, so opening a known database skips
+    create_all and its table-by-table inspection. New databases have their
+    tables created and are stamped with the current version.
+
+    Version 0 databases hold money as Float pounds, so each table with a
+    money column is renamed, recreated with Integer pence columns and
+    copied across, converting pounds to pence. The migration runs in one
+    transaction, so an interrupted upgrade leaves the database as it was.
+
+    Args:
+        engine (Engine): The sync SQLAlchemy engine of the database.
+    """
+    with engine.connect() as connection:
+        if schema_version(connection) >= SCHEMA_VERSION:
+            connection.rollback()
+            return
+        # Take the write lock up front so no sale lands mid-migration
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        legacy = [
+            table for table in _MONEY_COLUMNS
+            if _is_float_pounds(connection, table)
+        ]
+        for table in legacy:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table} RENAME TO {table}_pounds")
+            # Index names stay with the renamed table and would clash
+            indexes = connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index' "
+                f"AND tbl_name = '{table}_pounds' AND sql IS NOT NULL"
+            ).scalars().all()
+            for index in indexes:
+                connection.exec_driver_sql(f"DROP INDEX {index}")
+        Base.metadata.create_all(connection)
+        for table in legacy:
+            _copy_as_pence(connection, table)
+            connection.exec_driver_sql(f"DROP TABLE {table}_pounds")
+        connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.commit()
+    if legacy:
+        log_event(logger, logging.INFO, "schema.migrated",
+                  version=SCHEMA_VERSION, tables=legacy)
+
+
+def _is_float_pounds(connection, table):
+    columns = {
+        row[1]: row[2].upper()
+        for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")
+    }
+    return any(
+        columns.get(column) in ("FLOAT", "REAL")
+        for column in _MONEY_COLUMNS[table]
+    )
+
+
+def _copy_as_pence(connection, table):
+    # Convert with money.to_pence, so pounds round to pence exactly as they
+    # do elsewhere (1.005 is 101p, where ROUND(1.005 * 100) in SQL gives 100)
+    connection.connection.driver_connection.create_function(
+        "to_pence", 1, _to_pence_or_null, deterministic=True)
+    columns = [
+        column.name for column in Base.metadata.tables[table].columns]
+    selected = [
+        f"to_pence({column})" if column in _MONEY_COLUMNS[table] else column
+        for column in columns
+    ]
+    connection.exec_driver_sql(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {', '.join(selected)} FROM {table}_pounds"
+    )
+
+
+def _to_pence_or_null(amount):
+    return None if amount is None else to_pence(amount)
@@ -0,0 +1,132 @@
+from sqlalchemy import event
+
+# PRAGMA and connection pool settings for each storage profile.
+#   durable:  SQLite's rollback journal with a full fsync on every commit
+#   balanced: write-ahead log, fsync only at checkpoints; survives process
+#             crashes and loses at most the last commits on power loss
+#   fast:     write-ahead log without fsync and larger caches, for
+#             simulations, benchmarks and rebuildable data
+PROFILES = {
+    "durable": {
+        "pragmas": {
+            "journal_mode": "DELETE",
+            "synchronous": "FULL",
+            "cache_size": -2000,
+            "mmap_size": 0,
+            "busy_timeout": 5000,
+        },
+        "pool": {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30},
+    },
+    "balanced": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -16000,
+            "mmap_size": 64 * 1024 * 1024,
+            "busy_timeout": 5000,
+        },
+        "pool": {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30},
+    },
+    "fast": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "OFF",
+            "cache_size": -64000,
+            "mmap_size": 256 * 1024 * 1024,
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,
+        },
+        "pool": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 30},
+    },
+}
+
+# PRAGMAs that only apply to databases stored in a file
+_FILE_ONLY_PRAGMAS = ("journal_mode", "mmap_size")
+
+_SYNCHRONOUS_NAMES = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}
+_TEMP_STORE_NAMES = {0: "DEFAULT", 1: "FILE", 2: "MEMORY"}
+
+
+def get_profile(name):
+    """
+    Looks up a storage profile by name.
+
+    Args:
+        name (str): "durable", "balanced" or "fast".
+
+    Returns:
+        dict: The profile's pragmas and pool settings.
+
+    Raises:
+        ValueError: If the profile name is unknown.
+    """
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown storage profile {name!r}, expected one of {sorted(PROFILES)}"
+        ) from None
+
+
+def pool_options(name, in_memory):
+    """
+    Returns the create_engine pool arguments for a profile.
+
+    In-memory databases share one connection, so they take no pool sizing.
+
+    Args:
+        name (str): The storage profile name.
+        in_memory (bool): Whether the database is in memory.
+
+    Returns:
+        dict: Keyword arguments for create_engine.
+    """
+    if in_memory:
+        return {}
+    return dict(get_profile(name)["pool"])
+
+
+def apply_profile(engine, name, in_memory):
+    """
+    Sets a profile's PRAGMAs on every new connection made by an engine.
+
+    Args:
+        engine (Engine): The sync SQLAlchemy engine.
+        name (str): The storage profile name.
+        in_memory (bool): Whether the database is in memory.
+    """
+    pragmas = [
+        (pragma, value)
+        for pragma, value in get_profile(name)["pragmas"].items()
+        if not (in_memory and pragma in _FILE_ONLY_PRAGMAS)
+    ]
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas:
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+def read_settings(connection):
+    """
+    Reads the storage settings active on a database connection.
+
+    Args:
+        connection (Connection): A SQLAlchemy connection.
+
+    Returns:
+        dict: The current value of each PRAGMA a profile can set.
+    """
+    def pragma(name):
+        return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+    return {
+        "journal_mode": str(pragma("journal_mode")).upper(),
+        "synchronous": _SYNCHRONOUS_NAMES.get(pragma("synchronous")),
+        "cache_size": pragma("cache_size"),
+        "mmap_size": pragma("mmap_size"),
+        "busy_timeout": pragma("busy_timeout"),
+        "temp_store": _TEMP_STORE_NAMES.get(pragma("temp_store")),
+    }
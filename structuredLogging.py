@@ -0,0 +1,195 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+
+# Loggers routed through the non-blocking queue: the machine's own events and
+# SQLAlchemy's statement log, which replaces the engine's echo=True output
+LOGGER_NAMES = ("vending", "sqlalchemy.engine")
+
+_listener = None
+_sampling = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as one JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, "event", None) or record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records for chosen events.
+
+    Attributes:
+        sample_rates (dict): Mapping of event name to the fraction of its
+            records to keep, between 0 and 1. Unlisted events are all kept.
+    """
+
+    def __init__(self, sample_rates=None):
+        super().__init__()
+        self.sample_rates = dict(sample_rates or {})
+
+    def filter(self, record):
+        rate = self.sample_rates.get(getattr(record, "event", None))
+        return rate is None or random.random() < rate
+
+
+def configure_logging(level="INFO", sample_rates=None, stream=None):
+    """
+    Sets up structured, sampled logging written from a background thread.
+
+    Records are filtered and queued on the calling thread, then formatted as
+    JSON and written by a QueueListener, so request handlers never wait on
+    the output stream. Calling this again replaces the previous setup.
+
+    Args:
+        level (str | int): The level for the vending loggers.
+        sample_rates (dict): Mapping of event name to the fraction to keep.
+        stream (file): Where to write the log lines. Defaults to stderr.
+
+    Returns:
+        SamplingFilter: The filter, whose sample_rates can be changed later.
+    """
+    global _listener, _sampling
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    sampling = _sampling = SamplingFilter(_checked_rates(sample_rates or {}))
+    queue_handler.addFilter(sampling)
+
+    for name in LOGGER_NAMES:
+        logger = logging.getLogger(name)
+        logger.handlers = [queue_handler]
+        logger.propagate = False
+    logging.getLogger("vending").setLevel(level)
+    # SQL statements stay off unless switched on with set_sql_echo
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    return sampling
+
+
+def shutdown_logging():
+    """
+    Stops the background writer after it has written any queued records, and
+    hands the loggers back to the standard logging hierarchy.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        for name in LOGGER_NAMES:
+            logger = logging.getLogger(name)
+            logger.handlers = []
+            logger.propagate = True
+
+
+def set_log_level(level):
+    """
+    Changes the level of the vending loggers at runtime.
+
+    Args:
+        level (str | int): The new level, e.g. "DEBUG".
+    """
+    logging.getLogger("vending").setLevel(level)
+
+
+def parse_sample_rates(text):
+    """
+    Parses sample rates written as comma-separated event=rate pairs, as in
+    VENDING_LOG_SAMPLE_RATES="change.breakdown=0.01,change.none_loaded=0.1".
+
+    Args:
+        text (str): The sample rates, or an empty string for none.
+
+    Returns:
+        dict: Mapping of event name to the fraction to keep.
+
+    Raises:
+        ValueError: If a pair is malformed or a rate is not between 0 and 1.
+    """
+    rates = {}
+    for pair in filter(None, (part.strip() for part in text.split(","))):
+        event, separator, rate = pair.partition("=")
+        if not separator or not event.strip():
+            raise ValueError(f"Expected event=rate, got {pair!r}")
+        rates[event.strip()] = float(rate)
+    return _checked_rates(rates)
+
+
+def set_sample_rates(rates):
+    """
+    Replaces the per-event sample rates at runtime.
+
+    Args:
+        rates (dict): Mapping of event name to the fraction to keep.
+
+    Raises:
+        ValueError: If any rate is not between 0 and 1.
+        RuntimeError: If logging has not been configured.
+    """
+    if _sampling is None:
+        raise RuntimeError("Logging is not configured")
+    _sampling.sample_rates = _checked_rates(rates)
+
+
+def sample_rates():
+    return dict(_sampling.sample_rates) if _sampling is not None else {}
+
+
+def _checked_rates(rates):
+    invalid = sorted(event for event, rate in rates.items() if not 0 <= rate <= 1)
+    if invalid:
+        raise ValueError(f"Sample rates must be between 0 and 1: {invalid}")
+    return dict(rates)
+
+
+def set_sql_echo(enabled):
+    """
+    Switches logging of every SQL statement on or off at runtime.
+
+    Takes effect for database connections checked out afterwards.
+
+    Args:
+        enabled (bool): Whether to log SQL statements.
+    """
+    logging.getLogger("sqlalchemy.engine").setLevel(
+        logging.INFO if enabled else logging.WARNING)
+
+
+def sql_echo_enabled():
+    return logging.getLogger("sqlalchemy.engine").isEnabledFor(logging.INFO)
+
+
+def log_event(logger, level, event, **fields):
+    """
+    Logs a named event with structured fields.
+
+    The level check comes first, so disabled events cost almost nothing.
+
+    Args:
+        logger (Logger): The logger to write to.
+        level (int): The logging level.
+        event (str): The event name, used for sampling.
+        **fields: Extra values to include in the JSON line.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"event": event, "fields": fields})
@@ -0,0 +1,45 @@
+import os
+
+from fastapi.testclient import TestClient
+
+import main
+
+# Check importing main and creating an app touch no database
+def test_create_app_is_lazy(tmp_path):
+    path = tmp_path / "lazy.db"
+    app = main.create_app(db_path=str(path), preload=False)
+    assert not app.state.machine.loaded
+    assert not path.exists()
+    assert not main.app.state.machine.loaded
+
+# Check the machine is built on the first request and reused after
+def test_machine_built_on_first_request(tmp_path):
+    path = tmp_path / "lazy.db"
+    app = main.create_app(db_path=str(path), use_async=False, preload=False)
+    with TestClient(app) as client:
+        assert not app.state.machine.loaded
+        response = client.put("/stock/restock", json=["A1", "Crisps", 150, 3])
+        assert response.status_code == 200
+        machine = app.state.machine._machine
+        assert path.exists()
+        assert client.get("/stock/show_stock").json()[0]["quantity"] == 3
+        assert app.state.machine._machine is machine
+
+# Check preloading builds the machine at startup, for both machine variants
+def test_preload(tmp_path):
+    for use_async in (False, True):
+        path = tmp_path / f"preload_{use_async}.db"
+        app = main.create_app(
+            db_path=str(path), use_async=use_async, preload=True)
+        with TestClient(app) as client:
+            assert app.state.machine.loaded
+            assert client.get("/machine_balance/show_change").json() == []
+
+# Check settings not passed are read from the environment
+def test_settings_from_environment(tmp_path, monkeypatch):
+    path = tmp_path / "env.db"
+    monkeypatch.setenv("VENDING_DB_PATH", str(path))
+    monkeypatch.setenv("VENDING_PRELOAD", "1")
+    app = main.create_app(use_async=False)
+    with TestClient(app):
+        assert os.path.exists(path)
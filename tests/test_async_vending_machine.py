@@ -0,0 +1,42 @@
+import asyncio
+
+from asyncVendingMachine import AsyncVendingMachine
+
+# Run a coroutine against a fresh async machine
+def run_with_machine(coroutine_function):
+    async def runner():
+        machine = AsyncVendingMachine('test', ':memory:')
+        await machine.start()
+        try:
+            return await coroutine_function(machine)
+        finally:
+            await machine.close()
+    return asyncio.run(runner())
+
+# Check stock and change can be added and listed
+def test_async_stock_and_list():
+    async def scenario(machine):
+        await machine.stock_row("A1", "Product", 150, 10)
+        await machine.restock_change(50, 10)
+        stock = await machine.print_vending_data()
+        change = await machine.print_change_data()
+        return [(e.selection_code, e.quantity) for e in stock], len(change)
+
+    stock, change = run_with_machine(scenario)
+    assert stock == [("A1", 10)]
+    assert change == 1
+
+# Check a purchase with change completes through the async machine
+def test_async_purchase():
+    async def scenario(machine):
+        await machine.stock_row("A1", "Product", 150, 10)
+        await machine.restock_change(50, 10)
+        transaction = await machine.open_transaction()
+        await machine.select_product("A1", transaction)
+        await machine.insert_money(200, transaction)
+        stock = await machine.print_vending_data()
+        return stock[0].quantity, machine.coin_inventory.coins
+
+    quantity, coins = run_with_machine(scenario)
+    assert quantity == 9
+    assert coins == {50: 9}
@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy import Update
+from sqlalchemy.exc import OperationalError
+
+from model.model import Change, Sale_ledger_entry, Vending_machine_entry
+from vendingMachine import PurchaseRaceLostError, VendingMachine
+
+# Define two machines sharing one database, as two processes writing it would
+@pytest.fixture
+def workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first = VendingMachine('test', path, background_flush=False)
+    first.stock_row("A1", "Product", 150, 1)
+    first.stock_row("B1", "Product", 150, 5)
+    first.restock_change(value=50, quantity=1)
+    second = VendingMachine('test', path, background_flush=False)
+    yield first, second
+    first.close()
+    second.close()
+
+# Check the last unit cannot be sold twice
+def test_last_unit_race(workers):
+    first, second = workers
+    first.select_product("A1")
+    second.select_product("A1")
+    first.insert_money(150)
+    with pytest.raises(PurchaseRaceLostError):
+        second.insert_money(150)
+    assert second.money_cache == 0
+    assert second.selected_product is None
+    assert second.stock_index.quantities["A1"] == 0
+    second.session.expire_all()
+    assert second.session.get(Vending_machine_entry, "A1").quantity == 0
+
+# Check the same coin cannot be paid out twice, and nothing is sold without it
+def test_change_race(workers):
+    first, second = workers
+    first.select_product("B1")
+    second.select_product("B1")
+    first.insert_money(200)
+    with pytest.raises(PurchaseRaceLostError):
+        second.insert_money(200)
+    assert second.coin_inventory.coins == {50: 0}
+    second.session.expire_all()
+    assert second.session.get(Change, 50).quantity == 0
+    assert second.session.get(Vending_machine_entry, "B1").quantity == 4
+    assert len(second.ledger) == 0
+
+# Check change planned for a lost sale is not paid out by a later sale
+def test_lost_race_clears_change(workers):
+    first, second = workers
+    first.select_product("B1")
+    second.select_product("B1")
+    first.insert_money(200)
+    with pytest.raises(PurchaseRaceLostError):
+        second.insert_money(200)
+    first.restock_change(value=50, quantity=1)
+    second.select_product("B1")
+    second.insert_money(150)
+    second.session.expire_all()
+    assert second.session.get(Change, 50).quantity == 1
+    second.flush_ledger()
+    entry = second.session.query(Sale_ledger_entry).one()
+    assert (entry.amount_paid, entry.change_given) == (150, 0)
+
+# Check a cancel racing a purchase on the same token waits for the sale
+def test_cancel_during_purchase(workers, monkeypatch):
+    machine = workers[0]
+    transaction = machine.open_transaction()
+    machine.select_product("B1", transaction)
+    apply_sale = machine._apply_sale
+    selling, finish = threading.Event(), threading.Event()
+
+    def slow_apply_sale(items, breakdown):
+        selling.set()
+        finish.wait(5)
+        apply_sale(items, breakdown)
+
+    monkeypatch.setattr(machine, "_apply_sale", slow_apply_sale)
+    purchase = threading.Thread(
+        target=machine.insert_money, args=(200, transaction))
+    cancel = threading.Thread(
+        target=machine.return_money, args=(transaction,))
+    purchase.start()
+    assert selling.wait(5)
+    cancel.start()
+    cancel.join(0.2)
+    assert cancel.is_alive()
+    finish.set()
+    purchase.join(5)
+    cancel.join(5)
+    machine.session.expire_all()
+    assert machine.session.get(Vending_machine_entry, "B1").quantity == 4
+    assert machine.session.get(Change, 50).quantity == 0
+    machine.flush_ledger()
+    entry = machine.session.query(Sale_ledger_entry).one()
+    assert (entry.amount_paid, entry.change_given) == (200, 50)
+
+# Check a database fault is raised as itself rather than as a lost race
+def test_database_fault_not_race(workers, monkeypatch):
+    machine = workers[0]
+    machine.select_product("B1")
+
+    execute = machine.session.execute
+
+    def read_only(statement, *args, **kwargs):
+        if isinstance(statement, Update):
+            raise OperationalError(
+                "UPDATE", {}, sqlite3.OperationalError(
+                    "attempt to write a readonly database"))
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(machine.session, "execute", read_only)
+    with pytest.raises(OperationalError):
+        machine.insert_money(200)
+    assert machine.selected_product is not None
+    monkeypatch.undo()
+    assert machine.stock_index.quantities["B1"] == 5
+    machine.session.expire_all()
+    assert machine.session.get(Vending_machine_entry, "B1").quantity == 5
@@ -0,0 +1,22 @@
+from benchmarks.run_benchmarks import compare, summarize
+
+# Check latency summaries report throughput and percentiles
+def test_summarize():
+    stats = summarize([0.001] * 99 + [0.1])
+    assert stats["n"] == 100
+    assert stats["p50_ms"] == 1.0
+    assert stats["p99_ms"] == 100.0
+
+# Check only slowdowns beyond the threshold are flagged
+def test_compare_flags_regressions():
+    baseline = {
+        "fast": {"ops_per_sec": 1000, "p99_ms": 1.0},
+        "slow": {"ops_per_sec": 1000, "p99_ms": 1.0},
+    }
+    current = {
+        "fast": {"ops_per_sec": 900, "p99_ms": 1.1},
+        "slow": {"ops_per_sec": 500, "p99_ms": 3.0},
+    }
+    regressions = compare(baseline, current, threshold=0.2)
+    assert len(regressions) == 2
+    assert all(r.startswith("slow") for r in regressions)
@@ -0,0 +1,49 @@
+import pytest
+
+from vendingMachine import VendingMachine
+from model.model import Change, Vending_machine_entry
+
+# Define a fixture vending machine for testing
+@pytest.fixture(scope='module')
+def test_machine():
+    vendingMachine = VendingMachine('test', ':memory:')
+    yield vendingMachine
+
+# Check many rows are stocked at once
+def test_stock_rows(test_machine):
+    stocked, results = test_machine.stock_rows(
+        [("A1", "Soda", 150, 10), ("B1", "Chips", 100, 5)])
+    assert stocked is True
+    assert [r["status"] for r in results] == ["ok", "ok"]
+    entries = test_machine.print_vending_data()
+    assert [(e.selection_code, e.quantity) for e in entries] == [("A1", 10), ("B1", 5)]
+
+# Check existing rows are updated in place
+def test_stock_rows_upsert(test_machine):
+    stocked, _results = test_machine.stock_rows([("A1", "Cola", 120, 3)])
+    assert stocked is True
+    product = test_machine.session.get(Vending_machine_entry, "A1")
+    assert (product.product_name, product.cost, product.quantity) == ("Cola", 120, 3)
+
+# Check one invalid row stops the whole batch
+def test_stock_rows_all_or_nothing(test_machine):
+    stocked, results = test_machine.stock_rows(
+        [("C1", "Water", 80, 4), ("C2", "Gum", -1, 4)])
+    assert stocked is False
+    assert results[0]["status"] == "ok"
+    assert results[1]["status"] == "invalid"
+    assert test_machine.session.get(Vending_machine_entry, "C1") is None
+
+# Check coins are restocked in one batch and tracked in memory
+def test_restock_change_rows(test_machine):
+    stocked, _results = test_machine.restock_change_rows([(50, 10), (20, 5)])
+    assert stocked is True
+    assert test_machine.session.get(Change, 20).quantity == 5
+    assert test_machine.coin_inventory.total == 600
+
+# Check an invalid coin quantity stops the batch
+def test_restock_change_rows_invalid(test_machine):
+    stocked, results = test_machine.restock_change_rows([(100, 2), (200, -1)])
+    assert stocked is False
+    assert results[1]["detail"] == "Quantity must be a non-negative integer"
+    assert test_machine.session.get(Change, 100) is None
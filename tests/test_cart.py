@@ -0,0 +1,110 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from model.model import Sale_ledger_entry, Vending_machine_entry
+from vendingMachine import (
+    OutOfStockError, PurchaseRaceLostError, SelectedCodeInvalidError,
+    VendingMachine)
+
+# Define a fixture vending machine with stock and change loaded
+@pytest.fixture
+def test_machine(tmp_path):
+    vendingMachine = VendingMachine(
+        'test', str(tmp_path / "cart.db"), background_flush=False)
+    vendingMachine.stock_rows([
+        ("A1", "Crisps", 120, 5), ("B1", "Gum", 45, 2), ("C1", "Soda", 150, 1)])
+    vendingMachine.restock_change_rows([(5, 10), (50, 10)])
+    yield vendingMachine
+    vendingMachine.close()
+
+# Check a cart is priced and its units held for the transaction
+def test_set_cart(test_machine):
+    transaction = test_machine.open_transaction()
+    assert test_machine.set_cart({"A1": 2, "B1": 1}, transaction) == 285
+    assert test_machine.holds.held("A1") == 2
+    assert test_machine.holds.held("B1") == 1
+    # Filling the cart again replaces it
+    test_machine.set_cart({"B1": 2}, transaction)
+    assert test_machine.holds.held("A1") == 0
+    assert test_machine.holds.held("B1") == 2
+
+# Check one payment sells the whole cart and pays out change in one commit
+def test_pay_for_cart(test_machine):
+    transaction = test_machine.open_transaction()
+    test_machine.set_cart({"A1": 2, "B1": 1}, transaction)
+    assert "insert at least £0.85" in test_machine.insert_money(200, transaction)
+    msg = test_machine.insert_coins([100], transaction)
+    assert "£0.15 being returned" in msg
+    assert dict(test_machine.stock_levels()) == {"A1": 3, "B1": 1, "C1": 1}
+    assert test_machine.coin_inventory.coins == {5: 7, 50: 10}
+    assert transaction.cart is None
+    assert len(test_machine.holds) == 0
+    assert test_machine.sales_summary("hour")["units"] == 3
+
+# Check the ledger gets a row per unit and the change on the last row
+def test_cart_ledger_rows(test_machine):
+    transaction = test_machine.open_transaction()
+    test_machine.set_cart({"A1": 1, "B1": 1}, transaction)
+    test_machine.insert_coins([200], transaction)
+    test_machine.flush_ledger()
+    sales = test_machine.session.query(Sale_ledger_entry).order_by(
+        Sale_ledger_entry.id).all()
+    assert [sale.selection_code for sale in sales] == ["A1", "B1"]
+    assert [sale.amount_paid for sale in sales] == [120, 80]
+    assert [sale.change_given for sale in sales] == [0, 35]
+    assert json.loads(sales[-1].change_breakdown) == {"5": 7}
+
+# Check invalid codes, short stock and bad units are refused without holds
+@pytest.mark.parametrize("items, error", [
+    ({"A1": 1, "Z9": 1}, SelectedCodeInvalidError),
+    ({"A1": 1, "C1": 2}, OutOfStockError),
+    ({"A1": 0}, ValueError),
+    ({"A1": 1.5}, ValueError),
+    ({}, ValueError),
+])
+def test_refused_carts(test_machine, items, error):
+    with pytest.raises(error):
+        test_machine.set_cart(items, test_machine.open_transaction())
+    assert len(test_machine.holds) == 0
+
+# Check units held by another customer are not available to a cart
+def test_cart_respects_holds(test_machine):
+    test_machine.select_product("C1", test_machine.open_transaction())
+    with pytest.raises(OutOfStockError):
+        test_machine.set_cart({"C1": 1}, test_machine.open_transaction())
+
+# Check nothing is sold when another worker takes part of the cart first
+def test_cart_all_or_nothing(test_machine):
+    other = VendingMachine(
+        'test', test_machine.vending_db_file_path, background_flush=False)
+    transaction = test_machine.open_transaction()
+    test_machine.set_cart({"A1": 1, "C1": 1}, transaction)
+    other.select_product("C1")
+    other.insert_money(150)
+    with pytest.raises(PurchaseRaceLostError):
+        test_machine.insert_money(270, transaction)
+    assert transaction.cart is None and transaction.money_cache == 0
+    test_machine.session.expire_all()
+    assert test_machine.session.get(Vending_machine_entry, "A1").quantity == 5
+    assert test_machine.coin_inventory.coins == {5: 10, 50: 10}
+    other.close()
+
+# Check the cart endpoints through the API
+def test_cart_endpoints(tmp_path):
+    app = main.create_app(db_path=str(tmp_path / "api.db"), use_async=False)
+    with TestClient(app) as client:
+        client.put("/stock/restock", json=[["A1", "Crisps", 120, 5]])
+        response = client.put("/cart", json={"A1": 2})
+        assert response.json()["cost"] == 240
+        token = response.json()["token"]
+        cart = client.get("/cart", params={"token": token}).json()
+        assert cart["items"][0]["units"] == 2 and cart["balance"] == 0
+        response = client.post(
+            "/user_balance/insert_coins/", params={"token": token},
+            json=[200, 20, 20])
+        assert "dispensing 2 items" in response.json()["details"]
+        assert client.put("/cart", json={"Z9": 1}).status_code == 404
+        assert client.put("/cart", json={"A1": 0}).status_code == 400
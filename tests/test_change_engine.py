@@ -0,0 +1,31 @@
+from changeEngine import make_change
+
+# Check greedy change is found when plenty of coins are loaded
+def test_greedy_change():
+    inventory = {200: 5, 100: 5, 50: 5, 20: 5, 10: 5, 5: 5, 2: 5, 1: 5}
+    assert make_change(188, inventory) == {100: 1, 50: 1, 20: 1, 10: 1, 5: 1, 2: 1, 1: 1}
+
+# Check change a greedy pass would miss is still found
+def test_non_greedy_change():
+    assert make_change(60, {50: 1, 20: 3}) == {20: 3}
+
+# Check the search backs out of a large coin when greedy strands a remainder
+def test_non_greedy_backtrack():
+    assert make_change(65, {50: 1, 20: 3, 5: 1}) == {20: 3, 5: 1}
+
+# Check coin counts are respected
+def test_bounded_counts():
+    assert make_change(40, {20: 1, 10: 1}) is None
+    assert make_change(30, {20: 1, 10: 1}) == {20: 1, 10: 1}
+
+# Check zero and impossible amounts
+def test_zero_and_impossible():
+    assert make_change(0, {}) == {}
+    assert make_change(15, {50: 10}) is None
+
+# Check amounts out of reach are refused without searching
+def test_unreachable_refused_early():
+    inventory = {20: 500, 50: 500}
+    assert make_change(49999, inventory) is None
+    assert make_change(40000, inventory) is None
+    assert make_change(35, {50: 1, 20: 3}) is None
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from changeEngine import make_change, payable_amounts
+from changeFeasibility import ChangeFeasibility, overpayments
+from vendingMachine import VendingMachine
+
+# Define a fixture vending machine with a product and a few coins
+@pytest.fixture(scope='module')
+def test_machine():
+    vendingMachine = VendingMachine('test', ':memory:', background_flush=False)
+    vendingMachine.stock_row("A1", "Product", 130, 5)
+    vendingMachine.restock_change(value=50, quantity=1)
+    vendingMachine.restock_change(value=20, quantity=1)
+    yield vendingMachine
+
+# Check the bitset agrees with the change solver for every amount
+@pytest.mark.parametrize("inventory", [
+    {50: 1, 20: 3},
+    {1: 2, 2: 1, 5: 4, 10: 0, 20: 2, 50: 1, 100: 2},
+    {},
+])
+def test_payable_matches_solver(inventory):
+    reachable = payable_amounts(inventory, 200)
+    for amount in range(200):
+        assert bool(reachable >> amount & 1) == (make_change(amount, inventory) is not None)
+
+# Check the overpayments for a price paid in single denominations
+def test_overpayments():
+    assert overpayments(130) == {0, 10, 20, 70}
+
+# Check flags follow both coin and price changes
+def test_flags():
+    feasibility = ChangeFeasibility()
+    feasibility.set_price("A1", 130)
+    assert feasibility.exact_change_only("A1") is True
+    feasibility.update_coins({10: 1, 20: 1, 50: 1})
+    assert feasibility.exact_change_only("A1") is False
+    feasibility.set_price("A1", 125)
+    assert feasibility.exact_change_only("A1") is True
+    assert feasibility.exact_change_only("B9") is False
+    assert feasibility.payable(500) is None
+
+# Check the listing flags products and updates after a restock
+def test_listing_flag(test_machine):
+    _etag, payload = test_machine.stock_snapshot()
+    assert json.loads(payload)[0]["exact_change_only"] is True
+    test_machine.restock_change(value=10, quantity=5)
+    test_machine.restock_change(value=20, quantity=5)
+    _etag, payload = test_machine.stock_snapshot()
+    assert json.loads(payload)[0]["exact_change_only"] is False
+
+# Check unpayable change is refused before the solver runs
+def test_refused_from_table(test_machine):
+    assert test_machine.coin_inventory.make_change(1) is None
+    assert test_machine.coin_inventory.make_change(70) == {50: 1, 20: 1}
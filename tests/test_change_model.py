@@ -23,23 +23,23 @@ def test_db():
 # Test adding a coin item to the database
 def test_stock_item(test_db):
     # Create a new product instance
-    new_product = Change(value=0.5, quantity=10)
+    new_product = Change(value=50, quantity=10)
     test_db.add(new_product)
     test_db.commit()
 
     # Fetch the product back from the database
-    coin = test_db.query(Change).filter_by(value=0.5).first()
+    coin = test_db.query(Change).filter_by(value=50).first()
     # Check coin was added
     assert coin is not None
-    assert coin.value == 0.5
+    assert coin.value == 50
     assert coin.quantity == 10
 
 # Check class function can sum all change
 def test_sum_table(test_db):
     # Create a new coin instance
-    new_coin = Change(value=0.2, quantity=3)
+    new_coin = Change(value=20, quantity=3)
     test_db.add(new_coin)
     test_db.commit()
     total_change = Change.sum_costs(test_db)
 
-    assert round(total_change, 2) == 5.60
+    assert total_change == 560
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from coinFloat import (
+    change_from_prices, recommend_fleet, recommend_float,
+    recommend_from_demand, refusal_rates)
+from vendingMachine import VendingMachine
+
+# Define a fixture vending machine with stock and change loaded
+@pytest.fixture
+def test_machine(tmp_path):
+    vendingMachine = VendingMachine(
+        'test', str(tmp_path / "float.db"), background_flush=False)
+    vendingMachine.stock_rows([("A1", "Crisps", 70, 50), ("B1", "Gum", 45, 0)])
+    vendingMachine.restock_change_rows([(10, 20), (20, 20)])
+    yield vendingMachine
+    vendingMachine.close()
+
+# Check sampled payments cover the price with coins from the mix
+def test_change_from_prices():
+    owed = change_from_prices(
+        [70], coin_mix={50: 1}, size=100, rng=np.random.default_rng(0))
+    assert (owed == 30).all()
+    with pytest.raises(ValueError):
+        change_from_prices([])
+
+# Check floats drain over a scenario and refuse change they cannot make
+def test_refusal_rates():
+    floats = np.array([[0, 1], [0, 3], [5, 0]])
+    scenarios = np.array([[20, 20, 20]])
+    rates, left = refusal_rates(floats, scenarios, [10, 20])
+    assert rates.tolist() == pytest.approx([2 / 3, 0.0, 1 / 3])
+    assert left.tolist() == [[0, 0], [0, 0], [1, 0]]
+
+# Check the recommendation stays within the cap and beats a poor float
+def test_recommend_float():
+    owed = [30] * 50 + [80] * 50
+    result = recommend_float(
+        owed, 2000, transactions=20, candidates=200,
+        current={5: 100, 200: 5})
+    assert result["cash"] <= 2000
+    assert result["cash"] == sum(
+        value * count for value, count in result["coins"].items())
+    assert result["refusal_rate"] == 0.0
+    assert result["current"]["refusal_rate"] > 0.5
+    assert result["current"]["cash"] == 1500
+    # Coins larger than any change owed are never recommended
+    assert set(result["coins"]) == {10, 20, 50}
+    assert recommend_float(owed, 2000, transactions=20, candidates=200) == \
+        dict(result, current=None)
+    with pytest.raises(ValueError):
+        recommend_float(owed, 0)
+
+# Check exact payments need no float
+def test_recommend_float_exact():
+    result = recommend_float([0] * 10, 1000)
+    assert result["coins"] == {} and result["cash"] == 0
+
+# Check the machine's change demand reads the ledger per purchase
+def test_change_demand(test_machine):
+    transaction = test_machine.open_transaction()
+    test_machine.set_cart({"A1": 2}, transaction)
+    test_machine.insert_coins([100, 50], transaction)
+    transaction = test_machine.open_transaction()
+    test_machine.select_product("A1", transaction)
+    test_machine.insert_money(100, transaction)
+    demand = test_machine.change_demand()
+    assert demand["change_owed"] == [30, 10]
+    assert demand["prices"] == [70]
+    assert demand["coins"] == {10: 18, 20: 19}
+
+# Check the ledger is sampled once it has enough purchases
+def test_recommend_from_demand():
+    demand = {"change_owed": [30] * 5, "prices": [70], "coins": {}}
+    result = recommend_from_demand(demand, 1000, candidates=100)
+    assert result["source"] == "prices"
+    result = recommend_from_demand(
+        demand, 1000, min_history=5, candidates=100)
+    assert result["source"] == "ledger"
+    assert set(result["coins"]) == {10, 20}
+
+# Check a fleet is planned per database, reporting machines it cannot plan
+def test_recommend_fleet(tmp_path, test_machine):
+    empty = VendingMachine('empty', str(tmp_path / "empty.db"))
+    empty.close()
+    results = recommend_fleet(
+        [test_machine.vending_db_file_path, str(tmp_path / "empty.db")],
+        1000, workers=1, candidates=100)
+    assert results[0]["machine"] == "float"
+    assert results[0]["source"] == "prices"
+    assert results[1] == {
+        "machine": "empty", "error": "No prices to sample payments from"}
+
+# Check the recommendation endpoint through the API
+def test_recommend_float_endpoint(tmp_path):
+    app = main.create_app(db_path=str(tmp_path / "api.db"), use_async=False)
+    with TestClient(app) as client:
+        assert client.get(
+            "/machine_balance/recommend_float",
+            params={"cash_cap": 1000}).status_code == 400
+        client.put("/stock/restock", json=[["A1", "Crisps", 70, 5]])
+        response = client.get(
+            "/machine_balance/recommend_float",
+            params={"cash_cap": 1000, "transactions": 20})
+        assert response.status_code == 200
+        assert response.json()["cash"] <= 1000
+        assert client.get(
+            "/machine_balance/recommend_float",
+            params={"cash_cap": 0}).status_code == 422
@@ -0,0 +1,42 @@
+import pytest
+
+from vendingMachine import VendingMachine
+from model.model import Change
+
+# Define a fixture vending machine with coins loaded
+@pytest.fixture(scope='module')
+def test_machine():
+    vendingMachine = VendingMachine('test', ':memory:', background_flush=False)
+    vendingMachine.restock_change(value=50, quantity=2)
+    vendingMachine.restock_change(value=20, quantity=3)
+    yield vendingMachine
+
+# Check restocked coins are tracked in memory
+def test_inventory_loaded(test_machine):
+    assert test_machine.coin_inventory.coins == {50: 2, 20: 3}
+    assert test_machine.coin_inventory.total == 160
+
+# Check a purchase with change updates the table and memory together
+def test_payout_written_with_sale(test_machine):
+    test_machine.stock_row("A1", "Product", 130, 5)
+    test_machine.select_product("A1")
+    test_machine.insert_money(200)
+    assert test_machine.coin_inventory.coins == {50: 1, 20: 2}
+    assert test_machine.coin_inventory.total == 90
+    test_machine.session.expire_all()
+    assert test_machine.session.get(Change, 50).quantity == 1
+    assert test_machine.session.get(Change, 20).quantity == 2
+
+# Check a restock replaces the quantity held in memory
+def test_restock_sets_quantity(test_machine):
+    test_machine.restock_change(value=50, quantity=10)
+    assert test_machine.coin_inventory.coins[50] == 10
+    assert test_machine.coin_inventory.total == 540
+
+# Check reloading picks up quantities written by another process
+def test_reload(test_machine):
+    test_machine.session.get(Change, 20).quantity = 7
+    test_machine.session.commit()
+    test_machine.coin_inventory.load(test_machine.session)
+    assert test_machine.coin_inventory.coins == {50: 10, 20: 7}
+    assert test_machine.coin_inventory.index.lowest(1) == [(20, 7)]
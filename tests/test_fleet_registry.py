@@ -0,0 +1,139 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from fleetRegistry import MachineRegistry, UnknownMachineError
+
+# Define a fixture registry holding at most two machines, with a fake clock
+@pytest.fixture
+def registry(tmp_path):
+    now = [0.0]
+    registry = MachineRegistry(
+        str(tmp_path), max_machines=2, idle_timeout=60.0,
+        clock=lambda: now[0], background_flush=False)
+    registry.now = now
+    yield registry
+    registry.close()
+
+# Use a machine the way one request does, acquiring then releasing it
+def use(registry, machine_id):
+    with registry.using(machine_id) as machine:
+        return machine
+
+# Check machines are loaded once, each with its own database
+def test_machines_loaded_lazily(registry, tmp_path):
+    assert len(registry) == 0
+    first = use(registry, "site-1")
+    assert use(registry, "site-1") is first
+    second = use(registry, "site-2")
+    assert second is not first
+    first.stock_row("A1", "Crisps", 150, 3)
+    assert second.print_vending_data() == []
+    assert (tmp_path / "site-1.db").exists()
+    assert registry.loaded() == ["site-1", "site-2"]
+
+# Check the least recently used machine is evicted and reloads from disk
+def test_evicts_least_recently_used(registry):
+    use(registry, "a").stock_row("A1", "Crisps", 150, 3)
+    use(registry, "b")
+    use(registry, "a")
+    use(registry, "c")
+    assert registry.loaded() == ["a", "c"]
+    reloaded = use(registry, "b")
+    assert reloaded.print_vending_data() == []
+    assert [e.quantity for e in use(registry, "a").print_vending_data()] == [3]
+
+# Check idle machines are evicted even below capacity
+def test_evicts_idle(registry):
+    use(registry, "a")
+    registry.now[0] = 61.0
+    use(registry, "b")
+    assert registry.loaded() == ["b"]
+
+# Check a machine with a customer mid-purchase is kept past the bound
+def test_keeps_busy_machines(registry):
+    busy = use(registry, "a")
+    busy.stock_row("A1", "Crisps", 150, 3)
+    busy.select_product("A1", busy.open_transaction())
+    use(registry, "b")
+    use(registry, "c")
+    assert registry.loaded() == ["a", "c"]
+
+# Check a machine held by a caller is kept past the bound until released
+def test_keeps_acquired_machines(registry):
+    held = registry.acquire("a")
+    use(registry, "b")
+    use(registry, "c")
+    assert registry.loaded() == ["a", "c"]
+    assert held.print_vending_data() == []
+    registry.release(held)
+    use(registry, "d")
+    assert registry.loaded() == ["c", "d"]
+
+# Check a slow build holds up only callers of that machine, who share it
+def test_builds_outside_lock(registry, monkeypatch):
+    load = registry._load
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_load(machine_id):
+        if machine_id == "slow":
+            started.set()
+            finish.wait(5)
+        return load(machine_id)
+
+    monkeypatch.setattr(registry, "_load", slow_load)
+    built = []
+    threads = [
+        threading.Thread(target=lambda: built.append(use(registry, "slow")))
+        for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    assert use(registry, "fast").vending_machine_name == "fast"
+    finish.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(built) == 2 and built[0] is built[1]
+
+# Check evicted machines are closed outside the registry lock
+def test_closes_outside_lock(registry, monkeypatch):
+    evicted = use(registry, "a")
+    close = evicted.close
+    locked = []
+
+    def checked_close():
+        locked.append(registry._lock.locked())
+        close()
+
+    monkeypatch.setattr(evicted, "close", checked_close)
+    registry.now[0] = 61.0
+    use(registry, "b")
+    assert locked == [False]
+
+# Check ids that are not safe file names are refused
+@pytest.mark.parametrize("machine_id", ["", "../etc", "a/b", "x" * 65])
+def test_rejects_invalid_ids(registry, machine_id):
+    with pytest.raises(UnknownMachineError):
+        registry.acquire(machine_id)
+
+# Check fleet mode serves every machine endpoint under its machine id
+def test_fleet_routes(tmp_path):
+    app = main.create_app(fleet_dir=str(tmp_path), max_machines=4)
+    with TestClient(app) as client:
+        client.put("/machines/m1/stock/restock", json=["A1", "Crisps", 150, 3])
+        client.put("/machines/m2/stock/restock", json=["B1", "Gum", 50, 1])
+        stock = client.get("/machines/m1/stock/show_stock").json()
+        assert [row["selection_code"] for row in stock] == ["A1"]
+        assert client.get("/machines").json() == {
+            "loaded": ["m2", "m1"], "max_machines": 4}
+        stream = client.get("/machines/m2/stock/show_stock/stream")
+        assert stream.text.count("\n") == 1
+        # Every request, streamed or not, hands its machine back
+        fleet = app.state.fleet
+        assert [entry.users for entry in fleet._machines.values()] == [0, 0]
+        assert client.get("/machines/..%2Fx/stock/show_stock").status_code == 404
+        assert client.get("/stock/show_stock").status_code == 404
+        assert client.put(
+            "/admin/log_level", params={"level": "info"}).status_code == 200
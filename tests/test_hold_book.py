@@ -0,0 +1,83 @@
+import pytest
+
+from holdBook import HoldBook
+from vendingMachine import OutOfStockError, PurchaseRaceLostError, VendingMachine
+
+# A fixed clock the tests can move forward
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+# Define a fixture vending machine with the last unit of a product
+@pytest.fixture
+def test_machine():
+    vendingMachine = VendingMachine('test', ':memory:', background_flush=False)
+    vendingMachine.stock_row("A1", "Product", 100, 1)
+    yield vendingMachine
+
+# Check holds are counted per product and can be replaced or released
+def test_place_and_release():
+    book = HoldBook()
+    book.place("t1", "A1")
+    book.place("t2", "A1")
+    assert book.held("A1") == 2
+    assert book.held("A1", excluding="t1") == 1
+    book.place("t1", "B1")
+    assert book.held("A1") == 1
+    assert book.held("B1") == 1
+    book.release("t2")
+    book.release("t2")
+    assert book.held("A1") == 0
+    assert len(book) == 1
+
+# Check holds expire, and renewing a hold pushes its expiry back
+def test_expiry():
+    clock = Clock()
+    book = HoldBook(ttl=10, clock=clock)
+    book.place("t1", "A1")
+    book.place("t2", "A1")
+    clock.now = 8
+    book.place("t2", "A1")
+    clock.now = 10
+    assert book.held("A1") == 1
+    clock.now = 18
+    assert book.held("A1") == 0
+    assert len(book) == 0
+
+# Check a held last unit cannot be selected by a second customer
+def test_last_unit_held(test_machine):
+    first = test_machine.open_transaction()
+    second = test_machine.open_transaction()
+    test_machine.select_product("A1", first)
+    test_machine.select_product("A1", first)
+    with pytest.raises(OutOfStockError):
+        test_machine.select_product("A1", second)
+    test_machine.reset_selection(first)
+    test_machine.select_product("A1", second)
+    assert test_machine.insert_money(100, second) == "Exact funds inserted, dispensing Product"
+    assert len(test_machine.holds) == 0
+
+# Check an expired transaction gives up its hold
+def test_expired_transaction_releases(test_machine):
+    test_machine.transactions.ttl = 0
+    first = test_machine.open_transaction()
+    test_machine.select_product("A1", first)
+    test_machine.transactions.purge_expired()
+    assert test_machine.holds.held("A1") == 0
+
+# Check a customer whose hold expired cannot take a unit another now holds
+def test_expired_hold_not_taken_back(test_machine):
+    clock = Clock()
+    test_machine.holds = HoldBook(ttl=10, clock=clock)
+    first = test_machine.open_transaction()
+    second = test_machine.open_transaction()
+    test_machine.select_product("A1", first)
+    clock.now = 11
+    test_machine.select_product("A1", second)
+    with pytest.raises(PurchaseRaceLostError):
+        test_machine.insert_money(100, first)
+    assert first.money_cache == 0 and first.selected_product is None
+    assert test_machine.insert_money(100, second) == "Exact funds inserted, dispensing Product"
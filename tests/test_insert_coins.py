@@ -0,0 +1,44 @@
+import pytest
+
+from metrics import PURCHASE_OUTCOMES
+from vendingMachine import InvalidCoinError, VendingMachine
+
+# Define a fixture vending machine with stock and change loaded
+@pytest.fixture
+def test_machine():
+    vendingMachine = VendingMachine('test', ':memory:', background_flush=False)
+    vendingMachine.stock_row("A1", "Product", 245, 10)
+    vendingMachine.restock_change_rows([(5, 10), (50, 10)])
+    yield vendingMachine
+    vendingMachine.close()
+
+# Check a batch of coins buys the product with one evaluation
+def test_insert_coins_buys_once(test_machine):
+    transaction = test_machine.open_transaction()
+    test_machine.select_product("A1", transaction)
+    unsold = PURCHASE_OUTCOMES.value("test", "UNSOLD")
+    evaluated = PURCHASE_OUTCOMES.value("test", "EVALUATE")
+    msg = test_machine.insert_coins([100, 100, 50], transaction)
+    assert "£0.05 being returned" in msg
+    assert PURCHASE_OUTCOMES.value("test", "UNSOLD") == unsold
+    assert PURCHASE_OUTCOMES.value("test", "EVALUATE") == evaluated + 1
+    assert dict(test_machine.stock_levels())["A1"] == 9
+    assert test_machine.coin_inventory.coins[5] == 9
+
+# Check a short batch is added to the balance
+def test_insert_coins_partial(test_machine):
+    transaction = test_machine.open_transaction()
+    test_machine.select_product("A1", transaction)
+    test_machine.insert_coins([100, 20], transaction)
+    assert test_machine.return_balance(transaction) == 120
+
+# Check one bad coin rejects the whole batch and takes no money
+@pytest.mark.parametrize(
+    "coins", [[100, 3], [100, 2.5], [100, True], [], [1] * 51])
+def test_insert_coins_rejects_batch(test_machine, coins):
+    transaction = test_machine.open_transaction()
+    test_machine.select_product("A1", transaction)
+    with pytest.raises(InvalidCoinError):
+        test_machine.insert_coins(coins, transaction)
+    assert test_machine.return_balance(transaction) == 0
+    assert dict(test_machine.stock_levels())["A1"] == 10
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from asyncVendingMachine import AsyncVendingMachine
+from vendingMachine import VendingMachine
+
+# Define a fixture vending machine with 25 products and a few coins
+@pytest.fixture(scope='module')
+def test_machine():
+    vendingMachine = VendingMachine('test', ':memory:')
+    vendingMachine.stock_rows(
+        [(f"S{i:03d}", "Product", 100, i % 7) for i in range(25)])
+    vendingMachine.restock_change_rows([(200, 1), (10, 5), (50, 3)])
+    yield vendingMachine
+
+# Check pages walk the products in order without gaps or repeats
+def test_stock_pages_cover_listing(test_machine):
+    codes, after, pages = [], None, 0
+    while True:
+        rows, after = test_machine.stock_page(after, 10)
+        codes.extend(row.selection_code for row in rows)
+        pages += 1
+        if after is None:
+            break
+    assert codes == [f"S{i:03d}" for i in range(25)]
+    assert pages == 3
+
+# Check a page carries the same fields as the full listing
+def test_stock_page_rows(test_machine):
+    rows, after = test_machine.stock_page(None, 1)
+    assert [row.as_dict() for row in rows] == [{"selection_code": "S000", "product_name": "Product",
+                     "cost": 100, "quantity": 0, "exact_change_only": False}]
+    assert after == "S000"
+
+# Check a page that ends exactly on the last row is followed by an empty one
+def test_stock_page_exact_end(test_machine):
+    rows, after = test_machine.stock_page("S019", 5)
+    assert len(rows) == 5 and after == "S024"
+    assert test_machine.stock_page(after, 5) == ([], None)
+
+# Check coin pages are ordered by value
+def test_change_pages(test_machine):
+    rows, after = test_machine.change_page(None, 2)
+    assert [(row.value, row.quantity) for row in rows] == [(10, 5), (50, 3)]
+    rows, after = test_machine.change_page(after, 2)
+    assert [(row.value, row.quantity) for row in rows] == [(200, 1)]
+    assert after is None
+
+# Check the page iterators yield the whole listing in batches
+def test_iter_pages(test_machine):
+    pages = list(test_machine.iter_stock_pages(batch_size=10))
+    assert [len(rows) for rows in pages] == [10, 10, 5]
+    coins = [row.value for rows in test_machine.iter_change_pages() for row in rows]
+    assert coins == [10, 50, 200]
+
+# Check paging reads plain rows rather than loading ORM objects
+def test_pages_leave_identity_map_empty(test_machine):
+    test_machine.session.expunge_all()
+    list(test_machine.iter_stock_pages(batch_size=4))
+    assert len(test_machine.session.identity_map) == 0
+
+# Check the async machine streams pages too
+def test_async_iter_pages():
+    async def scenario():
+        machine = AsyncVendingMachine('test', ':memory:')
+        await machine.start()
+        try:
+            await machine.stock_rows(
+                [(f"S{i}", "Product", 100, 1) for i in range(5)])
+            return [
+                [row.selection_code for row in rows]
+                async for rows in machine.iter_stock_pages(batch_size=2)
+            ]
+        finally:
+            await machine.close()
+
+    assert asyncio.run(scenario()) == [["S0", "S1"], ["S2", "S3"], ["S4"]]
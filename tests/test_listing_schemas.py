@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+import listingSchemas
+from listingSchemas import (
+    CoinRow, StockItem, StockRow, encode_listing)
+
+# Check rows hold only their columns
+def test_rows_use_slots():
+    row = StockRow("A1", "Crisps", 150, 3)
+    assert not hasattr(row, "__dict__")
+    with pytest.raises(AttributeError):
+        row.colour = "red"
+
+# Check rows and structures holding them encode to the documented schema
+def test_encode_listing():
+    rows = [StockRow("A1", "Crisps", 150, 3, True)]
+    decoded = json.loads(encode_listing({"items": rows, "next_after": "A1"}))
+    assert decoded["next_after"] == "A1"
+    assert StockItem(**decoded["items"][0]).exact_change_only is True
+    assert json.loads(encode_listing([CoinRow(50, 2)])) == [
+        {"value": 50, "quantity": 2}]
+
+# Check the standard library encoder is used when orjson is not installed
+def test_encode_without_orjson(monkeypatch):
+    monkeypatch.setattr(listingSchemas, "orjson", None)
+    assert json.loads(encode_listing([CoinRow(50, 2)])) == [
+        {"value": 50, "quantity": 2}]
+
+# Check other objects are still refused
+def test_encode_rejects_unknown_objects():
+    with pytest.raises(TypeError):
+        encode_listing([object()])
@@ -0,0 +1,60 @@
+import pytest
+
+from lowStockIndex import LowStockIndex
+from vendingMachine import VendingMachine
+
+# Define a fixture vending machine with a few products and coins
+@pytest.fixture(scope='module')
+def test_machine():
+    vendingMachine = VendingMachine('test', ':memory:', background_flush=False)
+    vendingMachine.stock_rows([
+        ("A1", "Crisps", 100, 8),
+        ("A2", "Chocolate", 130, 2),
+        ("A3", "Water", 80, 12),
+    ])
+    vendingMachine.restock_change(value=20, quantity=5)
+    vendingMachine.restock_change(value=50, quantity=30)
+    yield vendingMachine
+
+# Check the index keeps slots in order as quantities change
+def test_index_ordering():
+    index = LowStockIndex()
+    index.load([("A1", 5), ("A2", 1), ("A3", 9)])
+    assert index.lowest(2) == [("A2", 1), ("A1", 5)]
+    index.set("A3", 0)
+    index.set("A2", 7)
+    assert index.lowest(3) == [("A3", 0), ("A1", 5), ("A2", 7)]
+    assert index.below(6) == [("A3", 0), ("A1", 5)]
+    assert index.lowest(0) == []
+
+# Check the emptiest products and coins are listed first
+def test_low_stock(test_machine):
+    low = test_machine.low_stock(2)
+    assert low["products"] == [
+        {"selection_code": "A2", "quantity": 2},
+        {"selection_code": "A1", "quantity": 8},
+    ]
+    assert low["coins"][0] == {"value": 20, "quantity": 5}
+
+# Check purchases and change payouts move slots down the index
+def test_purchase_updates_index(test_machine):
+    test_machine.select_product("A1")
+    test_machine.insert_money(100)
+    test_machine.select_product("A2")
+    test_machine.insert_money(100)
+    test_machine.insert_money(50)
+    assert test_machine.stock_index.quantities == {"A1": 7, "A2": 1, "A3": 12}
+    assert test_machine.coin_inventory.index.lowest(1) == [(20, 4)]
+
+# Check the restock plan tops up only the slots below target
+def test_restock_plan(test_machine):
+    plan = test_machine.restock_plan(target=10, coin_target=20)
+    assert plan["products"] == [
+        {"selection_code": "A2", "quantity": 1, "target": 10, "restock": 9},
+        {"selection_code": "A1", "quantity": 7, "target": 10, "restock": 3},
+    ]
+    assert plan["coins"] == [
+        {"value": 20, "quantity": 4, "target": 20, "restock": 16}]
+    test_machine.stock_row("A2", "Chocolate", 130, 10)
+    plan = test_machine.restock_plan(target=10)
+    assert [p["selection_code"] for p in plan["products"]] == ["A1"]
@@ -0,0 +1,66 @@
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+from metrics import Counter, Histogram, PURCHASE_OUTCOMES, SQL_STATEMENTS
+from vendingMachine import VendingMachine
+
+# Check counters render in the Prometheus text format
+def test_counter_render():
+    counter = Counter("test_total", "A test counter.", ("outcome",))
+    counter.inc("SOLD")
+    counter.inc("SOLD")
+    counter.inc('say "hi"')
+    assert counter.render() == [
+        "# HELP test_total A test counter.",
+        "# TYPE test_total counter",
+        'test_total{outcome="SOLD"} 2',
+        'test_total{outcome="say \\"hi\\""} 1',
+    ]
+
+# Check histogram buckets are cumulative
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "A test histogram.", (), (0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    lines = histogram.render()
+    assert 'test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_seconds_count 3" in lines
+
+# Check purchases record outcomes and statements are counted
+def test_machine_records_outcomes():
+    machine = VendingMachine('test', ':memory:')
+    machine.stock_row("A1", "Product", 150, 10)
+    statements = SQL_STATEMENTS.value()
+    refused = PURCHASE_OUTCOMES.value("test", "CHANGE_REFUSED")
+    sold = PURCHASE_OUTCOMES.value("test", "SOLD")
+    machine.select_product("A1")
+    machine.insert_money(200)
+    machine.select_product("A1")
+    machine.insert_money(150)
+    assert PURCHASE_OUTCOMES.value("test", "CHANGE_REFUSED") == refused + 1
+    assert PURCHASE_OUTCOMES.value("test", "SOLD") == sold + 1
+    assert SQL_STATEMENTS.value() > statements
+
+# Check stock and coin gauges appear in the rendered output per machine
+def test_machine_gauges():
+    metrics.update_machine_gauges([
+        ("m1", {"A1": 4}, {50: 3}), ("m2", {"A1": 1}, {})])
+    text = metrics.REGISTRY.render()
+    assert 'vending_stock_quantity{machine="m1",selection_code="A1"} 4' in text
+    assert 'vending_stock_quantity{machine="m2",selection_code="A1"} 1' in text
+    assert 'vending_coin_quantity{machine="m1",denomination="50"} 3' in text
+
+# Check fleet mode serves one /metrics labelled by machine
+def test_fleet_metrics(tmp_path):
+    app = main.create_app(fleet_dir=str(tmp_path))
+    with TestClient(app) as client:
+        client.put("/machines/m1/stock/restock", json=["A1", "Crisps", 150, 3])
+        client.put("/machines/m2/stock/restock", json=["A1", "Crisps", 150, 1])
+        assert client.get("/machines/m1/metrics").status_code == 404
+        text = client.get("/metrics").text
+    assert 'vending_stock_quantity{machine="m1",selection_code="A1"} 3' in text
+    assert 'vending_stock_quantity{machine="m2",selection_code="A1"} 1' in text
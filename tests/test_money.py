@@ -0,0 +1,21 @@
+from money import format_pence, is_accepted_coin, is_pence, to_pence
+
+# Check pounds convert to whole pence without float drift
+def test_to_pence():
+    assert to_pence(1.99) == 199
+    assert to_pence(0.1) == 10
+    assert to_pence(0.29) == 29
+    assert to_pence(2) == 200
+
+# Check pence are formatted as pounds for messages
+def test_format_pence():
+    assert format_pence(130) == "£1.30"
+    assert format_pence(5) == "£0.05"
+    assert format_pence(0) == "£0.00"
+
+# Check only whole, non-negative pence and accepted coins pass validation
+def test_validation():
+    assert is_pence(0) and is_pence(150)
+    assert not is_pence(1.5) and not is_pence(-1) and not is_pence(True)
+    assert is_accepted_coin(50)
+    assert not is_accepted_coin(3) and not is_accepted_coin(0.5)
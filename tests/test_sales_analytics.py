@@ -0,0 +1,100 @@
+import pytest
+
+from salesAnalytics import RollingWindow, SalesAnalytics
+from vendingMachine import VendingMachine
+
+# A fixed clock the tests can move forward
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+# Define a fixture analytics instance with sales spread over a day
+@pytest.fixture(scope='module')
+def clock():
+    return Clock(1_000_000.0)
+
+@pytest.fixture(scope='module')
+def analytics(clock):
+    analytics = SalesAnalytics(clock)
+    analytics.load([
+        (clock.now - 20 * 3600, "A1", 150),
+        (clock.now - 2 * 3600, "B2", 100),
+        (clock.now - 1800, "A1", 150),
+        (clock.now - 60, "B2", 100),
+        (clock.now - 30, "B2", 100),
+    ])
+    return analytics
+
+# Check each window only counts the sales that fall inside it
+def test_summary_windows(analytics):
+    hour = analytics.summary("hour")
+    assert hour["sales"] == [
+        {"selection_code": "A1", "units": 1, "revenue": 150},
+        {"selection_code": "B2", "units": 2, "revenue": 200},
+    ]
+    assert hour["units"] == 3
+    assert hour["revenue"] == 350
+    assert analytics.summary("day")["units"] == 5
+    assert analytics.summary("week")["revenue"] == 600
+
+# Check top sellers rank by units or by revenue
+def test_top_sellers(analytics):
+    assert [s["selection_code"] for s in analytics.top_sellers("day", 2)] == ["B2", "A1"]
+    assert [s["selection_code"] for s in analytics.top_sellers("day", 1, "revenue")] == ["B2"]
+    assert analytics.top_sellers("hour", 1, "revenue")[0]["revenue"] == 200
+
+# Check sales drop out of the totals as the window moves on
+def test_window_expiry(analytics, clock):
+    clock.now += 3600
+    assert analytics.summary("hour")["units"] == 0
+    clock.now += 7 * 24 * 3600
+    assert analytics.summary("week") == {
+        "window": "week", "sales": [], "units": 0, "revenue": 0}
+
+# Check unknown windows and rankings are rejected
+def test_unknown_window(analytics):
+    with pytest.raises(ValueError):
+        analytics.summary("month")
+    with pytest.raises(ValueError):
+        analytics.top_sellers("day", by="profit")
+
+# Check a sale older than the newest bucket still lands in its own bucket
+def test_late_sale():
+    window = RollingWindow(60, 5)
+    window.add(600, "A1", 100)
+    window.add(480, "A1", 100)
+    window.advance(840)
+    assert window.totals == {"A1": [1, 100]}
+
+# Check the machine records sales and rebuilds its windows from the ledger
+def test_machine_analytics(tmp_path):
+    path = str(tmp_path / "analytics.db")
+    machine = VendingMachine('test', path, background_flush=False)
+    machine.stock_row("A1", "Product", 100, 5)
+    for _ in range(2):
+        machine.select_product("A1")
+        machine.insert_money(100)
+    assert machine.sales_summary("hour")["units"] == 2
+    machine.close()
+    restarted = VendingMachine('test', path, background_flush=False)
+    assert restarted.top_sellers("week") == [
+        {"selection_code": "A1", "units": 2, "revenue": 200}]
+    restarted.close()
+
+# Check windows drop old buckets as sales are recorded, without any query
+def test_buckets_bounded():
+    clock = Clock(1_000_000.0)
+    analytics = SalesAnalytics(clock)
+    analytics.load(
+        (clock.now - 2 * 24 * 3600 + minute * 60, "A1", 100)
+        for minute in range(2 * 24 * 60))
+    assert len(analytics._windows["hour"]) <= 60
+    assert len(analytics._windows["day"]) <= 96
+    for _ in range(3 * 60):
+        clock.now += 60
+        analytics.record(clock.now, "A1", 100)
+    assert len(analytics._windows["hour"]) <= 60
+    assert analytics.summary("hour")["units"] == 60
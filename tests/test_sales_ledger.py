@@ -0,0 +1,97 @@
+import json
+import time
+
+import pytest
+from sqlalchemy import select
+
+from model.model import Sale_ledger_entry
+from salesLedger import SalesLedger
+from vendingMachine import VendingMachine
+
+# Define a fixture vending machine whose ledger only flushes when asked
+@pytest.fixture(scope='module')
+def test_machine():
+    vendingMachine = VendingMachine(
+        'test', ':memory:', ledger_max_latency=3600, background_flush=False)
+    vendingMachine.stock_row("A1", "Product", 130, 5)
+    vendingMachine.restock_change(value=50, quantity=2)
+    vendingMachine.restock_change(value=20, quantity=3)
+    yield vendingMachine
+
+def ledger_rows(machine):
+    return machine.session.scalars(
+        select(Sale_ledger_entry).order_by(Sale_ledger_entry.id)).all()
+
+# Check a sale is buffered rather than committed on the purchase path
+def test_sale_is_buffered(test_machine):
+    test_machine.select_product("A1")
+    test_machine.insert_money(200)
+    assert len(test_machine.ledger) == 1
+    assert ledger_rows(test_machine) == []
+
+# Check a flush appends the buffered sales with their change
+def test_flush_appends_sales(test_machine):
+    test_machine.select_product("A1")
+    test_machine.insert_money(100)
+    test_machine.insert_money(50)
+    assert test_machine.flush_ledger() == 2
+    rows = ledger_rows(test_machine)
+    assert [row.selection_code for row in rows] == ["A1", "A1"]
+    assert rows[0].amount_paid == 200
+    assert rows[0].change_given == 70
+    assert json.loads(rows[0].change_breakdown) == {"50": 1, "20": 1}
+    assert rows[1].change_given == 20
+    assert len(test_machine.ledger) == 0
+
+# Check a failed write keeps the sales for the next flush
+def test_failed_flush_requeues():
+    ledger = SalesLedger()
+    ledger.record(sold_at=1.0, selection_code="A1")
+
+    class FailingSession:
+        def execute(self, *args):
+            raise RuntimeError("disk full")
+
+        def rollback(self):
+            pass
+
+    with pytest.raises(RuntimeError):
+        ledger.flush(FailingSession())
+    assert len(ledger) == 1
+
+# Check a batch is due when full or when its oldest sale has waited too long
+def test_flush_due():
+    ledger = SalesLedger(max_batch=2, max_latency=0.05)
+    assert ledger.flush_due() is False
+    ledger.record(sold_at=1.0)
+    assert ledger.flush_due() is False
+    ledger.record(sold_at=2.0)
+    assert ledger.flush_due() is True
+    ledger = SalesLedger(max_batch=2, max_latency=0.05)
+    ledger.record(sold_at=1.0)
+    ledger.wait_until_due(1.0)
+    assert ledger.flush_due() is True
+
+# Check the background flusher commits sales within the latency bound
+def test_background_flush(tmp_path):
+    machine = VendingMachine(
+        'test', str(tmp_path / "ledger.db"), ledger_max_latency=0.05)
+    machine.stock_row("A1", "Product", 100, 5)
+    machine.select_product("A1")
+    machine.insert_money(100)
+    deadline = time.monotonic() + 5
+    while len(machine.ledger) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(machine.ledger) == 0
+    machine.close()
+    assert len(ledger_rows(machine)) == 1
+
+# Check closing the machine writes out any buffered sales
+def test_close_flushes(tmp_path):
+    machine = VendingMachine(
+        'test', str(tmp_path / "ledger.db"), ledger_max_latency=3600)
+    machine.stock_row("A1", "Product", 100, 5)
+    machine.select_product("A1")
+    machine.insert_money(100)
+    machine.close()
+    assert len(ledger_rows(machine)) == 1
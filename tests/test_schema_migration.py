@@ -0,0 +1,79 @@
+import sqlite3
+
+from sqlalchemy import create_engine
+
+from model.model import Base, Change, Sale_ledger_entry, Vending_machine_entry
+from schemaMigration import SCHEMA_VERSION, migrate, schema_version
+from vendingMachine import VendingMachine
+
+# Builds a database as it was stored before money moved to pence
+def make_pounds_database(path):
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE vending_data (
+            selection_code VARCHAR NOT NULL PRIMARY KEY,
+            product_name VARCHAR(30) NOT NULL,
+            cost FLOAT NOT NULL,
+            quantity INTEGER NOT NULL);
+        CREATE TABLE change_data (
+            value FLOAT NOT NULL PRIMARY KEY,
+            quantity INTEGER NOT NULL);
+        CREATE INDEX ix_change_data_value ON change_data (value);
+        CREATE TABLE sales_ledger (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            sold_at FLOAT NOT NULL,
+            selection_code VARCHAR NOT NULL,
+            product_name VARCHAR(30) NOT NULL,
+            price FLOAT NOT NULL,
+            amount_paid FLOAT NOT NULL,
+            change_given FLOAT NOT NULL,
+            change_breakdown VARCHAR NOT NULL);
+        CREATE INDEX ix_sales_ledger_sold_at ON sales_ledger (sold_at);
+        INSERT INTO vending_data VALUES ('A1', 'Crisps', 1.99, 4), ('A2', 'Gum', 0.29, 1),
+            ('A3', 'Tea', 1.005, 1);
+        INSERT INTO change_data VALUES (0.1, 5), (0.5, 2), (2.0, 1);
+        INSERT INTO sales_ledger VALUES (1, 1.0, 'A1', 'Crisps', 1.99, 2.0, 0.01, '{"1": 1}');
+    """)
+    connection.commit()
+    connection.close()
+
+# Check float pounds are converted to exact pence and the version is stamped
+def test_migrates_pounds(tmp_path):
+    path = str(tmp_path / "old.db")
+    make_pounds_database(path)
+    machine = VendingMachine('test', path, background_flush=False)
+    session = machine.session
+    assert session.get(Vending_machine_entry, "A1").cost == 199
+    assert session.get(Vending_machine_entry, "A2").cost == 29
+    assert session.get(Vending_machine_entry, "A3").cost == 101
+    assert {c.value: c.quantity for c in session.query(Change)} == {10: 5, 50: 2, 200: 1}
+    sale = session.get(Sale_ledger_entry, 1)
+    assert (sale.price, sale.amount_paid, sale.change_given) == (199, 200, 1)
+    assert machine.coin_inventory.coins == {10: 5, 50: 2, 200: 1}
+    with machine.engine.connect() as connection:
+        assert schema_version(connection) == SCHEMA_VERSION
+    machine.close()
+
+# Check new databases are stamped and migrating twice changes nothing
+def test_new_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    migrate(engine)
+    migrate(engine)
+    with engine.connect() as connection:
+        assert schema_version(connection) == SCHEMA_VERSION
+        tables = connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table'").scalars().all()
+    assert "vending_data_pounds" not in tables
+    assert {"vending_data", "change_data", "sales_ledger"} <= set(tables)
+    engine.dispose()
+
+# Check a database already at the current version skips create_all
+def test_current_database_skips_create_all(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'current.db'}")
+    migrate(engine)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("create_all should not run")
+    monkeypatch.setattr(Base.metadata, "create_all", fail)
+    migrate(engine)
+    engine.dispose()
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from vendingMachine import VendingMachine
+
+# Define a fixture vending machine with stock and change loaded
+@pytest.fixture(scope='module')
+def test_machine():
+    vendingMachine = VendingMachine('test', ':memory:')
+    vendingMachine.stock_row("A1", "Product", 150, 10)
+    vendingMachine.restock_change(value=50, quantity=10)
+    yield vendingMachine
+
+# Check the stock listing is serialised once per version
+def test_stock_snapshot_cached(test_machine):
+    etag, payload = test_machine.stock_snapshot()
+    assert json.loads(payload) == [
+        {"selection_code": "A1", "product_name": "Product", "cost": 150, "quantity": 10,
+         "exact_change_only": True}]
+    again_etag, again_payload = test_machine.stock_snapshot()
+    assert again_etag == etag
+    assert again_payload is payload
+
+# Check a purchase moves the version on and refreshes both listings
+def test_purchase_bumps_version(test_machine):
+    stock_etag, _payload = test_machine.stock_snapshot()
+    change_etag, _payload = test_machine.change_snapshot()
+    version = test_machine.inventory_version
+    test_machine.select_product("A1")
+    test_machine.insert_money(200)
+    assert test_machine.inventory_version > version
+    new_stock_etag, stock = test_machine.stock_snapshot()
+    new_change_etag, change = test_machine.change_snapshot()
+    assert new_stock_etag != stock_etag
+    assert new_change_etag != change_etag
+    assert json.loads(stock)[0]["quantity"] == 9
+    assert json.loads(change) == [{"value": 50, "quantity": 9}]
+
+# Check restocking moves the version on
+def test_restock_bumps_version(test_machine):
+    version = test_machine.inventory_version
+    test_machine.stock_rows([("B1", "Chips", 100, 5)])
+    test_machine.restock_change_rows([(20, 5)])
+    assert test_machine.inventory_version == version + 2
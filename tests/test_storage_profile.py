@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from asyncVendingMachine import AsyncVendingMachine
+from vendingMachine import VendingMachine
+
+# Check each profile's settings are applied to a file database
+@pytest.mark.parametrize("profile, journal_mode, synchronous", [
+    ("durable", "DELETE", "FULL"),
+    ("balanced", "WAL", "NORMAL"),
+    ("fast", "WAL", "OFF"),
+])
+def test_profile_applied(tmp_path, profile, journal_mode, synchronous):
+    machine = VendingMachine(
+        'test', str(tmp_path / "vending.db"), storage_profile=profile)
+    diagnostics = machine.storage_diagnostics()
+    assert diagnostics["profile"] == profile
+    assert diagnostics["settings"]["journal_mode"] == journal_mode
+    assert diagnostics["settings"]["synchronous"] == synchronous
+    assert diagnostics["settings"]["busy_timeout"] == 5000
+    machine.close()
+
+# Check file-only settings are skipped for in-memory databases
+def test_profile_in_memory():
+    machine = VendingMachine('test', ':memory:', storage_profile="fast")
+    settings = machine.storage_diagnostics()["settings"]
+    assert settings["journal_mode"] == "MEMORY"
+    assert settings["synchronous"] == "OFF"
+    assert settings["temp_store"] == "MEMORY"
+
+# Check unknown profiles are rejected
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        VendingMachine('test', ':memory:', storage_profile="reckless")
+
+# Check the async machine applies the profile to its aiosqlite engine
+def test_async_profile(tmp_path):
+    async def scenario():
+        machine = AsyncVendingMachine(
+            'test', str(tmp_path / "vending.db"), storage_profile="balanced")
+        await machine.start()
+        try:
+            return await machine.storage_diagnostics()
+        finally:
+            await machine.close()
+
+    diagnostics = asyncio.run(scenario())
+    assert diagnostics["settings"]["journal_mode"] == "WAL"
+    assert diagnostics["settings"]["synchronous"] == "NORMAL"
@@ -0,0 +1,86 @@
+import io
+import json
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import structuredLogging
+from structuredLogging import log_event
+from vendingMachine import VendingMachine
+
+# Define a fixture that captures structured log lines
+@pytest.fixture
+def log_stream():
+    stream = io.StringIO()
+    yield stream, structuredLogging.configure_logging("DEBUG", stream=stream)
+    structuredLogging.shutdown_logging()
+
+def read_events(stream):
+    structuredLogging.shutdown_logging()   # Drain the queue
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+# Check events are written as JSON with their fields
+def test_event_is_json(log_stream):
+    stream, _sampling = log_stream
+    log_event(logging.getLogger("vending.test"), logging.INFO, "sale", code="A1")
+    events = read_events(stream)
+    assert isinstance(events[0].pop("ts"), float)
+    assert events == [
+        {"level": "INFO", "logger": "vending.test", "event": "sale", "code": "A1"}]
+
+# Check sampled events can be dropped entirely
+def test_sampling(log_stream):
+    stream, sampling = log_stream
+    sampling.sample_rates["noisy"] = 0
+    logger = logging.getLogger("vending.test")
+    for _ in range(10):
+        log_event(logger, logging.INFO, "noisy")
+    log_event(logger, logging.INFO, "kept")
+    assert [e["event"] for e in read_events(stream)] == ["kept"]
+
+# Check SQL statements are only logged once echo is switched on
+def test_sql_echo_toggle(log_stream):
+    stream, _sampling = log_stream
+    machine = VendingMachine('test', ':memory:')
+    machine.stock_row("A1", "Product", 150, 10)
+    structuredLogging.set_sql_echo(True)
+    machine.stock_row("A1", "Product", 150, 9)
+    structuredLogging.set_sql_echo(False)
+    loggers = {e["logger"] for e in read_events(stream)}
+    assert any(name.startswith("sqlalchemy.engine") for name in loggers)
+
+# Check the machine logs change breakdowns instead of printing them
+def test_machine_logs_breakdown(log_stream, capsys):
+    stream, _sampling = log_stream
+    machine = VendingMachine('test', ':memory:')
+    machine.stock_row("A1", "Product", 150, 10)
+    machine.restock_change(value=50, quantity=10)
+    machine.select_product("A1")
+    machine.insert_money(200)
+    events = read_events(stream)
+    assert capsys.readouterr().out == ""
+    assert events[-1]["event"] == "change.breakdown"
+    assert events[-1]["required"] == 50
+
+# Check sample rates are parsed from configuration and validated
+def test_parse_sample_rates():
+    assert structuredLogging.parse_sample_rates("") == {}
+    assert structuredLogging.parse_sample_rates(
+        "change.breakdown=0.01, noisy=0") == {"change.breakdown": 0.01, "noisy": 0.0}
+    for text in ("noisy", "noisy=2", "=0.5", "noisy=often"):
+        with pytest.raises(ValueError):
+            structuredLogging.parse_sample_rates(text)
+
+# Check sample rates are configured from the environment and changed at runtime
+def test_sampling_configuration(tmp_path, monkeypatch):
+    monkeypatch.setenv("VENDING_LOG_SAMPLE_RATES", "change.breakdown=0.5")
+    app = main.create_app(db_path=str(tmp_path / "log.db"), use_async=False)
+    with TestClient(app) as client:
+        assert structuredLogging.sample_rates() == {"change.breakdown": 0.5}
+        response = client.put("/admin/log_sampling", json={"noisy": 0})
+        assert response.json() == {"sample_rates": {"noisy": 0.0}}
+        assert client.put(
+            "/admin/log_sampling", json={"noisy": 1.5}).status_code == 400
+        assert structuredLogging.sample_rates() == {"noisy": 0.0}
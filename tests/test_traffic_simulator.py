@@ -0,0 +1,56 @@
+from trafficSimulator import (
+    default_catalog, run_batch, simulate, summarize_runs)
+
+# Check every customer ends in a sale, a change refusal or a stockout
+def test_customers_accounted_for():
+    report = simulate(seed=1, days=0.5, arrivals_per_hour=20)
+    assert report["customers"] > 0
+    assert report["customers"] == (
+        report["sales"] + report["change_refused"] + report["stockouts"])
+    assert report["sales"] == sum(
+        slot["sold"] for slot in report["slots"].values())
+
+# Check a seed always gives the same traffic
+def test_deterministic():
+    first = simulate(seed=7, days=0.25)
+    second = simulate(seed=7, days=0.25)
+    for key in ("customers", "sales", "change_refused", "stockouts", "slots"):
+        assert first[key] == second[key]
+
+# Check a slot that sells out records when it emptied and then stocks out
+def test_time_to_empty():
+    catalog = [("A1", "Crisps", 100, 3, 1.0)]
+    report = simulate(
+        seed=2, days=1, arrivals_per_hour=10, catalog=catalog,
+        coin_float={}, coin_mix={100: 1})
+    slot = report["slots"]["A1"]
+    assert slot["sold"] == 3
+    assert 0 < slot["time_to_empty_hours"] < 24
+    assert slot["stockouts"] == report["customers"] - 3
+
+# Check restocking refills the slots and the coin float
+def test_restock():
+    catalog = [("A1", "Crisps", 100, 3, 1.0)]
+    report = simulate(
+        seed=2, days=2, arrivals_per_hour=10, catalog=catalog,
+        coin_float={}, coin_mix={100: 1}, restock_every_hours=24)
+    assert report["slots"]["A1"]["sold"] == 6
+
+# Check change refusals are counted when the float cannot pay change
+def test_change_refused():
+    catalog = [("A1", "Crisps", 90, 50, 1.0)]
+    report = simulate(
+        seed=3, days=0.5, catalog=catalog, coin_float={}, coin_mix={100: 1})
+    assert report["sales"] == 0
+    assert report["change_refused"] == report["customers"]
+
+# Check batches run across processes in seed order and summarise
+def test_run_batch():
+    options = dict(days=0.1, catalog=default_catalog(3, 2))
+    reports = run_batch(runs=3, seed=5, workers=2, **options)
+    assert [report["seed"] for report in reports] == [5, 6, 7]
+    assert reports[0]["sales"] == simulate(seed=5, **options)["sales"]
+    summary = summarize_runs(reports)
+    assert summary["runs"] == 3
+    assert set(summary["slots"]) == {"S01", "S02", "S03"}
+    assert 0 <= summary["slots"]["S01"]["emptied_share"] <= 1
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from transactionStore import TransactionStore, UnknownTransactionError
+from vendingMachine import VendingMachine
+
+# Define a fixture vending machine with stock and change loaded
+@pytest.fixture(scope='module')
+def test_machine():
+    vendingMachine = VendingMachine('test', ':memory:')
+    vendingMachine.stock_row("A1", "Product", 150, 10)
+    vendingMachine.restock_change(value=50, quantity=10)
+    yield vendingMachine
+
+# Check two customers keep separate balances
+def test_transactions_are_isolated(test_machine):
+    first = test_machine.open_transaction()
+    second = test_machine.open_transaction()
+    test_machine.select_product("A1", first)
+    test_machine.select_product("A1", second)
+    test_machine.insert_money(100, first)
+    test_machine.insert_money(50, second)
+    assert test_machine.return_balance(first) == 100
+    assert test_machine.return_balance(second) == 50
+    assert test_machine.money_cache == 0
+
+# Check a completed sale frees the token
+def test_completed_transaction_closed(test_machine):
+    transaction = test_machine.open_transaction()
+    test_machine.select_product("A1", transaction)
+    test_machine.insert_money(200, transaction)
+    with pytest.raises(UnknownTransactionError):
+        test_machine.get_transaction(transaction.token)
+
+# Check idle transactions expire and refund their money
+def test_expired_transaction_refunded():
+    refunded = []
+    store = TransactionStore(ttl=0.01, on_expire=refunded.append)
+    transaction = store.open()
+    transaction.money_cache = 100
+    time.sleep(0.02)
+    assert store.purge_expired() == 1
+    assert refunded == [transaction]
+    with pytest.raises(UnknownTransactionError):
+        store.get(transaction.token)
+
+# Check the store evicts the least recently used transaction when full
+def test_store_is_bounded():
+    evicted = []
+    store = TransactionStore(max_transactions=2, on_expire=evicted.append)
+    first = store.open()
+    second = store.open()
+    store.get(first.token)
+    store.open()
+    assert len(store) == 2
+    assert evicted == [second]
+
+# Check a transaction opened by a request that fails is closed again
+def test_failed_selection_closes_transaction(tmp_path, monkeypatch):
+    machine = VendingMachine(
+        'test', str(tmp_path / "failed.db"), background_flush=False)
+
+    def broken_select(selection_code, transaction=None):
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(machine, "select_product", broken_select)
+    monkeypatch.setattr(machine, "set_cart", broken_select)
+    client = TestClient(
+        main.create_app(machine=machine), raise_server_exceptions=False)
+    with client:
+        response = client.put("/select_product", params={"selection_code": "A1"})
+        assert response.status_code == 500
+        assert client.put("/cart", json={"A1": 1}).status_code == 500
+        assert len(machine.transactions) == 0
@@ -27,7 +27,7 @@ def test_stock_item(test_db):
     new_product = Vending_machine_entry(
         selection_code="A1",
         product_name="Product",
-        cost=1.99,
+        cost=199,
         quantity=10)
     test_db.add(new_product)
     test_db.commit()
@@ -40,7 +40,7 @@ def test_stock_item(test_db):
     assert product is not None
     assert product.selection_code == "A1"
     assert product.product_name == "Product"
-    assert product.cost == 1.99
+    assert product.cost == 199
     assert product.quantity == 10
 
 # Test adding an incorrectly defined item to the database
@@ -49,7 +49,7 @@ def test_stocking_product_with_incorrect_fields(test_db):
     # Try to create a product with the wrong primary key field and check it fails
     with pytest.raises(Exception):
         faulty_entry = Vending_machine_entry(
-            code="A1000", product_name="Product", cost=1.99, quantity=10)
+            code="A1000", product_name="Product", cost=199, quantity=10)
         test_db.add(faulty_entry)
         test_db.commit()  # This should raise an exception
      # Rollback the change
@@ -68,7 +68,7 @@ def test_product_is_in_stock(test_db):
 def test_purchase_insufficient_cash(test_db):
     product = test_db.query(Vending_machine_entry).filter_by(
         selection_code="A1").first()
-    status, _msg = product.try_purchase(1.50)
+    status, _msg = product.try_purchase(150)
 
     assert status == "UNSOLD"
 
@@ -76,12 +76,12 @@ def test_purchase_insufficient_cash(test_db):
 def test_purchase_exact_cash(test_db):
     product = test_db.query(Vending_machine_entry).filter_by(
         selection_code="A1").first()
-    status, _msg = product.try_purchase(1.99)
+    status, _msg = product.try_purchase(199)
     assert status == "SOLD"
 
 # Check the  machine will calculate vending when excess cash
 def test_purchase_excess_change(test_db):
     product = test_db.query(Vending_machine_entry).filter_by(
         selection_code="A1").first()
-    status, _msg = product.try_purchase(2.00)
+    status, _msg = product.try_purchase(200)
     assert status == "EVALUATE"
@@ -16,7 +16,7 @@ def test_stock_row(test_machine):
     test_machine.stock_row(
         selection_code="A1",
         product_name="Product",
-        cost=1.99,
+        cost=199,
         quantity=10)
 
     # Fetch the product back from the database
@@ -26,25 +26,25 @@ def test_stock_row(test_machine):
     assert product is not None
     assert product.selection_code == "A1"
     assert product.product_name == "Product"
-    assert product.cost == 1.99
+    assert product.cost == 199
     assert product.quantity == 10
 
 # Check coins can be added
 def test_stock_change(test_machine):
 
-    test_machine.restock_change(value=0.50, quantity=10)
+    test_machine.restock_change(value=50, quantity=10)
 
     # Fetch the product back from the database
-    coin = test_machine.session.get(Change, 0.5)
+    coin = test_machine.session.get(Change, 50)
    
     # Assert the right coins have been added
     assert coin is not None
-    assert coin.value == 0.5
+    assert coin.value == 50
     assert coin.quantity == 10
 
 # Check can return user money
 def test_return_money(test_machine):
-    test_machine.money_cache = 2.0
+    test_machine.money_cache = 200
     test_machine.return_money()
     assert test_machine.money_cache == 0
 
@@ -58,12 +58,12 @@ def test_print_vending_data(test_machine):
 def test_print_change_data(test_machine):
     entries = test_machine.session.query(Change).all()
     assert len(entries) == 1
-    assert entries[0].value == 0.5
+    assert entries[0].value == 50
 
 # Test can select existent item
 def test_select_existent_product(test_machine):
     cost = test_machine.select_product('A1')
-    assert isinstance(cost, float)
+    assert isinstance(cost, int)
 
 # Test can't select non-existent
 def test_select_non_existent_product(test_machine):
@@ -76,7 +76,7 @@ def test_select_out_of_stock_existent_product(test_machine):
         test_machine.stock_row(
             selection_code="A1",
             product_name="Product",
-            cost=1.99,
+            cost=199,
             quantity=0)
         test_machine.select_product('A1')
 
@@ -84,7 +84,7 @@ def test_select_out_of_stock_existent_product(test_machine):
     test_machine.stock_row(
         selection_code="A1",
         product_name="Product",
-        cost=1.99,
+        cost=199,
         quantity=10)
 
 # Test balance doesn't when given too little change
@@ -92,15 +92,15 @@ def test_insert_insufficient_money(test_machine):
     product = test_machine.session.get(Vending_machine_entry, "A1")
     test_machine.money_cache = 0
     test_machine.selected_product = product
-    _msg = test_machine.insert_money(0.01)
-    assert test_machine.money_cache == 0.01
+    _msg = test_machine.insert_money(1)
+    assert test_machine.money_cache == 1
 
 # Test balance resets when given exact change
 def test_insert_exact_money(test_machine): 
     product = test_machine.session.get(Vending_machine_entry, "A1")
     test_machine.money_cache = 0
     test_machine.selected_product = product
-    _msg = test_machine.insert_money(1.99)
+    _msg = test_machine.insert_money(199)
     assert test_machine.money_cache == 0
 
 # Test balance resets when given excess change
@@ -108,18 +108,18 @@ def test_insert_excess_money(test_machine):
     product = test_machine.session.get(Vending_machine_entry, "A1")
     test_machine.money_cache = 0
     test_machine.selected_product = product
-    _msg = test_machine.insert_money(2.00)
+    _msg = test_machine.insert_money(200)
     assert test_machine.money_cache == 0
 
 # Test returns change when it has sufficient change
 def test_when_sufficient_change(test_machine):
-    coin_list, _msg = test_machine.calculate_change_possibility(0.5)
-    assert isinstance(coin_list, list)
+    coin_list, _msg = test_machine.calculate_change_possibility(50)
+    assert coin_list == {50: 1}
 
 # Test machine accurately rejects transaction when it doesn't
 # have enough change
 def test_when_insufficient_change(test_machine):
-    coin_list, _msg = test_machine.calculate_change_possibility(0.15)
+    coin_list, _msg = test_machine.calculate_change_possibility(15)
     assert coin_list is None
 
 # Test machine accurately resets selection
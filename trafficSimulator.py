@@ -0,0 +1,270 @@
+"""
+Discrete-event simulation of customer traffic at a vending machine.
+
+Drives a VendingMachine on an in-memory database with synthetic customers
+arriving at random, choosing products by popularity and paying with coins
+drawn from a coin mix. Simulated time is independent of wall time, so days
+of traffic run in seconds. Used to size coin floats and restock intervals,
+and as a macro-benchmark of the purchase path:
+
+    python trafficSimulator.py --days 7 --runs 8 --out simulation.json
+"""
+import argparse
+import heapq
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from vendingMachine import OutOfStockError, VendingMachine
+
+# Coins loaded into the machine as its change float, in pence
+DEFAULT_COIN_FLOAT = {5: 50, 10: 50, 20: 50, 50: 30, 100: 10}
+# Relative frequency of each coin in customers' pockets
+DEFAULT_COIN_MIX = {5: 1, 10: 1, 20: 2, 50: 3, 100: 3, 200: 1}
+
+
+def default_catalog(slots=12, quantity=10):
+    """
+    Builds a catalog of product slots with a long-tailed popularity.
+
+    Args:
+        slots (int): The number of product slots.
+        quantity (int): Units loaded into each slot.
+
+    Returns:
+        list: (selection_code, product_name, cost in pence, quantity,
+            popularity) tuples. The nth slot is 1/n as popular as the first.
+    """
+    return [
+        (f"S{i:02d}", f"Product {i}", 60 + 5 * (i % 12), quantity, 1 / i)
+        for i in range(1, slots + 1)
+    ]
+
+
+def simulate(
+    seed=0,
+    days=1.0,
+    arrivals_per_hour=30.0,
+    catalog=None,
+    coin_float=None,
+    coin_mix=None,
+    restock_every_hours=None,
+):
+    """
+    Simulates customer traffic at one machine.
+
+    Customers arrive as a Poisson process. Each chooses a product weighted
+    by popularity, selects it and inserts coins drawn from the coin mix one
+    at a time until they have paid at least the price. As in the machine,
+    coins paid in are not added to the change float, so the float only
+    drains. The machine's stock and coin float are restored to their
+    starting levels every restock_every_hours, if given.
+
+    Args:
+        seed (int): Seed for the random number generator.
+        days (float): Simulated days of traffic.
+        arrivals_per_hour (float): Mean customer arrivals per hour.
+        catalog (list): Product slots as returned by default_catalog.
+        coin_float (dict): Coins (pence to count) loaded for change.
+        coin_mix (dict): Relative frequency of each coin customers pay with.
+        restock_every_hours (float): Hours between restocks, or None.
+
+    Returns:
+        dict: Customers, sales, revenue, change refusals and stockouts, the
+            sales, stockouts and hours until first empty of each slot, the
+            coins left, and the wall time taken.
+    """
+    rng = random.Random(seed)
+    catalog = catalog if catalog is not None else default_catalog()
+    coin_float = dict(coin_float if coin_float is not None else DEFAULT_COIN_FLOAT)
+    coin_mix = coin_mix if coin_mix is not None else DEFAULT_COIN_MIX
+    codes = [slot[0] for slot in catalog]
+    popularity = [slot[4] for slot in catalog]
+    coins, coin_weights = list(coin_mix), list(coin_mix.values())
+    stock = [slot[:4] for slot in catalog]
+
+    machine = VendingMachine(
+        "simulation", ":memory:", storage_profile="fast",
+        background_flush=False)
+    machine.stock_rows(stock)
+    machine.restock_change_rows(list(coin_float.items()))
+
+    slots = {
+        code: {"sold": 0, "stockouts": 0, "time_to_empty_hours": None}
+        for code in codes
+    }
+    report = {
+        "seed": seed,
+        "days": days,
+        "customers": 0,
+        "sales": 0,
+        "revenue": 0,
+        "change_refused": 0,
+        "stockouts": 0,
+    }
+
+    # Events are (hour, sequence, kind), taken in time order
+    end = days * 24
+    events = []
+    sequence = 0
+
+    def schedule(hour, kind):
+        nonlocal sequence
+        if hour <= end:
+            heapq.heappush(events, (hour, sequence, kind))
+            sequence += 1
+
+    schedule(rng.expovariate(arrivals_per_hour), "arrival")
+    if restock_every_hours is not None:
+        schedule(restock_every_hours, "restock")
+
+    started = time.perf_counter()
+    while events:
+        hour, _sequence, kind = heapq.heappop(events)
+        if kind == "restock":
+            machine.stock_rows(stock)
+            machine.restock_change_rows(list(coin_float.items()))
+            schedule(hour + restock_every_hours, "restock")
+            continue
+
+        schedule(hour + rng.expovariate(arrivals_per_hour), "arrival")
+        report["customers"] += 1
+        code = rng.choices(codes, popularity)[0]
+        transaction = machine.open_transaction()
+        try:
+            cost = machine.select_product(code, transaction)
+        except OutOfStockError:
+            report["stockouts"] += 1
+            slots[code]["stockouts"] += 1
+            machine.transactions.close(transaction.token)
+            continue
+        paid = 0
+        while paid < cost:
+            coin = rng.choices(coins, coin_weights)[0]
+            paid += coin
+            machine.insert_money(coin, transaction)
+        if transaction.purchase is not None:
+            # The machine could not make change and returned the money
+            report["change_refused"] += 1
+            machine.reset_selection(transaction)
+            machine.transactions.close(transaction.token)
+            continue
+        report["sales"] += 1
+        report["revenue"] += cost
+        slots[code]["sold"] += 1
+        if (machine.stock_index.quantities[code] == 0
+                and slots[code]["time_to_empty_hours"] is None):
+            slots[code]["time_to_empty_hours"] = round(hour, 3)
+
+    wall_seconds = time.perf_counter() - started
+    report["slots"] = slots
+    report["coins_left"] = dict(machine.coin_inventory.coins)
+    report["wall_seconds"] = round(wall_seconds, 3)
+    report["customers_per_second"] = (
+        round(report["customers"] / wall_seconds, 1) if wall_seconds else 0.0)
+    machine.close()
+    return report
+
+
+def _simulate(options):
+    return simulate(**options)
+
+
+def run_batch(runs=8, seed=0, workers=None, **options):
+    """
+    Runs repeated simulations with consecutive seeds across a process pool.
+
+    Args:
+        runs (int): The number of simulations.
+        seed (int): The seed of the first run.
+        workers (int): Worker processes, defaulting to one per CPU. With 1
+            the runs are made in this process.
+        **options: Further keyword arguments for simulate.
+
+    Returns:
+        list: The report of each run, in seed order.
+    """
+    batch = [dict(options, seed=seed + run) for run in range(runs)]
+    if workers == 1:
+        return [_simulate(options) for options in batch]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_simulate, batch))
+
+
+def summarize_runs(reports):
+    """
+    Summarises a batch of simulation reports.
+
+    Args:
+        reports (list): Reports returned by simulate.
+
+    Returns:
+        dict: The mean and 95th percentile of sales, change refusals and
+            stockouts per run, and for each slot the share of runs in which
+            it emptied and the median hours until it did.
+    """
+    def spread(values):
+        ordered = sorted(values)
+        return {
+            "mean": round(statistics.fmean(ordered), 2),
+            "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        }
+
+    summary = {
+        "runs": len(reports),
+        "customers_per_second": round(statistics.fmean(
+            report["customers_per_second"] for report in reports), 1),
+    }
+    for measure in ("sales", "change_refused", "stockouts"):
+        summary[measure] = spread(report[measure] for report in reports)
+    summary["slots"] = {}
+    for code in reports[0]["slots"]:
+        emptied = [
+            report["slots"][code]["time_to_empty_hours"] for report in reports
+            if report["slots"][code]["time_to_empty_hours"] is not None
+        ]
+        summary["slots"][code] = {
+            "emptied_share": round(len(emptied) / len(reports), 2),
+            "median_hours_to_empty": (
+                statistics.median(emptied) if emptied else None),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=float, default=1.0)
+    parser.add_argument("--arrivals-per-hour", type=float, default=30.0)
+    parser.add_argument("--slots", type=int, default=12)
+    parser.add_argument("--quantity", type=int, default=10,
+                        help="Units loaded into each slot")
+    parser.add_argument("--restock-every-hours", type=float)
+    parser.add_argument("--runs", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes, default one per CPU")
+    parser.add_argument("--out", help="Write the reports to this JSON file")
+    args = parser.parse_args(argv)
+
+    # An empty float would log a warning for every customer refused change
+    logging.getLogger("vending").setLevel(logging.ERROR)
+    reports = run_batch(
+        runs=args.runs, seed=args.seed, workers=args.workers,
+        days=args.days, arrivals_per_hour=args.arrivals_per_hour,
+        catalog=default_catalog(args.slots, args.quantity),
+        restock_every_hours=args.restock_every_hours,
+    )
+    summary = summarize_runs(reports)
+    print(json.dumps(summary, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "runs": reports}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class UnknownTransactionError(Exception):
+    """Exception raised when a transaction token is unknown or has expired."""
+    pass
+
+
+class Transaction:
+    """
+    The state of one customer's purchase.
+
+    Attributes:
+        token (str): The token identifying the transaction, or None for the
+            machine's default transaction.
+        money_cache (int): The amount of money the customer has inserted, in
+            pence.
+        selected_product (Vending_machine_entry): The product being bought.
+        cart (Cart): The products being bought together, used instead of a
+            selected product.
+        change_breakdown (dict): Coins (pence to count) paid out as change
+            for the sale being completed.
+        expires_at (float): Monotonic time at which the transaction expires.
+    """
+
+    def __init__(self, token=None, expires_at=None):
+        self.token = token
+        self.money_cache = 0
+        self.selected_product = None
+        self.cart = None
+        self.change_breakdown = {}
+        self.expires_at = expires_at
+
+    @property
+    def purchase(self):
+        """The cart if one is filled, otherwise the selected product."""
+        return self.cart if self.cart is not None else self.selected_product
+
+
+class TransactionStore:
+    """
+    A bounded store of open transactions keyed by token.
+
+    Transactions are kept in least recently used order, so expired ones are
+    always found at the front and can be purged without scanning the whole
+    store. When a transaction expires, or is evicted to make room for a new
+    one, the on_expire callback is called so any inserted money is refunded.
+
+    Attributes:
+        max_transactions (int): The maximum number of open transactions.
+        ttl (float): Seconds a transaction may sit idle before it expires.
+        on_expire (callable): Called with each expired Transaction.
+    """
+
+    def __init__(self, max_transactions=1000, ttl=120.0, on_expire=None):
+        """
+        Initializes an empty TransactionStore.
+
+        Args:
+            max_transactions (int): The maximum number of open transactions.
+            ttl (float): Seconds a transaction may sit idle before it expires.
+            on_expire (callable): Called with each expired Transaction.
+        """
+        self.max_transactions = max_transactions
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self._transactions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def open(self):
+        """
+        Opens a new transaction, evicting the oldest one if the store is full.
+
+        Returns:
+            Transaction: The new transaction.
+        """
+        now = time.monotonic()
+        expired = self._purge(now)
+        with self._lock:
+            while len(self._transactions) >= self.max_transactions:
+                expired.append(self._transactions.popitem(last=False)[1])
+            transaction = Transaction(secrets.token_urlsafe(16), now + self.ttl)
+            self._transactions[transaction.token] = transaction
+        self._expire(expired)
+        return transaction
+
+    def get(self, token):
+        """
+        Looks up an open transaction and extends its expiry.
+
+        Args:
+            token (str): The transaction token.
+
+        Returns:
+            Transaction: The matching transaction.
+
+        Raises:
+            UnknownTransactionError: If the token is unknown or has expired.
+        """
+        now = time.monotonic()
+        expired = self._purge(now)
+        self._expire(expired)
+        with self._lock:
+            transaction = self._transactions.get(token)
+            if transaction is None:
+                raise UnknownTransactionError(
+                    "Transaction not found or has expired")
+            transaction.expires_at = now + self.ttl
+            self._transactions.move_to_end(token)
+            return transaction
+
+    def close(self, token):
+        """
+        Removes a finished transaction from the store.
+
+        Args:
+            token (str): The transaction token.
+        """
+        with self._lock:
+            self._transactions.pop(token, None)
+
+    def purge_expired(self):
+        """
+        Expires every transaction that has passed its TTL.
+
+        Returns:
+            int: The number of transactions expired.
+        """
+        expired = self._purge(time.monotonic())
+        self._expire(expired)
+        return len(expired)
+
+    def _purge(self, now):
+        # Idle transactions sit at the front, so stop at the first live one
+        expired = []
+        with self._lock:
+            while self._transactions:
+                transaction = next(iter(self._transactions.values()))
+                if transaction.expires_at > now:
+                    break
+                expired.append(self._transactions.popitem(last=False)[1])
+        return expired
+
+    def _expire(self, expired):
+        if self.on_expire is not None:
+            for transaction in expired:
+                self.on_expire(transaction)
@@ -1,7 +1,36 @@
-from sqlalchemy import create_engine
+import functools
+import json
+import logging
+import secrets
+import threading
+import time
+
+from sqlalchemy import create_engine, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from cart import Cart, CartLine
+from coinInventory import CoinInventory
+from holdBook import HoldBook
+from listingSchemas import CoinRow, StockRow, encode_listing
+from lowStockIndex import LowStockIndex
+import schemaMigration
+import storageProfile
+from metrics import PURCHASE_OUTCOMES, timed_step, track_sql
+from money import format_pence, is_accepted_coin, is_pence
+from model.model import Change, Sale_ledger_entry, Vending_machine_entry
+from salesAnalytics import WINDOWS, SalesAnalytics
+from salesLedger import SalesLedger
+from structuredLogging import log_event
+from transactionStore import Transaction, TransactionStore
 
-from model.model import Base, Change, Vending_machine_entry
+logger = logging.getLogger("vending.machine")
+
+# Most coins taken in one insert_coins call, which bounds the change that
+# one request can ask the change engine to work out
+MAX_COINS_PER_INSERT = 50
 
 
 class OutOfStockError(Exception):
@@ -14,6 +43,129 @@ class SelectedCodeInvalidError(Exception):
     pass
 
 
+class PurchaseRaceLostError(Exception):
+    """Exception raised when stock or change is taken by a concurrent sale."""
+    pass
+
+
+class InvalidCoinError(Exception):
+    """Exception raised when a coin inserted is not an accepted denomination."""
+    pass
+
+
+def create_machine_engine(
+        vending_db_file_path, storage_profile="durable", echo=False):
+    """
+    Creates the sync engine for a vending machine database.
+
+    Args:
+        vending_db_file_path (str): The file path for the SQLite database,
+            or ":memory:".
+        storage_profile (str): The SQLite storage profile, see
+            storageProfile.PROFILES.
+        echo (bool): Whether the engine prints every SQL statement.
+
+    Returns:
+        Engine: The engine, with the storage profile applied.
+    """
+    in_memory = vending_db_file_path == ":memory:"
+    # DB created if it doesn't exist. An in-memory DB lives on one
+    # connection, so share it between threads rather than giving each
+    # thread its own empty database
+    engine_options = storageProfile.pool_options(storage_profile, in_memory)
+    if in_memory:
+        engine_options = {
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+        }
+    engine = create_engine(
+        f"sqlite:///{vending_db_file_path}", echo=echo, **engine_options)
+    storageProfile.apply_profile(engine, storage_profile, in_memory)
+    return engine
+
+
+def _synchronized(method):
+    # Serialise access to the machine's shared database session
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _is_locked(error):
+    # Whether an OperationalError is SQLite giving up on a lock held by
+    # another writer, rather than a fault in the database itself
+    name = getattr(error.orig, "sqlite_errorname", "")
+    return (name in ("SQLITE_BUSY", "SQLITE_LOCKED")
+            or "database is locked" in str(error.orig))
+
+
+# Columns of the product and coin listings, the keyset column first
+_STOCK_COLUMNS = ("selection_code", "product_name", "cost", "quantity")
+_CHANGE_COLUMNS = ("value", "quantity")
+# Rows fetched from the cursor at a time when reading a listing page
+_YIELD_PER = 500
+
+
+def _iter_pages(page, batch_size):
+    # Walk a keyset-paginated listing from the first page to the last
+    after = None
+    while True:
+        rows, after = page(after, batch_size)
+        if rows:
+            yield rows
+        if after is None:
+            return
+
+
+def _units(transaction):
+    # The units of each product a transaction is buying
+    if transaction.cart is not None:
+        return transaction.cart.units()
+    return {transaction.selected_product.selection_code: 1}
+
+
+def _validate_stock_row(row):
+    # Returns a reason the row cannot be stocked, or None if it is valid
+    if len(row) != 4:
+        return "Expected selection code, product name, cost and quantity"
+    selection_code, product_name, cost, quantity = row
+    if not isinstance(selection_code, str) or not selection_code:
+        return "Selection code must be a non-empty string"
+    if not isinstance(product_name, str) or not 0 < len(product_name) <= 30:
+        return "Product name must be 1 to 30 characters"
+    if not is_pence(cost) or cost == 0:
+        return "Cost must be a positive whole number of pence"
+    if not is_pence(quantity):
+        return "Quantity must be a non-negative integer"
+    return None
+
+
+def _validate_change_row(row):
+    # Returns a reason the coin cannot be stocked, or None if it is valid
+    if len(row) != 2:
+        return "Expected coin value and quantity"
+    value, quantity = row
+    if not is_pence(value) or value == 0:
+        return "Coin value must be a positive whole number of pence"
+    if not is_pence(quantity):
+        return "Quantity must be a non-negative integer"
+    return None
+
+
+def _validate_rows(rows, validator):
+    results = []
+    for index, row in enumerate(rows):
+        error = validator(row)
+        if error is None:
+            results.append({"row": index, "status": "ok"})
+        else:
+            results.append({"row": index, "status": "invalid", "detail": error})
+    valid = all(result["status"] == "ok" for result in results)
+    return valid, results
+
+
 class VendingMachine:
     """
     A class to represent a vending machine.
@@ -28,29 +180,155 @@ class VendingMachine:
         engine (Engine): The SQLAlchemy engine used to connect to the database.
         Session (sessionmaker): A factory for creating new session objects.
         session (Session): The current database session.
-        money_cache (float): The amount of money currently inserted into the machine.
-        selected_product (Vending_machine_entry): The currently selected product.
+        coin_inventory (CoinInventory): In-memory copy of the coins held,
+            used to plan change without a database round trip.
+        transactions (TransactionStore): Open customer transactions by token.
+        inventory_version (int): Increases whenever stock or coins change, so
+            cached listings can be reused until it moves on.
+        ledger (SalesLedger): Sales waiting to be group-committed to the
+            sales_ledger table.
+        analytics (SalesAnalytics): Rolling sales aggregates for the last
+            hour, day and week.
+        stock_index (LowStockIndex): The product slots ordered by quantity.
+        holds (HoldBook): Units held for customers who have selected but not
+            yet paid.
+        money_cache (int): The amount of money in pence inserted in the default
+            transaction.
+        selected_product (Vending_machine_entry): The product selected in the
+            default transaction.
+
+    Methods that act on a purchase take an optional Transaction. When none is
+    given they act on the machine's default transaction, which suits scripts
+    and single-customer use.
     """
 
-    def __init__(self, vending_machine_name, vending_db_file_path):
+    def __init__(
+        self,
+        vending_machine_name,
+        vending_db_file_path,
+        max_transactions=1000,
+        transaction_ttl=120.0,
+        hold_ttl=120.0,
+        session=None,
+        echo=False,
+        storage_profile="durable",
+        ledger_max_batch=100,
+        ledger_max_latency=0.5,
+        background_flush=True,
+    ):
         """
         Initializes the VendingMachine instance.
 
         Args:
             vending_machine_name (str): The name of the vending machine.
             vending_db_file_path (str): The file path for the SQLite database.
+            max_transactions (int): The maximum number of open transactions.
+            transaction_ttl (float): Seconds an idle transaction is kept before
+                it expires and any money inserted is refunded.
+            hold_ttl (float): Seconds a selected unit stays held for a
+                customer without a further selection or coin.
+            session (Session): An existing session to use instead of creating
+                an engine, e.g. the sync side of an AsyncSession.
+            echo (bool): Whether the engine prints every SQL statement. Prefer
+                structuredLogging.set_sql_echo, which logs off the request path.
+            storage_profile (str): The SQLite journaling, fsync, cache and pool
+                settings to use: "durable", "balanced" or "fast". See
+                storageProfile.PROFILES.
+            ledger_max_batch (int): Sales per ledger group commit.
+            ledger_max_latency (float): Longest time in seconds a sale waits
+                before it is committed to the ledger.
+            background_flush (bool): Whether to start a thread that writes the
+                ledger as it falls due. The async machine turns this off and
+                flushes from the event loop instead.
         """
         self.vending_machine_name = vending_machine_name
         self.vending_db_file_path = vending_db_file_path
-        # DB created if it doesn't exist
-        self.engine = create_engine(
-            f"sqlite:///{self.vending_db_file_path}", echo=True)
-        self.Session = sessionmaker(bind=self.engine)
-        self.session = self.Session()
-        Base.metadata.create_all(self.engine)
-        self.money_cache = 0  # Balance user has put in the machine
-        self.selected_product = None
+        self.storage_profile = storage_profile
+        if session is None:
+            self.engine = create_machine_engine(
+                self.vending_db_file_path, storage_profile, echo)
+            self.Session = sessionmaker(bind=self.engine)
+            self.session = self.Session()
+        else:
+            self.engine = session.get_bind()
+            self.Session = sessionmaker(bind=self.engine)
+            self.session = session
+        track_sql(self.engine)  # Count statements for the metrics endpoint
+        # Creates the tables, or upgrades a database from an older schema
+        schemaMigration.migrate(self.engine)
+        self._lock = threading.RLock()
+        # Holds the balance and selection when no transaction token is used
+        self._default_transaction = Transaction()
+        # reset_selection takes the machine lock, so a transaction expiring
+        # waits for any sale in progress on it rather than cutting it short
+        self.transactions = TransactionStore(
+            max_transactions, transaction_ttl, on_expire=self.reset_selection)
+        self.holds = HoldBook(hold_ttl)
+        # Listings are cached as serialised JSON against the inventory version.
+        # The epoch tells versions apart across restarts of the machine.
+        self.inventory_version = 0
+        self._version_epoch = secrets.token_hex(4)
+        self._snapshots = {}
+        # Coins are loaded once and tracked in memory from here on
+        self.coin_inventory = CoinInventory()
+        self.coin_inventory.load(self.session)
+        self.stock_index = LowStockIndex()
+        self.stock_index.load(self.stock_levels())
+        for entry in self.print_vending_data():
+            self.coin_inventory.feasibility.set_price(
+                entry.selection_code, entry.cost)
+        self.ledger = SalesLedger(ledger_max_batch, ledger_max_latency)
+        self.analytics = SalesAnalytics()
+        self._load_analytics()
+        self._closing = threading.Event()
+        self._flusher = None
+        if background_flush:
+            self._flusher = threading.Thread(
+                target=self._flush_in_background, name="vending-flusher",
+                daemon=True)
+            self._flusher.start()
+
+    @property
+    def money_cache(self):
+        return self._default_transaction.money_cache
+
+    @money_cache.setter
+    def money_cache(self, value):
+        self._default_transaction.money_cache = value
+
+    @property
+    def selected_product(self):
+        return self._default_transaction.selected_product
+
+    @selected_product.setter
+    def selected_product(self, value):
+        self._default_transaction.selected_product = value
+
+    def open_transaction(self):
+        """
+        Opens a new customer transaction.
+
+        Returns:
+            Transaction: The new transaction, identified by its token.
+        """
+        return self.transactions.open()
 
+    def get_transaction(self, token):
+        """
+        Looks up an open customer transaction.
+
+        Args:
+            token (str): The transaction token.
+
+        Returns:
+            Transaction: The matching transaction.
+
+        Raises:
+            UnknownTransactionError: If the token is unknown or has expired.
+        """
+        return self.transactions.get(token)
+
+    @_synchronized
     def stock_row(self, selection_code, product_name, cost, quantity):
         """
         Stocks or updates a product entry in the vending machine.
@@ -58,7 +336,7 @@ class VendingMachine:
         Args:
             selection_code (str): The code for the product selection.
             product_name (str): The name of the product.
-            cost (float): The price of the product.
+            cost (int): The price of the product, in pence.
             quantity (int): The quantity of the product.
 
         Returns:
@@ -73,17 +351,22 @@ class VendingMachine:
             )
             self.session.merge(product_row)
             self.session.commit()   # Commit result to table
+            self.stock_index.set(selection_code, quantity)
+            self.coin_inventory.feasibility.set_price(
+                selection_code, cost)
+            self.inventory_version += 1
             return f"Stock row {selection_code} updated"
         except Exception as e:
             self.session.rollback() # Rollback change on error
             return f"Error occurred: {e}"
 
+    @_synchronized
     def restock_change(self, value, quantity):
         """
         Restocks the change available in the vending machine.
 
         Args:
-            value (float): The value of the coin.
+            value (int): The value of the coin, in pence.
             quantity (int): The number of coins to add.
 
         Returns:
@@ -93,25 +376,126 @@ class VendingMachine:
             product_row = Change(value=value, quantity=quantity)
             self.session.merge(product_row)
             self.session.commit()
-            return f"Coin ${value} topped up to {quantity} coins"
+            self.coin_inventory.set_coin(value, quantity)
+            self.inventory_version += 1
+            return f"Coin {format_pence(value)} topped up to {quantity} coins"
         except Exception as e:
             self.session.rollback()
             return f"Error occurred: {e}"
 
 
-    def return_money(self):
+    @_synchronized
+    def stock_rows(self, rows):
+        """
+        Stocks or updates many product entries in a single transaction.
+
+        Every row is validated first. If any row is invalid nothing is written,
+        otherwise all rows are upserted with one executemany and one commit.
+
+        Args:
+            rows (list): Tuples of (selection_code, product_name, cost in
+                pence, quantity).
+
+        Returns:
+            tuple: A boolean indicating whether the rows were stocked and a
+                list of per-row results.
+        """
+        valid, results = _validate_rows(rows, _validate_stock_row)
+        if not valid or not rows:
+            return valid, results
+        table = Vending_machine_entry.__table__
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.selection_code],
+            set_={
+                "product_name": statement.excluded.product_name,
+                "cost": statement.excluded.cost,
+                "quantity": statement.excluded.quantity,
+            },
+        )
+        params = [
+            {
+                "selection_code": selection_code,
+                "product_name": product_name,
+                "cost": cost,
+                "quantity": quantity,
+            }
+            for selection_code, product_name, cost, quantity in rows
+        ]
+        try:
+            self.session.execute(statement, params)
+            self.session.commit()   # One commit for the whole batch
+        except Exception as e:
+            self.session.rollback()
+            return False, [
+                {"row": result["row"], "status": "error", "detail": str(e)}
+                for result in results
+            ]
+        for selection_code, _name, cost, quantity in rows:
+            self.stock_index.set(selection_code, quantity)
+            self.coin_inventory.feasibility.set_price(
+                selection_code, cost)
+        self.inventory_version += 1
+        return True, results
+
+    @_synchronized
+    def restock_change_rows(self, rows):
+        """
+        Restocks many coins in a single transaction.
+
+        Every row is validated first. If any row is invalid nothing is written,
+        otherwise all coins are upserted with one executemany and one commit.
+
+        Args:
+            rows (list): Tuples of (value in pence, quantity).
+
+        Returns:
+            tuple: A boolean indicating whether the coins were stocked and a
+                list of per-row results.
+        """
+        valid, results = _validate_rows(rows, _validate_change_row)
+        if not valid or not rows:
+            return valid, results
+        table = Change.__table__
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.value],
+            set_={"quantity": statement.excluded.quantity},
+        )
+        params = [{"value": value, "quantity": quantity} for value, quantity in rows]
+        try:
+            self.session.execute(statement, params)
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            return False, [
+                {"row": result["row"], "status": "error", "detail": str(e)}
+                for result in results
+            ]
+        for value, quantity in rows:
+            self.coin_inventory.set_coin(value, quantity)
+        self.inventory_version += 1
+        return True, results
+
+    @_synchronized
+    def return_money(self, transaction=None):
         """
         Returns any money currently cached in the machine.
 
+        Args:
+            transaction (Transaction): The transaction to refund.
+
         Returns:
             str: A message indicating the result of the operation.
         """
-        if self.money_cache > 0:
-            self.money_cache = 0
+        transaction = self._resolve(transaction)
+        if transaction.money_cache > 0:
+            transaction.money_cache = 0
             return "Money inserted has been returned"
         else:
             return "No money to return"
 
+    @_synchronized
     def print_vending_data(self):
         """
         Retrieves and returns all product entries in the vending machine.
@@ -126,6 +510,7 @@ class VendingMachine:
         )
         return entries
 
+    @_synchronized
     def print_change_data(self):
         """
         Retrieves and returns all coin entries in the vending machine.
@@ -136,81 +521,470 @@ class VendingMachine:
         entries = self.session.query(Change).all()
         return entries
 
-    def select_product(self, selection_code):
+    @_synchronized
+    def stock_page(self, after=None, limit=100):
+        """
+        Returns one page of the product listing, ordered by selection code.
+
+        Args:
+            after (str): The last selection code of the previous page, or
+                None for the first page.
+            limit (int): The maximum number of products on the page.
+
+        Returns:
+            tuple: The products as StockRows and the selection code to pass
+                as after for the next page, or None if this is the last page.
+        """
+        rows, next_after = self._page(
+            Vending_machine_entry, _STOCK_COLUMNS, after, limit)
+        return self._stock_rows(rows), next_after
+
+    @_synchronized
+    def change_page(self, after=None, limit=100):
+        """
+        Returns one page of the coin listing, ordered by coin value.
+
+        Args:
+            after (int): The last coin value of the previous page, or None
+                for the first page.
+            limit (int): The maximum number of coins on the page.
+
+        Returns:
+            tuple: The coins as CoinRows and the value to pass as after for
+                the next page, or None if this is the last page.
+        """
+        rows, next_after = self._page(Change, _CHANGE_COLUMNS, after, limit)
+        return [CoinRow(*row) for row in rows], next_after
+
+    def iter_stock_pages(self, batch_size=500):
+        """
+        Yields the whole product listing a page at a time.
+
+        The lock is taken for each page rather than for the whole listing,
+        so purchases carry on while a large listing is streamed.
+
+        Args:
+            batch_size (int): The number of products per page.
+
+        Yields:
+            list: The next page of products, as in stock_page.
+        """
+        return _iter_pages(self.stock_page, batch_size)
+
+    def iter_change_pages(self, batch_size=500):
+        """
+        Yields the whole coin listing a page at a time.
+
+        Args:
+            batch_size (int): The number of coins per page.
+
+        Yields:
+            list: The next page of coins, as in change_page.
+        """
+        return _iter_pages(self.change_page, batch_size)
+
+    def _page(self, model, columns, after, limit):
+        # Seek past the last key instead of using OFFSET, so every page costs
+        # the same however deep it is
+        key = getattr(model, columns[0])
+        query = self._listing_query(model, columns).limit(limit)
+        if after is not None:
+            query = query.where(key > after)
+        query = query.execution_options(yield_per=min(limit, _YIELD_PER))
+        rows = self.session.execute(query).tuples().all()
+        next_after = rows[-1][0] if len(rows) == limit else None
+        return rows, next_after
+
+    def _listing_query(self, model, columns):
+        # Plain column tuples rather than ORM objects: nothing is added to
+        # the session's identity map and no instance state is built per row
+        return (
+            select(*(getattr(model, column) for column in columns))
+            .order_by(getattr(model, columns[0]))
+        )
+
+    def _stock_rows(self, rows):
+        feasibility = self.coin_inventory.feasibility
+        return [
+            StockRow(*row, feasibility.exact_change_only(row[0]))
+            for row in rows
+        ]
+
+    @_synchronized
+    def storage_diagnostics(self):
+        """
+        Reports the storage profile and the SQLite settings actually in use.
+
+        Returns:
+            dict: The profile name, active PRAGMA values and pool status.
+        """
+        settings = storageProfile.read_settings(self.session.connection())
+        self.session.commit()  # End the read transaction
+        return {
+            "profile": self.storage_profile,
+            "database": self.vending_db_file_path,
+            "settings": settings,
+            "pool": self.engine.pool.status(),
+        }
+
+    @_synchronized
+    def stock_levels(self):
+        """
+        Returns the quantity in stock for every selection code.
+
+        Returns:
+            list: Pairs of (selection_code, quantity).
+        """
+        rows = self.session.query(
+            Vending_machine_entry.selection_code, Vending_machine_entry.quantity)
+        return [tuple(row) for row in rows]
+
+    def low_stock(self, k=10):
+        """
+        Returns the product slots and coins with the least remaining.
+
+        Args:
+            k (int): The number of products and of coins to return.
+
+        Returns:
+            dict: Lists of products (selection_code, quantity) and coins
+                (value, quantity), lowest first.
+        """
+        return {
+            "products": [
+                {"selection_code": code, "quantity": quantity}
+                for code, quantity in self.stock_index.lowest(k)
+            ],
+            "coins": [
+                {"value": value, "quantity": quantity}
+                for value, quantity in self.coin_inventory.index.lowest(k)
+            ],
+        }
+
+    def restock_plan(self, target=10, coin_target=20):
+        """
+        Works out what to load to bring every slot and coin up to a target.
+
+        Only the slots below target are read from the indexes, so the cost
+        grows with the size of the plan rather than the catalog.
+
+        Args:
+            target (int): The quantity to fill each product slot to.
+            coin_target (int): The number of each coin to hold.
+
+        Returns:
+            dict: Lists of products and coins to top up, each with the
+                quantity held, the target and the amount to add.
+        """
+        return {
+            "products": [
+                {"selection_code": code, "quantity": quantity,
+                 "target": target, "restock": target - quantity}
+                for code, quantity in self.stock_index.below(target)
+            ],
+            "coins": [
+                {"value": value, "quantity": quantity,
+                 "target": coin_target, "restock": coin_target - quantity}
+                for value, quantity in self.coin_inventory.index.below(coin_target)
+            ],
+        }
+
+    @_synchronized
+    def change_demand(self, limit=5000):
+        """
+        Returns what the machine has been asked to pay out as change, for
+        planning its coin float.
+
+        Buffered sales are flushed first so the history is complete. Cart
+        sales write one ledger row per unit at the same time, so rows are
+        grouped by sale time to give one amount per purchase.
+
+        Args:
+            limit (int): The number of most recent purchases to read.
+
+        Returns:
+            dict: The change owed on each recent purchase, newest first
+                (change_owed), the price of every product in stock (prices)
+                and the coins now loaded (coins), all in pence.
+        """
+        self.ledger.flush(self.session)
+        change_owed = self.session.scalars(
+            select(func.sum(
+                Sale_ledger_entry.amount_paid - Sale_ledger_entry.price))
+            .group_by(Sale_ledger_entry.sold_at)
+            .order_by(func.max(Sale_ledger_entry.id).desc())
+            .limit(limit)
+        ).all()
+        prices = self.session.scalars(
+            select(Vending_machine_entry.cost)
+            .where(Vending_machine_entry.quantity > 0)
+        ).all()
+        return {
+            "change_owed": list(change_owed),
+            "prices": list(prices),
+            "coins": dict(self.coin_inventory.coins),
+        }
+
+    def sales_summary(self, window="hour"):
+        """
+        Returns units sold and revenue per selection code over a rolling
+        window.
+
+        Args:
+            window (str): "hour", "day" or "week".
+
+        Returns:
+            dict: See SalesAnalytics.summary.
+        """
+        return self.analytics.summary(window)
+
+    def top_sellers(self, window="day", n=5, by="units"):
+        """
+        Returns the best selling products over a rolling window.
+
+        Args:
+            window (str): "hour", "day" or "week".
+            n (int): The number of products to return.
+            by (str): Rank by "units" or "revenue".
+
+        Returns:
+            list: See SalesAnalytics.top_sellers.
+        """
+        return self.analytics.top_sellers(window, n, by)
+
+    @_synchronized
+    def stock_snapshot(self):
+        """
+        Returns the product listing serialised as JSON, cached per version.
+
+        Each product carries an exact_change_only flag, set when the coins
+        held could not pay the change for some plausible overpayment.
+
+        Returns:
+            tuple: The ETag of the listing and the listing as JSON bytes.
+        """
+        return self._snapshot("stock", lambda: self._stock_rows(
+            self.session.execute(self._listing_query(
+                Vending_machine_entry, _STOCK_COLUMNS)).tuples()))
+
+    @_synchronized
+    def change_snapshot(self):
+        """
+        Returns the coin listing serialised as JSON, cached per version.
+
+        Returns:
+            tuple: The ETag of the listing and the listing as JSON bytes.
+        """
+        return self._snapshot("change", lambda: [
+            CoinRow(*row) for row in self.session.execute(
+                self._listing_query(Change, _CHANGE_COLUMNS)).tuples()])
+
+    def _snapshot(self, name, build_rows):
+        # Rebuild the cached listing only when the inventory has changed
+        version = self.inventory_version
+        cached = self._snapshots.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        etag = f'"{self._version_epoch}-{version}"'
+        payload = encode_listing(build_rows())
+        self._snapshots[name] = (version, etag, payload)
+        return etag, payload
+
+    @_synchronized
+    def select_product(self, selection_code, transaction=None):
         """
         Selects a product based on the provided selection code.
 
+        One unit is held for the transaction until it pays, cancels or the
+        hold expires, so units held by other customers are not available.
+
         Args:
             selection_code (str): The code for the selected product.
+            transaction (Transaction): The transaction to select it for.
 
         Returns:
-            float: The cost of the selected product.
+            int: The cost of the selected product, in pence.
 
         Raises:
             SelectedCodeInvalidError: If the selection code is invalid.
-            OutOfStockError: If the selected product is out of stock.
+            OutOfStockError: If every unit is sold or held by other customers.
         """
+        transaction = self._resolve(transaction)
         product = self.session.get(Vending_machine_entry, selection_code)
         if product is None:
             raise SelectedCodeInvalidError(
                 "Selected product code is not valid")
-        elif product.quantity == 0:
+        held = self.holds.held(selection_code, excluding=transaction)
+        if product.quantity - held <= 0:
             raise OutOfStockError("Item is out of stock")
         else:
-            self.selected_product = product
+            self.holds.place(transaction, selection_code)
+            transaction.selected_product = product
+            transaction.cart = None
             return product.cost
 
-    def insert_money(self, inserted_amount):
+    @_synchronized
+    def set_cart(self, items, transaction=None):
+        """
+        Selects several products to buy together with one payment.
+
+        Stock for every product is checked in one query, and the units are
+        held for the transaction as for select_product. The cart replaces
+        any product or cart already selected. Pay for it with insert_money
+        or insert_coins; the whole cart is then sold in one commit, or none
+        of it is.
+
+        Args:
+            items (dict): Mapping of selection code to the number of units.
+            transaction (Transaction): The transaction to fill the cart for.
+
+        Returns:
+            int: The total cost of the cart, in pence.
+
+        Raises:
+            ValueError: If the cart is empty or a number of units is not a
+                positive whole number.
+            SelectedCodeInvalidError: If any selection code is invalid.
+            OutOfStockError: If any product has fewer units available than
+                asked for.
         """
-        Inserts money into the vending machine and attempts to purchase the selected product.
+        if not items:
+            raise ValueError("The cart is empty")
+        invalid = sorted(
+            code for code, units in items.items()
+            if not is_pence(units) or units == 0)
+        if invalid:
+            raise ValueError(f"Units must be positive whole numbers: {invalid}")
+        transaction = self._resolve(transaction)
+        products = Vending_machine_entry.__table__
+        rows = {
+            row.selection_code: row
+            for row in self.session.execute(
+                select(products)
+                .where(products.c.selection_code.in_(list(items))))
+        }
+        unknown = sorted(set(items) - set(rows))
+        if unknown:
+            raise SelectedCodeInvalidError(
+                f"Selected product codes are not valid: {unknown}")
+        short = sorted(
+            code for code, units in items.items()
+            if rows[code].quantity
+            - self.holds.held(code, excluding=transaction) < units)
+        if short:
+            raise OutOfStockError(f"Not enough stock of {short}")
+        self.holds.place_items(transaction, items)
+        transaction.selected_product = None
+        transaction.cart = Cart(
+            CartLine(code, rows[code].product_name, rows[code].cost, units)
+            for code, units in items.items())
+        return transaction.cart.cost
+
+    @_synchronized
+    def insert_money(self, inserted_amount, transaction=None):
+        """
+        Inserts money into the vending machine and attempts to purchase the
+        selected product or cart.
 
         Args:
-            inserted_amount (float): The amount of money inserted.
+            inserted_amount (int): The amount of money inserted, in pence.
+            transaction (Transaction): The transaction the money is for.
 
         Returns:
             str: A message indicating the result of the purchase attempt.
+
+        Raises:
+            PurchaseRaceLostError: If a concurrent sale took the last of the
+                product or the coins needed for change, or the transaction's
+                hold expired and other customers now hold the units. The
+                money inserted is returned and the selection cancelled.
         """
-        self.money_cache += inserted_amount
-        status, msg = self.selected_product.try_purchase(self.money_cache)
+        transaction = self._resolve(transaction)
+        transaction.money_cache += inserted_amount
+        purchase = transaction.purchase
+        # Paying keeps the units held
+        self._renew_hold(transaction)
+        with timed_step(self.vending_machine_name, "try_purchase"):
+            status, msg = purchase.try_purchase(transaction.money_cache)
+        PURCHASE_OUTCOMES.inc(self.vending_machine_name, status)
         # If insufficient funds inserted
         if status == "UNSOLD":
             return msg
-        # If exact funds inserted
+        # If exact funds inserted, no change is owed
         elif status == "SOLD":
-            self.selected_product.purchase()
-            self.selected_product = None
-            self.money_cache = 0
-            self.session.commit()
+            transaction.change_breakdown = {}
+            self._sell(transaction)
             return msg
         # If change required
         if status == "EVALUATE":
             # return required change here
-            possible, msg = self.check_enough_change()
+            with timed_step(self.vending_machine_name, "check_change"):
+                possible, msg = self.check_enough_change(transaction)
             # Is exact change possible
             if possible:
-                self.selected_product.purchase()
-                self.selected_product = None
-                self.money_cache = 0
+                self._sell(transaction)
                 return msg
             else:
-                self.money_cache = 0
+                PURCHASE_OUTCOMES.inc(
+                    self.vending_machine_name, "CHANGE_REFUSED")
+                transaction.money_cache = 0
                 return msg
 
-    def check_enough_change(self):
+    @_synchronized
+    def insert_coins(self, coins, transaction=None):
+        """
+        Inserts several coins at once and attempts the purchase once.
+
+        Every coin is checked before any is taken, so either all of them are
+        added to the balance or none are. The purchase and change are then
+        evaluated once for the total, as for a single insert_money call.
+
+        Args:
+            coins (list): The coins inserted, in pence.
+            transaction (Transaction): The transaction the coins are for.
+
+        Returns:
+            str: A message indicating the result of the purchase attempt.
+
+        Raises:
+            InvalidCoinError: If no coins, or more than MAX_COINS_PER_INSERT,
+                are given or any coin is not an accepted denomination. No
+                money is taken.
+            PurchaseRaceLostError: See insert_money.
+        """
+        if not coins:
+            raise InvalidCoinError("No coins inserted")
+        if len(coins) > MAX_COINS_PER_INSERT:
+            raise InvalidCoinError(
+                f"At most {MAX_COINS_PER_INSERT} coins can be inserted at "
+                "once, all coins have been returned")
+        invalid = [coin for coin in coins if not is_accepted_coin(coin)]
+        if invalid:
+            raise InvalidCoinError(
+                f"Not valid coins: {invalid}, all coins have been returned")
+        return self.insert_money(sum(coins), transaction)
+
+    @_synchronized
+    def check_enough_change(self, transaction=None):
         """
         Checks if there is enough change available to give back after a purchase.
 
+        Args:
+            transaction (Transaction): The transaction to give change for.
+
         Returns:
             tuple: A tuple containing a boolean indicating success and a message.
         """
-        required_change = self.money_cache - self.selected_product.cost
-        required_change = round(required_change, 2) # Round to avoid float errors
-        # Total change in the machine
-        total_change_available = Change.sum_costs(self.session)
-        
+        transaction = self._resolve(transaction)
+        required_change = (
+            transaction.money_cache - transaction.purchase.cost)
+        # Total change in the machine, tracked in memory
+        total_change_available = self.coin_inventory.total
+
         # If no change has been loaded into the machine
-        if total_change_available is None:
-            print(1)
+        if total_change_available == 0:
+            log_event(logger, logging.WARNING, "change.none_loaded",
+                      machine=self.vending_machine_name)
             return (
                 False,
                 "No change in the machine, please speak to admins. Coin being returned",
@@ -221,20 +995,18 @@ class VendingMachine:
         else:
             change_list, msg = self.calculate_change_possibility(
                 required_change)
-            print(change_list)
-            # If change can be given, dispense it and update the quantity in the machine
+            log_event(logger, logging.DEBUG, "change.breakdown",
+                      required=required_change, breakdown=change_list)
+            # If change can be given, keep it to pay out with the sale
             if change_list is not None:
-                for coin in change_list:
-                    coin.quantity -= 1
-                self.session.commit()  # Commit changes to table
-
+                transaction.change_breakdown = change_list
                 return (
                     True,
-                    f"Enough change in machine, product dispensing and £{required_change} being returned",
+                    f"Enough change in machine, product dispensing and {format_pence(required_change)} being returned",
                 )
 
             else:
-                self.money_cache = 0
+                transaction.money_cache = 0
                 return (
                     False,
                     "Not enough change in machine, inserted coins being returned",
@@ -245,40 +1017,219 @@ class VendingMachine:
         Calculates the possibility of providing change for a given amount.
 
         Args:
-            change_required (float): The amount of change needed.
+            change_required (int): The amount of change needed, in pence.
 
         Returns:
-            tuple: A tuple containing a list of coins for change and a message.
-        """
-        # Implements a greedy algorithm to assess whether change can easily be 
-        # provided, given the current coins available in the machine
-        change_list = []
-        coin_table = self.session.query(
-            Change).order_by(Change.value.desc()).all()
-        # Iterate through the coins of the table, minusing their value from
-        # the required change, until they run out or are larger than the 
-        # remaining required change
-        for coin in coin_table:
-            while change_required >= round(
-                    coin.value, 2) and coin.quantity > 0:
-                if change_required >= round(coin.value, 2):
-                    change_list.append(coin)
-                    change_required -= coin.value
-                    change_required = round(change_required, 2)
-
-        # If change cannot be fulfilled via greedy algo
-        if change_required > 0:
-            print(change_required)
-            return None, "Change not possible not possible"
+            tuple: A tuple containing a {denomination in pence: count} mapping
+                of coins for change (or None) and a message.
+        """
+        # Work against the in-memory coin inventory so the exact bounded
+        # solver can run without a database round trip
+        change_list = self.coin_inventory.make_change(change_required)
+
+        # If no combination of the loaded coins covers the amount
+        if change_list is None:
+            return None, "Change not possible"
 
         return change_list, "Change available"
 
    
-    def reset_selection(self):
-        self.money_cache = 0
-        self.selected_product = None
+    @_synchronized
+    def flush_ledger(self):
+        """
+        Group-commits any buffered sales to the sales ledger.
+
+        Returns:
+            int: The number of sales written.
+        """
+        return self.ledger.flush(self.session)
+
+    def flush_due(self):
+        """
+        Writes the ledger if a group commit has fallen due.
+        """
+        if self.ledger.flush_due():
+            self.flush_ledger()
+
+    def close(self):
+        """
+        Stops the background flusher, writes out buffered sales and closes
+        the database session.
+        """
+        self._closing.set()
+        self.ledger.wake()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            self.flush_ledger()
+            self.session.close()
+
+    def _flush_in_background(self):
+        while not self._closing.is_set():
+            self.ledger.wait_until_due(self.ledger.max_latency)
+            if self._closing.is_set():
+                return
+            try:
+                self.flush_due()
+            except Exception:
+                logger.exception("Background flush failed")
+
+    @_synchronized
+    def reset_selection(self, transaction=None):
+        transaction = self._resolve(transaction)
+        transaction.money_cache = 0
+        transaction.selected_product = None
+        transaction.cart = None
+        transaction.change_breakdown = {}
+        self.holds.release(transaction)
         return "Any selection cancelled and any money returned"
 
-    def return_balance(self):
-        balance = self.money_cache
-        return balance
\ No newline at end of file
+    @_synchronized
+    def return_balance(self, transaction=None):
+        balance = self._resolve(transaction).money_cache
+        return balance
+
+    def _resolve(self, transaction):
+        # Fall back to the default transaction when no token is in use
+        if transaction is None:
+            return self._default_transaction
+        return transaction
+
+    def _renew_hold(self, transaction):
+        # The hold may have expired while the customer was paying, and its
+        # units been held by other customers since; if so, they keep them
+        items = _units(transaction)
+        short = sorted(
+            code for code, units in items.items()
+            if self.stock_index.quantities.get(code, 0)
+            - self.holds.held(code, excluding=transaction) < units)
+        if short:
+            PURCHASE_OUTCOMES.inc(self.vending_machine_name, "RACE_LOST")
+            self.reset_selection(transaction)
+            raise PurchaseRaceLostError(
+                f"Hold on {short} expired and the units are held by another "
+                "customer, money returned")
+        self.holds.place_items(transaction, items)
+
+    def _sell(self, transaction):
+        try:
+            with timed_step(self.vending_machine_name, "commit"):
+                self._apply_sale(
+                    _units(transaction), transaction.change_breakdown)
+        except PurchaseRaceLostError:
+            # Cancelling the selection also drops the change planned for it,
+            # so it cannot be paid out by a later sale on the same token
+            PURCHASE_OUTCOMES.inc(self.vending_machine_name, "RACE_LOST")
+            self.reset_selection(transaction)
+            raise
+        self.inventory_version += 1
+        self._record_sale(transaction)
+        self._complete(transaction)
+
+    def _apply_sale(self, items, breakdown):
+        # Take the products and the change coins in one transaction, each
+        # with a conditional UPDATE so a concurrent sale in another thread or
+        # process can never drive a quantity below zero
+        products = Vending_machine_entry.__table__
+        coins = Change.__table__
+        stock, paid_out = {}, {}
+        try:
+            for selection_code, count in items.items():
+                stock[selection_code] = self.session.execute(
+                    update(products)
+                    .where(products.c.selection_code == selection_code,
+                           products.c.quantity >= count)
+                    .values(quantity=products.c.quantity - count)
+                    .returning(products.c.quantity)
+                ).scalar()
+            for value, count in breakdown.items():
+                paid_out[value] = self.session.execute(
+                    update(coins)
+                    .where(coins.c.value == value,
+                           coins.c.quantity >= count)
+                    .values(quantity=coins.c.quantity - count)
+                    .returning(coins.c.quantity)
+                ).scalar()
+            lost = None in stock.values() or None in paid_out.values()
+            if not lost:
+                self.session.commit()
+        except OperationalError as e:
+            if not _is_locked(e):
+                self.session.rollback()
+                logger.exception("Sale could not be written")
+                raise
+            # Still locked by another writer after the busy timeout
+            lost = True
+        if lost:
+            self.session.rollback()
+            self._resync(items)
+            raise PurchaseRaceLostError(
+                "Sold out or change taken by another sale, money returned")
+        for selection_code, quantity in stock.items():
+            self.stock_index.set(selection_code, quantity)
+        for value, quantity in paid_out.items():
+            self.coin_inventory.set_coin(value, quantity)
+
+    def _resync(self, selection_codes):
+        # Another writer got there first, so reread what it changed
+        self.coin_inventory.load(self.session)
+        products = Vending_machine_entry.__table__
+        rows = self.session.execute(
+            select(products.c.selection_code, products.c.quantity)
+            .where(products.c.selection_code.in_(list(selection_codes)))
+        )
+        for selection_code, quantity in rows:
+            self.stock_index.set(selection_code, quantity)
+        self.session.expire_all()
+
+    def _load_analytics(self):
+        # Rebuild the rolling windows from the last week of the ledger
+        width, count = max(WINDOWS.values(), key=lambda shape: shape[0] * shape[1])
+        rows = self.session.execute(
+            select(Sale_ledger_entry.sold_at, Sale_ledger_entry.selection_code,
+                   Sale_ledger_entry.price)
+            .where(Sale_ledger_entry.sold_at >= time.time() - width * count)
+            .order_by(Sale_ledger_entry.sold_at)
+        )
+        self.analytics.load(
+            (sold_at, code, price) for sold_at, code, price in rows)
+
+    def _record_sale(self, transaction):
+        # Buffered for the next ledger group commit, not committed here. A
+        # cart is recorded as one ledger row per unit, all with the same
+        # time; the last row carries the overpayment and the change given
+        if transaction.cart is not None:
+            sold = [
+                line for line in transaction.cart.lines.values()
+                for _unit in range(line.units)
+            ]
+        else:
+            sold = [transaction.selected_product]
+        breakdown = transaction.change_breakdown
+        change_given = sum(value * count for value, count in breakdown.items())
+        sold_at = time.time()
+        for position, product in enumerate(sold, start=1):
+            last = position == len(sold)
+            self.analytics.record(
+                sold_at, product.selection_code, product.cost)
+            self.ledger.record(
+                sold_at=sold_at,
+                selection_code=product.selection_code,
+                product_name=product.product_name,
+                price=product.cost,
+                amount_paid=(
+                    product.cost + transaction.money_cache
+                    - transaction.purchase.cost if last else product.cost),
+                change_given=change_given if last else 0,
+                change_breakdown=json.dumps(breakdown if last else {}),
+            )
+
+    def _complete(self, transaction):
+        # A finished sale clears the transaction and frees its token
+        transaction.money_cache = 0
+        transaction.selected_product = None
+        transaction.cart = None
+        transaction.change_breakdown = {}
+        self.holds.release(transaction)
+        if transaction.token is not None:
+            self.transactions.close(transaction.token)
\ No newline at end of file